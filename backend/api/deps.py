@@ -1,8 +1,19 @@
-from fastapi import Depends, HTTPException, status
+from functools import lru_cache
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from auth.security import get_current_user
+from auth.security import verify_token
+from auth.token_cache import token_cache
+from models.registry import ModelRegistry, get_registry
+from services.vision_service import VisionService
+from services.lip_sync_service import LipSyncService
+from services.rppg_service import RPPGService
+from services.fusion_service import FusionService
+from services.result_cache import ResultCache
+from services.job_service import JobManager
+from utils.config import get_settings
+from utils.executors import run_in_pool
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
@@ -13,5 +24,64 @@ def get_db():
     finally:
         db.close()
 
-def get_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    return get_current_user(token, db)
+async def get_user(token: str = Depends(oauth2_scheme)):
+    # a cached token costs a dict lookup; only misses decode the JWT and query the users table
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+    return await run_in_pool("auth", verify_token, token)
+
+async def get_admin_user(user = Depends(get_user)):
+    """``get_user`` restricted to ADMIN_USERNAMES; anyone can sign up, so operator endpoints need more"""
+    if user.username not in get_settings().ADMIN_USERNAMES:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Admin privileges required")
+    return user
+
+async def get_ws_user(websocket: WebSocket):
+    """The caller of a WebSocket, verified once at connect time.
+
+    Browsers cannot set headers on a WebSocket handshake, so the token may also come as
+    ``?token=``. Failing verification closes the handshake with 1008 (policy violation).
+    """
+    token = websocket.query_params.get("token")
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if not token and scheme.lower() == "bearer":
+        token = credentials
+    if not token:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+    try:
+        return await get_user(token)
+    except HTTPException:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+
+def get_model_registry() -> ModelRegistry:
+    return get_registry()
+
+# Services only hold a registry handle, so one instance per worker is shared by all requests
+@lru_cache()
+def get_vision_service() -> VisionService:
+    return VisionService(get_registry())
+
+@lru_cache()
+def get_lip_sync_service() -> LipSyncService:
+    return LipSyncService(get_registry())
+
+@lru_cache()
+def get_rppg_service() -> RPPGService:
+    return RPPGService(get_registry())
+
+@lru_cache()
+def get_fusion_service() -> FusionService:
+    return FusionService()
+
+@lru_cache()
+def get_result_cache() -> ResultCache:
+    settings = get_settings()
+    if not settings.RESULT_CACHE_ENABLED:
+        return ResultCache(max_entries=0)  # stores nothing but still collapses concurrent duplicates
+    return ResultCache(settings.RESULT_CACHE_SIZE, settings.RESULT_CACHE_TTL, settings.RESULT_CACHE_PATH or None)
+
+@lru_cache()
+def get_job_manager() -> JobManager:
+    return JobManager(get_vision_service(), get_lip_sync_service(), get_rppg_service(), get_fusion_service(),
+                      get_result_cache(), get_registry())
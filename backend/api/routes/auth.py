@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from auth import crud, security
-from api.deps import get_db
+from api.deps import get_db, get_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -20,3 +20,19 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         raise HTTPException(401, "Bad credentials")
     token = security.create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
+
+@router.post("/password")
+def change_password(current_password: str, new_password: str, principal = Depends(get_user),
+                    db: Session = Depends(get_db)):
+    user = security.authenticate_user(db, principal.username, current_password)
+    if not user:
+        raise HTTPException(401, "Bad credentials")
+    crud.update_password(db, user, new_password)  # revokes every token issued before now
+    return {"username": user.username}
+
+@router.delete("/me", status_code=204)
+def delete_account(principal = Depends(get_user), db: Session = Depends(get_db)):
+    user = crud.get_user_by_username(db, principal.username)
+    if user is None:
+        raise HTTPException(404, "User not found")
+    crud.delete_user(db, user)
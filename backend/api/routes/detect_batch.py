@@ -0,0 +1,118 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio, json, logging, os
+from services.vision_service import VisionService
+from services.lip_sync_service import LipSyncService
+from services.rppg_service import RPPGService
+from services.fusion_service import FusionService
+from services.result_cache import ResultCache
+from services.detection_pipeline import analyze_image, analyze_video, IMAGE_MODELS, VIDEO_MODELS
+from models.registry import ModelRegistry
+from api.deps import (get_user, get_vision_service, get_lip_sync_service, get_rppg_service, get_fusion_service,
+                      get_result_cache, get_model_registry)
+from models.schemas import DetectionResult
+from utils.config import get_settings
+from utils.uploads import spool_request_files, upload_body
+from services.history_service import record_scan
+
+router = APIRouter(tags=["detect"])
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _kind(upload, vs: VisionService) -> str:
+    return "image" if os.path.splitext(upload.path)[1] in vs.allowed_image_ext else "video"
+
+
+def _batch_suffix(vs: VisionService):
+    def suffix_for(filename: str) -> str:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in vs.allowed_image_ext and ext not in vs.allowed_video_ext:
+            raise HTTPException(400, f"Invalid file type: {ext}")
+        return ext
+    return suffix_for
+
+
+@router.post("/detect/batch", openapi_extra=upload_body("files", many=True))
+async def detect_batch(
+    request: Request,
+    explain: bool = False,
+    user = Depends(get_user),
+    vs: VisionService = Depends(get_vision_service),
+    lsvc: LipSyncService = Depends(get_lip_sync_service),
+    rsvc: RPPGService = Depends(get_rppg_service),
+    fusion: FusionService = Depends(get_fusion_service),
+    cache: ResultCache = Depends(get_result_cache),
+    registry: ModelRegistry = Depends(get_model_registry)
+):
+    """Analyse many images (and short videos) in one request, streaming one NDJSON line per item.
+
+    Lines arrive in completion order, each tagged with the item's ``index``: ``{"index",
+    "filename", "result"}`` on success or ``{"index", "filename", "status", "error"}``. A final
+    ``{"done": true, ...}`` line closes the stream. At most BATCH_CONCURRENCY items are in
+    flight; images among them meet in the image model's micro-batcher, so they share forward
+    passes. The whole body is read, each item streamed to its own temp file, before the
+    first line is sent.
+    """
+    parts = await spool_request_files(request, vs.max_size, _batch_suffix(vs), max_files=settings.BATCH_MAX_ITEMS)
+    names = [filename for filename, _ in parts]
+    spooled = [(part, _kind(part, vs)) if not isinstance(part, HTTPException)
+               else {"index": i, "filename": names[i], "status": part.status_code, "error": part.detail}
+               for i, (_, part) in enumerate(parts)]
+    uploads = [s[0] for s in spooled if isinstance(s, tuple)]
+
+    def cleanup():
+        for upload in uploads:
+            upload.cleanup()
+
+    async def analyze(index: int, upload, kind: str) -> dict:
+        try:
+            if kind == "image":
+                key = cache.make_key(upload.sha256, "image", registry.fingerprint(IMAGE_MODELS), explain=explain)
+                result = await cache.get_or_compute(key, lambda path: analyze_image(path, explain, vs, fusion),
+                                                    upload.path)
+            else:
+                key = cache.make_key(upload.sha256, "video", registry.fingerprint(VIDEO_MODELS), explain=explain,
+                                     windowed=False)
+                result = await cache.get_or_compute(key, lambda path: analyze_video(
+                    path, explain, vs, lsvc, rsvc, fusion, max_seconds=settings.BATCH_MAX_VIDEO_SECONDS), upload.path)
+            await record_scan(user.id, result, names[index], upload.sha256)
+            return {"index": index, "filename": names[index], "result": DetectionResult(**result).model_dump()}
+        except ValueError as e:
+            return {"index": index, "filename": names[index], "status": 400, "error": str(e)}
+        except Exception as e:
+            logger.error(f"Batch item {index} ({names[index]}) failed: {e}")
+            return {"index": index, "filename": names[index], "status": 500, "error": "Analysis failed"}
+        finally:
+            upload.cleanup()  # the item's temp file goes as soon as it is done
+
+    async def lines():
+        failed = sum(1 for s in spooled if not isinstance(s, tuple))
+        for item in spooled:
+            if not isinstance(item, tuple):
+                yield json.dumps(item) + "\n"
+        todo = iter([(i, *s) for i, s in enumerate(spooled) if isinstance(s, tuple)])
+        pending = set()
+        try:
+            while True:
+                # top the window up; finished results are written out before more items start
+                for item in todo:
+                    pending.add(asyncio.ensure_future(analyze(*item)))
+                    if len(pending) >= settings.BATCH_CONCURRENCY:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    line = task.result()
+                    failed += "error" in line
+                    yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "items": len(parts), "failed": failed}) + "\n"
+        finally:
+            for task in pending:  # client went away mid-stream
+                task.cancel()
+            cleanup()  # items never started
+
+    # also runs if the stream was never iterated
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(cleanup))
@@ -1,47 +1,43 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-import logging, tempfile, os
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Depends, Request
+import logging
 from services.vision_service import VisionService
 from services.fusion_service import FusionService
-from services.explain_service import ExplainService
-from api.deps import get_user
+from services.result_cache import ResultCache
+from services.detection_pipeline import analyze_image, IMAGE_MODELS
+from models.registry import ModelRegistry
+from api.deps import get_user, get_vision_service, get_fusion_service, get_result_cache, get_model_registry
 from models.schemas import DetectionResult
+from utils.uploads import spool_request_file, allowed_suffix, upload_body
+from utils.metrics import request_trace
+from services.history_service import record_scan
 
 router = APIRouter(tags=["detect"])
 logger = logging.getLogger(__name__)
 
-@router.post("/detect/image", response_model=DetectionResult)
+@router.post("/detect/image", response_model=DetectionResult, openapi_extra=upload_body())
 async def detect_image(
-    file: UploadFile = File(...),
+    request: Request,
     explain: bool = False,
-    user = Depends(get_user)
+    timings: bool = False,
+    user = Depends(get_user),
+    vs: VisionService = Depends(get_vision_service),
+    fusion: FusionService = Depends(get_fusion_service),
+    cache: ResultCache = Depends(get_result_cache),
+    registry: ModelRegistry = Depends(get_model_registry)
 ):
-    ext = Path(file.filename).suffix.lower()
-    vs = VisionService()
-    if ext not in vs.allowed_image_ext:
-        raise HTTPException(400, f"Invalid image type: {ext}")
-    data = await file.read()
-    if len(data) > vs.max_size:
-        raise HTTPException(400, "File too large")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-    tmp.write(data); tmp.close()
-    try:
-        vision = await vs.detect_image(tmp.name)
-        fused = FusionService().fuse_scores({"vision": vision})
-        explain_data = await ExplainService().explain_image(tmp.name, vision) if explain else {}
-        return DetectionResult(
-            overall_score=fused["overall_score"],
-            overall_prediction=fused["overall_prediction"],
-            confidence=fused["confidence"],
-            vision_score=vision["score"],
-            vision_prediction=vision["prediction"],
-            audio_sync_score=None,
-            physiological_score=None,
-            explanation=explain_data.get("text_explanation", ""),
-            heatmap_url=explain_data.get("heatmap_path"),
-            processing_time=vision["processing_time"],
-            model_version="1.0.0",
-            file_type="image"
-        )
-    finally:
-        os.unlink(tmp.name)
+    with request_trace() as trace:
+        suffix_for = allowed_suffix(vs.allowed_image_ext, "image")
+        filename, upload = await spool_request_file(request, vs.max_size, suffix_for)
+        try:
+            # repeated uploads of the same bytes are answered from the cache
+            key = cache.make_key(upload.sha256, "image", registry.fingerprint(IMAGE_MODELS), explain=explain)
+            try:
+                result = await cache.get_or_compute(key, lambda path: analyze_image(path, explain, vs, fusion),
+                                                    upload.path)
+            except ValueError as e:
+                raise HTTPException(400, str(e))
+        finally:
+            upload.cleanup()
+        await record_scan(user.id, result, filename, upload.sha256)
+    # a cached answer only shows the upload and the history write: nothing else ran for this request
+    return DetectionResult(**{**result, "timings": trace.breakdown() if timings else None})
@@ -1,30 +1,62 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import logging, json, base64
-from io import BytesIO
-import cv2, numpy as np
-from PIL import Image
-from services.vision_service import VisionService
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+import asyncio, logging, json, base64
+from api.deps import get_vision_service, get_ws_user
+from services.stream_session import StreamSession
+from utils.config import get_settings
 
 router = APIRouter(tags=["detect"])
 logger = logging.getLogger(__name__)
-vs = VisionService()
+settings = get_settings()
+
+async def _receive_frames(websocket: WebSocket, session: StreamSession):
+    """Feed the session's mailbox until the client goes away.
+
+    Binary messages are encoded images. JSON ``{"type": "frame", "data": "data:...;base64,..."}``
+    messages from older clients are still accepted.
+    """
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if msg.get("bytes") is not None:
+                payload, frame_id = msg["bytes"], None
+            else:
+                try:
+                    data = json.loads(msg["text"])
+                    if data.get("type") != "frame":
+                        continue
+                    payload, frame_id = base64.b64decode(data["data"].split(",")[-1]), data.get("frame_id")
+                except (ValueError, KeyError, AttributeError):
+                    await websocket.send_json({"error": "Malformed frame message"})
+                    continue
+            if len(payload) > settings.STREAM_MAX_FRAME_BYTES:
+                await websocket.send_json({"frame_id": frame_id, "error": "Frame too large"})
+                continue
+            session.offer(payload, frame_id)
+    finally:
+        session.close()
 
 @router.websocket("/detect/stream")
-async def stream_detect(websocket: WebSocket):
+async def stream_detect(websocket: WebSocket, user = Depends(get_ws_user)):
     await websocket.accept()
+    session = StreamSession(get_vision_service())
+    receiver = asyncio.create_task(_receive_frames(websocket, session))
     try:
-        while True:
-            raw = await websocket.receive_text()
-            msg = json.loads(raw)
-            if msg.get("type") == "frame":
-                b64 = msg["data"].split(",")[1]
-                img = Image.open(BytesIO(base64.b64decode(b64)))
-                arr = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-                res = await vs.detect_image_array(arr)
-                await websocket.send_json({"frame_id": msg.get("frame_id"), **res})
+        while (item := await session.next_frame()) is not None:
+            try:
+                result = await session.process(*item)
+            except ValueError as e:
+                result = {"frame_id": item[0], "error": str(e)}
+            await websocket.send_json(result)
+        logger.info(f"Stream disconnected: {session.stats()}")
     except WebSocketDisconnect:
-        logger.info("Stream disconnected")
+        logger.info(f"Stream disconnected: {session.stats()}")
     except Exception as e:
         logger.error(f"Stream error: {e}")
         await websocket.send_json({"error": str(e)})
         await websocket.close()
+    finally:
+        receiver.cancel()
+        # only now is no frame being processed, so the FaceMesh instances can go
+        await session.release()
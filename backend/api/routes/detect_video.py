@@ -1,63 +1,49 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
-import logging, tempfile, os, asyncio
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Depends, Request
+import logging
 from services.vision_service import VisionService
 from services.lip_sync_service import LipSyncService
 from services.rppg_service import RPPGService
 from services.fusion_service import FusionService
-from services.explain_service import ExplainService
-from utils.frame_extractor import FrameExtractor
-from api.deps import get_user
+from services.result_cache import ResultCache
+from services.detection_pipeline import analyze_video, VIDEO_MODELS
+from models.registry import ModelRegistry
+from api.deps import (get_user, get_vision_service, get_lip_sync_service, get_rppg_service, get_fusion_service,
+                      get_result_cache, get_model_registry)
 from models.schemas import DetectionResult
+from utils.uploads import spool_request_file, allowed_suffix, upload_body
+from utils.metrics import request_trace
+from services.history_service import record_scan
 
 router = APIRouter(tags=["detect"])
 logger = logging.getLogger(__name__)
 
-@router.post("/detect/video", response_model=DetectionResult)
+@router.post("/detect/video", response_model=DetectionResult, openapi_extra=upload_body())
 async def detect_video(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
+    request: Request,
     explain: bool = False,
-    user = Depends(get_user)
+    windowed: bool = False,
+    timings: bool = False,
+    user = Depends(get_user),
+    vs: VisionService = Depends(get_vision_service),
+    lsvc: LipSyncService = Depends(get_lip_sync_service),
+    rsvc: RPPGService = Depends(get_rppg_service),
+    fusion: FusionService = Depends(get_fusion_service),
+    cache: ResultCache = Depends(get_result_cache),
+    registry: ModelRegistry = Depends(get_model_registry)
 ):
-    ext = Path(file.filename).suffix.lower()
-    vs = VisionService()
-    if ext not in vs.allowed_video_ext:
-        raise HTTPException(400, f"Invalid video type: {ext}")
-    data = await file.read()
-    if len(data) > vs.max_size:
-        raise HTTPException(400, "Video too large")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-    tmp.write(data); tmp.close()
-
-    try:
-        fe = FrameExtractor()
-        frames_info = await fe.extract_frames(tmp.name)
-        audio_path = await fe.extract_audio(tmp.name)
-
-        vsvc, lsvc, rsvc = VisionService(), LipSyncService(), RPPGService()
-        tasks = [
-            vsvc.detect_video(frames_info["frames"]),
-            lsvc.detect_sync(frames_info["frames"], audio_path),
-            rsvc.detect_physiological(frames_info["frames"])
-        ]
-        vision, lip, rppg = await asyncio.gather(*tasks)
-        fused = FusionService().fuse_scores({"vision": vision, "lip_sync": lip, "physiological": rppg})
-        explain_data = await ExplainService().explain_video(tmp.name, {"vision": vision, "lip_sync": lip, "physiological": rppg}) if explain else {}
-
-        background_tasks.add_task(lambda paths: [os.unlink(p) for p in paths], [tmp.name, audio_path] + frames_info["temp_files"])
-
-        return DetectionResult(
-            overall_score=fused["overall_score"],
-            overall_prediction=fused["overall_prediction"],
-            confidence=fused["confidence"],
-            vision_score=vision["score"], vision_prediction=vision["prediction"],
-            audio_sync_score=lip["score"], physiological_score=rppg["score"],
-            explanation=explain_data.get("text_explanation", ""),
-            heatmap_url=explain_data.get("heatmap_path"),
-            processing_time=vision["processing_time"] + lip["processing_time"] + rppg["processing_time"],
-            model_version="1.0.0", file_type="video"
-        )
-    finally:
-        # cleanup in case of exception
-        [os.unlink(p) for p in [tmp.name, audio_path] + frames_info.get("temp_files", []) if os.path.exists(p)]
+    with request_trace() as trace:
+        suffix_for = allowed_suffix(vs.allowed_video_ext, "video")
+        filename, upload = await spool_request_file(request, vs.max_size, suffix_for)
+        try:
+            key = cache.make_key(upload.sha256, "video", registry.fingerprint(VIDEO_MODELS), explain=explain,
+                                 windowed=windowed)
+            try:
+                result = await cache.get_or_compute(key, lambda path: analyze_video(path, explain, vs, lsvc, rsvc,
+                                                                            fusion, windowed=windowed),
+                                                    upload.path)
+            except ValueError as e:
+                raise HTTPException(400, str(e))
+        finally:
+            upload.cleanup()
+        await record_scan(user.id, result, filename, upload.sha256)
+    return DetectionResult(**{**result, "timings": trace.breakdown() if timings else None})
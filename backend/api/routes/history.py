@@ -1,11 +1,74 @@
-from fastapi import APIRouter, Depends
+import ast, base64, datetime, json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from api.deps import get_db, get_user
+from api.deps import get_db, get_user, get_admin_user
 from auth import crud
+from services.history_service import history_writer
 
 router = APIRouter(prefix="/history", tags=["history"])
 
+def encode_cursor(record) -> str:
+    raw = f"{record.timestamp.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+def _results(raw: str):
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(raw)  # rows written before results were stored as JSON
+    except (ValueError, SyntaxError):
+        return raw
+
+def _utc(value):
+    """Timestamps are stored as naive UTC"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def history_entry(r) -> dict:
+    return {
+        "id": r.id, "timestamp": r.timestamp, "filename": r.filename, "file_type": r.file_type,
+        "overall_prediction": r.overall_prediction, "overall_score": r.overall_score, "confidence": r.confidence,
+        "vision_score": r.vision_score, "audio_sync_score": r.audio_sync_score,
+        "physiological_score": r.physiological_score, "processing_time": r.processing_time,
+        "results": _results(r.results),
+    }
+
+@router.get("/writer")
+def history_writer_stats(user = Depends(get_admin_user)):
+    """Queue depth and flush latency of this worker's write-behind history writer (admins only;
+    /metrics exports the same as ``history_queue_depth`` and ``history_flush_seconds``)"""
+    return history_writer.stats()
+
 @router.get("/")
-def read_history(db: Session = Depends(get_db), user = Depends(get_user)):
-    records = crud.get_history_for_user(db, user.id)
-    return [{"timestamp": r.timestamp, "results": r.results} for r in records]
+def read_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    prediction: Optional[str] = Query(None, description="real or fake"),
+    file_type: Optional[str] = Query(None, description="image or video"),
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_user)
+):
+    """One page of the user's scans, newest first. When more remain, the ``X-Next-Cursor``
+    header holds the ``cursor`` for the next page (same filters)."""
+    records = crud.get_history_for_user(db, user.id, limit=limit + 1, before=decode_cursor(cursor) if cursor else None,
+                                        prediction=prediction, file_type=file_type, since=_utc(since), until=_utc(until))
+    if len(records) > limit:
+        records = records[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(records[-1])
+    return [history_entry(r) for r in records]
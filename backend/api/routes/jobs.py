@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
+import logging
+from pathlib import Path
+from services.vision_service import VisionService
+from services.job_service import JobManager, QueueFullError, job_snapshot, TERMINAL_STATUSES
+from api.deps import get_user, get_ws_user, get_vision_service, get_job_manager
+from utils.uploads import spool_request_file, allowed_suffix, upload_body
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+logger = logging.getLogger(__name__)
+
+@router.post("/video", status_code=202, openapi_extra=upload_body())
+async def submit_video_job(
+    request: Request,
+    explain: bool = False,
+    windowed: bool = False,
+    priority: int = Query(5, ge=0, le=9),
+    user = Depends(get_user),
+    vs: VisionService = Depends(get_vision_service),
+    manager: JobManager = Depends(get_job_manager)
+):
+    if manager.pending >= manager.max_pending:
+        raise HTTPException(503, "Job queue is full", headers={"Retry-After": "30"})
+    filename, upload = await spool_request_file(request, vs.max_size, allowed_suffix(vs.allowed_video_ext, "video"))
+    ext = Path(filename).suffix.lower()
+    try:
+        job = await manager.submit(user.id, upload, ext, explain, priority, windowed)
+    except QueueFullError:
+        raise HTTPException(503, "Job queue is full", headers={"Retry-After": "30"})
+    finally:
+        upload.cleanup()  # no-op once the manager has moved the file
+    return job_snapshot(job)
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, user = Depends(get_user), manager: JobManager = Depends(get_job_manager)):
+    job = await manager.get(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(404, "Job not found")
+    return job_snapshot(job)
+
+@router.websocket("/{job_id}/events")
+async def job_events(websocket: WebSocket, job_id: str, user = Depends(get_ws_user)):
+    await websocket.accept()
+    manager = get_job_manager()
+    queue = manager.subscribe(job_id)  # subscribe first so no update between snapshot and loop is missed
+    try:
+        job = await manager.get(job_id)
+        if job is None or job.user_id != user.id:
+            await websocket.send_json({"error": "Job not found"})
+            return await websocket.close()
+        snapshot = job_snapshot(job)
+        while True:
+            await websocket.send_json(snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return await websocket.close()
+            snapshot = await queue.get()
+    except WebSocketDisconnect:
+        logger.info(f"Job {job_id} subscriber disconnected")
+    finally:
+        manager.unsubscribe(job_id, queue)
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from models.registry import ModelRegistry
+from services.vision_service import VisionService
+from services.result_cache import ResultCache
+from utils.landmark_cache import localization_stats
+from api.deps import get_user, get_admin_user, get_model_registry, get_vision_service, get_result_cache
+
+router = APIRouter(prefix="/models", tags=["models"])
+
+@router.get("/")
+def model_stats(registry: ModelRegistry = Depends(get_model_registry), user = Depends(get_user)):
+    return registry.stats()
+
+@router.get("/image/batching")
+def image_batching_stats(vs: VisionService = Depends(get_vision_service), user = Depends(get_user)):
+    return vs.image_batcher.stats()
+
+@router.get("/result-cache")
+def result_cache_stats(cache: ResultCache = Depends(get_result_cache), user = Depends(get_user)):
+    return cache.stats()
+
+@router.get("/face-localization")
+def face_localization_stats(user = Depends(get_user)):
+    return localization_stats.stats()
+
+@router.post("/{name}/reload")
+async def reload_model(
+    name: str,
+    path: str = None,
+    registry: ModelRegistry = Depends(get_model_registry),
+    user = Depends(get_admin_user)
+):
+    """Rebuild one model, optionally from another checkpoint under MODEL_DIR (admins only).
+
+    Only the worker process that serves this request reloads; with several uvicorn
+    workers, repeat the call until each has answered or restart them instead.
+    """
+    if name not in registry.names:
+        raise HTTPException(404, f"Unknown model: {name}")
+    try:
+        entry = await run_in_threadpool(registry.reload, name, path)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return entry.stats()
@@ -1,5 +1,13 @@
+import datetime, json
+from pathlib import Path
+from sqlalchemy import or_, and_
 from sqlalchemy.orm import Session
 from auth import models, security
+from auth.token_cache import token_cache
+from jobs.models import AnalysisJob
+
+HISTORY_FIELDS = ("file_type", "overall_prediction", "overall_score", "confidence", "vision_score",
+                  "audio_sync_score", "physiological_score", "processing_time")
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
@@ -10,10 +18,60 @@ def create_user(db: Session, username: str, password: str):
     db.add(user); db.commit(); db.refresh(user)
     return user
 
-def create_history(db: Session, user_id: int, results: dict):
-    record = models.ScanHistory(user_id=user_id, results=str(results))
+def _history_row(user_id: int, results: dict, filename: str = None, content_hash: str = None, timestamp=None):
+    record = models.ScanHistory(user_id=user_id, results=json.dumps(results), filename=filename,
+                                content_hash=content_hash, **{f: results.get(f) for f in HISTORY_FIELDS})
+    if timestamp is not None:  # an explicit None would be stored as NULL instead of the column default
+        record.timestamp = timestamp
+    return record
+
+def update_password(db: Session, user, new_password: str):
+    user.hashed_password = security.get_password_hash(new_password)
+    user.password_changed_at = datetime.datetime.utcnow()  # revokes tokens issued before now, in every worker
+    db.commit()
+    token_cache.invalidate_user(user.username)
+
+def delete_user(db: Session, user):
+    """Delete the user with their history and video jobs in one transaction, then their stored uploads"""
+    jobs = db.query(AnalysisJob).filter(AnalysisJob.user_id == user.id)
+    uploads = [path for (path,) in jobs.with_entities(AnalysisJob.file_path)]
+    jobs.delete(synchronize_session=False)
+    db.query(models.ScanHistory).filter(models.ScanHistory.user_id == user.id).delete(synchronize_session=False)
+    db.delete(user)
+    db.commit()
+    token_cache.invalidate_user(user.username)
+    for path in uploads:
+        Path(path).unlink(missing_ok=True)
+
+def create_history(db: Session, user_id: int, results: dict, filename: str = None, content_hash: str = None):
+    record = _history_row(user_id, results, filename, content_hash)
     db.add(record); db.commit(); db.refresh(record)
     return record
 
-def get_history_for_user(db: Session, user_id: int):
-    return db.query(models.ScanHistory).filter(models.ScanHistory.user_id == user_id).all()
+def create_history_batch(db: Session, entries: list):
+    """Insert many history rows (dicts of ``create_history`` arguments plus ``timestamp``) in one transaction.
+    Rows queued for users deleted in the meantime are dropped."""
+    user_ids = {entry["user_id"] for entry in entries}
+    existing = {uid for (uid,) in db.query(models.User.id).filter(models.User.id.in_(user_ids))}
+    db.add_all([_history_row(**entry) for entry in entries if entry["user_id"] in existing])
+    db.commit()
+
+def get_history_for_user(db: Session, user_id: int, limit: int = None, before: tuple = None, prediction: str = None,
+                         file_type: str = None, since=None, until=None):
+    """A user's scans newest first. ``before`` is the (timestamp, id) of the last row of the previous
+    page: the query seeks past it on the (user_id, timestamp, id) index instead of counting an offset."""
+    H = models.ScanHistory
+    q = db.query(H).filter(H.user_id == user_id)
+    if prediction:
+        q = q.filter(H.overall_prediction == prediction)
+    if file_type:
+        q = q.filter(H.file_type == file_type)
+    if since is not None:
+        q = q.filter(H.timestamp >= since)
+    if until is not None:
+        q = q.filter(H.timestamp < until)
+    if before is not None:
+        ts, row_id = before
+        q = q.filter(or_(H.timestamp < ts, and_(H.timestamp == ts, H.id < row_id)))
+    q = q.order_by(H.timestamp.desc(), H.id.desc())
+    return q.limit(limit).all() if limit else q.all()
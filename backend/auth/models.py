@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -9,12 +9,26 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    password_changed_at = Column(DateTime)  # tokens issued before this are rejected
     scans = relationship("ScanHistory", back_populates="owner")
 
 class ScanHistory(Base):
     __tablename__ = "scan_history"
+    # serves /history: one user's rows newest first, with id breaking timestamp ties for the cursor
+    __table_args__ = (Index("ix_scan_history_user_timestamp", "user_id", "timestamp", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
-    results = Column(String)
+    results = Column(Text)  # JSON-encoded DetectionResult
+    # the fields history is filtered and listed by, copied out of ``results``
+    filename = Column(String)
+    content_hash = Column(String)
+    file_type = Column(String)
+    overall_prediction = Column(String)
+    overall_score = Column(Float)
+    confidence = Column(Float)
+    vision_score = Column(Float)
+    audio_sync_score = Column(Float)
+    physiological_score = Column(Float)
+    processing_time = Column(Float)
     owner = relationship("User", back_populates="scans")
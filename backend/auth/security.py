@@ -1,8 +1,11 @@
+import time
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 from auth import crud
+from auth.token_cache import Principal, token_cache
+from database import SessionLocal
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from utils.config import get_settings
@@ -26,10 +29,20 @@ def authenticate_user(db: Session, username: str, password: str):
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # sub-second "iat", so a token issued right after a password change is not mistaken for an older one
+    to_encode.update({"exp": expire, "iat": time.time()})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(lambda: None)):
+def issued_before_password_change(payload: dict, user) -> bool:
+    if user.password_changed_at is None:
+        return False
+    changed_at = user.password_changed_at.replace(tzinfo=timezone.utc).timestamp()
+    return "iat" not in payload or float(payload["iat"]) < changed_at
+
+def verify_token(token: str, db: Session = None) -> Principal:
+    """Verify ``token`` against the users table and cache the Principal behind it; callers
+    check ``token_cache`` first. Without ``db`` a short-lived session is opened."""
+    started = time.time()  # a revocation after this point must win over this lookup
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,7 +55,25 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username)
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        user = crud.get_user_by_username(db, username)
+    finally:
+        if own_session:
+            db.close()
     if user is None:
         raise credentials_exception
-    return user
+    if issued_before_password_change(payload, user):
+        raise credentials_exception
+    principal = Principal(id=user.id, username=user.username)
+    token_cache.put(token, principal, float(payload["exp"]), verified_at=started)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(lambda: None)) -> Principal:
+    """The Principal behind ``token``, from the token cache or verified against the users table"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+    return verify_token(token, db)
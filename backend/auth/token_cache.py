@@ -0,0 +1,94 @@
+import threading, time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from utils.config import get_settings
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The verified caller: what routes need from the user row, safe to share between requests"""
+    id: int
+    username: str
+
+
+class TokenCache:
+    """Verified principals keyed by bearer token, so repeat requests skip the JWT decode and
+    the user lookup.
+
+    Entries expire with their token, and after ``ttl`` seconds at the latest: deleting a
+    user or changing a password invalidates their entries in this process right away, while
+    other worker processes pick the change up within ``ttl``. Least recently used entries
+    are evicted beyond ``max_entries``. A principal verified before its user was last
+    invalidated is not stored, so a lookup racing a password change cannot bring it back.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = max_entries if max_entries is not None else settings.AUTH_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.AUTH_CACHE_TTL_SECONDS
+        self._entries = OrderedDict()  # token -> (principal, valid until)
+        self._by_user = defaultdict(set)  # username -> tokens
+        self._revoked = {}  # username -> time of the last invalidate_user, kept for ``ttl``
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, expires_at: float, verified_at: float = None):
+        if self.max_entries <= 0:
+            return
+        valid_until = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            revoked_at = self._revoked.get(principal.username)
+            if revoked_at is not None and (verified_at is None or verified_at <= revoked_at):
+                return
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, valid_until)
+            self._by_user[principal.username].add(token)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._by_user.get(principal.username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[principal.username]
+
+    def invalidate_user(self, username: str):
+        now = time.time()
+        with self._lock:
+            # an in-flight lookup outlives the revocation by one DB query at most; ``ttl`` is ample
+            self._revoked = {u: t for u, t in self._revoked.items() if now - t < self.ttl}
+            self._revoked[username] = now
+            for token in list(self._by_user.get(username, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._revoked.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+token_cache = TokenCache()
@@ -1,9 +1,71 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from utils.config import get_settings
+from utils.metrics import timed
 
 settings = get_settings()
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+
+
+def _make_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True, pool_size=settings.DB_POOL_SIZE,
+                             max_overflow=settings.DB_MAX_OVERFLOW)
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    # explicit QueuePool: SQLAlchemy 1.4 defaults file databases to NullPool, which rejects the sizes
+    pool = {} if in_memory else {"poolclass": QueuePool, "pool_size": settings.DB_POOL_SIZE,
+                                 "max_overflow": settings.DB_MAX_OVERFLOW}
+    # sessions are used from the executor pools, not only the thread that opened the connection
+    engine = create_engine(url, connect_args={"check_same_thread": False,
+                                              "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0}, **pool)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        # WAL: readers (history pages, job polling) no longer block the history writer or each other.
+        # synchronous=NORMAL is durable across application crashes under WAL, only a power cut can
+        # drop the last transactions
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.close()
+
+    return engine
+
+
+engine = _make_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
+
+
+def with_session(fn, *args, **kwargs):
+    """Run ``fn(db, ...)`` in a fresh session; meant for worker threads (see ``run_in_pool``).
+    Rows come back detached but fully loaded, so they stay readable after the session closes."""
+    db = SessionLocal()
+    try:
+        with timed(f"db.{fn.__name__}"):
+            return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+def upgrade_schema():
+    """Add columns and indexes that models gained after their table was created.
+
+    ``create_all`` only creates missing tables; this covers additive changes to existing
+    ones (new nullable columns, new indexes) so older databases keep working without a
+    migration step. Anything else still needs a real migration.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {ddl}'))
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,24 @@
+from sqlalchemy.orm import Session
+from jobs import models
+
+ACTIVE_STATUSES = ("queued", "running")
+
+def create_job(db: Session, job_id: str, user_id: int, file_path: str, content_hash: str, explain: bool, priority: int,
+               windowed: bool = False):
+    job = models.AnalysisJob(id=job_id, user_id=user_id, file_path=file_path, content_hash=content_hash,
+                             explain=explain, windowed=windowed, priority=priority)
+    db.add(job); db.commit(); db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: str):
+    return db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).first()
+
+def update_job(db: Session, job_id: str, **fields):
+    db.query(models.AnalysisJob).filter(models.AnalysisJob.id == job_id).update(fields)
+    db.commit()
+
+def get_active_jobs(db: Session):
+    return (db.query(models.AnalysisJob)
+            .filter(models.AnalysisJob.status.in_(ACTIVE_STATUSES))
+            .order_by(models.AnalysisJob.priority, models.AnalysisJob.created_at)
+            .all())
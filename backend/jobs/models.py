@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey
+from database import Base
+import datetime
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, done, failed
+    priority = Column(Integer, nullable=False, default=5)  # lower runs first
+    stage = Column(String, default="queued")
+    progress = Column(Float, default=0.0)
+    file_path = Column(String, nullable=False)
+    content_hash = Column(String)
+    explain = Column(Boolean, default=False)
+    windowed = Column(Boolean, default=False)
+    result = Column(Text)  # JSON-encoded DetectionResult
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
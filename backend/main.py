@@ -1,12 +1,23 @@
 import uvicorn
+import torch
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from utils.logging import setup_logging
-from api.routes import auth, history, detect_image, detect_video, detect_stream
-from database import Base, engine
+from api.routes import auth, history, detect_image, detect_video, detect_batch, detect_stream, registry, jobs, metrics
+from database import Base, engine, upgrade_schema
+from jobs import models as job_models  # registers the analysis_jobs table
+from models.registry import get_registry
+from api.deps import get_job_manager
+from utils.config import get_settings
+from utils.executors import shutdown_executors
+from utils.landmark_cache import face_mesh_pool, tracking_mesh_pool
+from utils.uploads import UploadLimitMiddleware, MULTIPART_OVERHEAD
+from utils.metrics import MetricsMiddleware
+from services.history_service import history_writer
 
 # create tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema()  # columns and indexes added to existing tables
 
 setup_logging()
 app = FastAPI(title="Deepfake Detection API", version="2.0.0")
@@ -18,14 +29,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # history pagination
 )
 
+# Reject oversized uploads while they stream in, before the multipart body is buffered
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/api/detect": get_settings().MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/api/detect/batch": get_settings().BATCH_MAX_BYTES,
+    "/api/jobs/video": get_settings().MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+})
+# Outermost, so rejected uploads are counted too
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(history.router, prefix="/api")
 app.include_router(detect_image.router, prefix="/api")
 app.include_router(detect_video.router, prefix="/api")
+app.include_router(detect_batch.router, prefix="/api")
 app.include_router(detect_stream.router, prefix="/api")
+app.include_router(registry.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(metrics.router)  # scraped at /metrics, where Prometheus looks by default
+
+@app.on_event("startup")
+def load_models():
+    settings = get_settings()
+    if settings.TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(settings.TORCH_NUM_THREADS)
+    # one copy of every model per worker, loaded before the first request arrives
+    if settings.PRELOAD_MODELS:
+        get_registry().load_all()
+
+@app.on_event("startup")
+async def start_jobs():
+    await get_job_manager().start()
+
+@app.on_event("startup")
+async def start_history_writer():
+    await history_writer.start()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await get_job_manager().stop()
+
+@app.on_event("shutdown")
+async def flush_history():
+    # after the job workers (they record history too) and before the io pool it writes on goes away
+    await history_writer.stop()
+
+@app.on_event("shutdown")
+def stop_executors():
+    shutdown_executors()
+    face_mesh_pool.close()
+    tracking_mesh_pool.close()
 
 @app.get("/api/health")
 async def health_check():
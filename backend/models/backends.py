@@ -0,0 +1,117 @@
+import logging
+from pathlib import Path
+import numpy as np
+import torch
+import torch.nn as nn
+import onnxruntime as ort
+from utils.config import get_settings
+from models.video_model import VideoDeepfakeModel
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "torchscript")
+# "int8" is the statically quantized TorchScript written by data_pipeline/quantize_models.py
+_SUFFIXES = {"onnx": ".onnx", "torchscript": ".ts", "int8": ".int8.ts"}
+# exported graphs per model; the video model is split so features can be computed once per frame
+PARTS = {"image": [None], "video": ["backbone", "head"], "syncnet": [None]}
+
+
+def exported_path(checkpoint: Path, backend: str, part: str = None) -> Path:
+    """``pretrained_models/vit_deepfake.pt`` -> ``pretrained_models/vit_deepfake.onnx`` (or ``.backbone.onnx``)"""
+    stem = checkpoint.stem + (f".{part}" if part else "")
+    return checkpoint.with_name(stem + _SUFFIXES[backend])
+
+
+def ort_session(path: Path) -> ort.InferenceSession:
+    """ONNX Runtime session with full graph optimisation and the configured thread counts"""
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.ORT_INTRA_OP_THREADS > 0:
+        opts.intra_op_num_threads = settings.ORT_INTRA_OP_THREADS
+    if settings.ORT_INTER_OP_THREADS > 0:
+        opts.inter_op_num_threads = settings.ORT_INTER_OP_THREADS
+    providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in ort.get_available_providers()]
+    return ort.InferenceSession(str(path), opts, providers=providers)
+
+
+class OnnxModule:
+    """Makes an ONNX Runtime session callable like the eager module it was exported from"""
+
+    def __init__(self, path: Path):
+        self.session = ort_session(path)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, *tensors):
+        feeds = {name: t.detach().cpu().numpy().astype(np.float32) for name, t in zip(self.input_names, tensors)}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+    def eval(self):
+        return self
+
+
+class ExportedVideoModel:
+    """Exported backbone + temporal head with the same interface as ``VideoDeepfakeModel``"""
+
+    def __init__(self, backbone, head):
+        self.encode_frames = backbone
+        self.classify_features = head
+
+    forward = VideoDeepfakeModel.forward  # only uses encode_frames / classify_features
+    __call__ = forward
+
+    def eval(self):
+        return self
+
+
+class BoundMethod(nn.Module):
+    """Exposes one method of a model as ``forward`` so it can be traced/exported on its own"""
+
+    def __init__(self, model: nn.Module, method: str):
+        super().__init__()
+        self.model = model
+        self.method = method
+
+    def forward(self, *args):
+        return getattr(self.model, self.method)(*args)
+
+
+def export_specs(name: str, model, device) -> dict:
+    """part -> (module, example inputs, input names, dynamic axes) for exporting ``model``"""
+    size, clip = settings.TARGET_IMAGE_SIZE, settings.CLIP_LENGTH
+    if name == "image":
+        return {None: (model, (torch.randn(2, 3, size, size, device=device),), ["input"], {"input": {0: "batch"}})}
+    if name == "video":
+        frames = torch.randn(clip, 3, size, size, device=device)
+        with torch.no_grad():
+            feats = model.encode_frames(frames)
+        features = feats.unsqueeze(0).permute(0, 2, 1, 3, 4).contiguous()  # [1, features, time, h, w]
+        return {
+            "backbone": (BoundMethod(model, "encode_frames"), (frames,), ["frames"], {"frames": {0: "frames"}}),
+            "head": (BoundMethod(model, "classify_features"), (features,), ["features"],
+                     {"features": {0: "batch", 2: "time"}}),
+        }
+    if name == "syncnet":
+        net = model.model
+        return {None: (net, (torch.randn(2, 3, 5, 224, 224, device=device), torch.randn(2, 13, 5, device=device)),
+                       ["face", "audio"], {"face": {0: "batch"}, "audio": {0: "batch"}})}
+    raise KeyError(f"Model '{name}' cannot be exported")
+
+
+def _load_part(path: Path, backend: str, device):
+    if not path.exists():
+        raise FileNotFoundError(path)
+    if backend == "onnx":
+        return OnnxModule(path)
+    return torch.jit.load(str(path), map_location=device).eval()
+
+
+def load_exported(name: str, model, checkpoint: Path, backend: str, device):
+    """Swap the eager ``model`` for its exported graph(s); raises FileNotFoundError if not exported yet"""
+    parts = {part: _load_part(exported_path(checkpoint, backend, part), backend, device) for part in PARTS[name]}
+    if name == "video":
+        return ExportedVideoModel(parts["backbone"], parts["head"])
+    if name == "syncnet":
+        model.model = parts[None]  # keep the wrapper's preprocessing, replace the network
+        return model
+    return parts[None]
@@ -1,10 +1,10 @@
 # models/lip_model.py
 import torch
 import torch.nn as nn
-import cv2
 import numpy as np
 from pathlib import Path
 import logging
+from utils.preprocessing import BatchPreprocessor
 
 logger = logging.getLogger(__name__)
 
@@ -58,13 +58,23 @@ class SyncNet(nn.Module):
             nn.Linear(128, 1)
         )
         
-    def forward(self, face, audio):
-        face_feat = self.face_encoder(face).view(face.size(0), -1)
-        audio_feat = self.audio_encoder(audio).view(audio.size(0), -1)
+    def encode_face(self, face):
+        return self.face_encoder(face).view(face.size(0), -1)
+
+    def encode_audio(self, audio):
+        return self.audio_encoder(audio).view(audio.size(0), -1)
+
+    def fuse(self, face_feat, audio_feat):
         combined = torch.cat([face_feat, audio_feat], dim=1)
         return self.fusion(combined)
 
+    def forward(self, face, audio):
+        return self.fuse(self.encode_face(face), self.encode_audio(audio))
+
 class SyncNetWrapper:
+    SYNC_FRAMES = 5  # frames per sync clip
+    preprocess = BatchPreprocessor(224)  # RGB in [0, 1]
+
     def __init__(self, model_path: Path):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = SyncNet().to(self.device)
@@ -86,55 +96,57 @@ class SyncNetWrapper:
         else:
             logger.warning(f"SyncNet model not found at {model_path}. Using random weights.")
     
-    def extract_mfcc_features(self, audio, sr, n_mfcc=13, n_fft=512, hop_length=160):
-        """Extract MFCC features from audio signal"""
-        import librosa
+    @classmethod
+    def sample_indices(cls, frame_count: int) -> list:
+        """Sample frames uniformly (5 frames for sync detection)"""
+        if frame_count < cls.SYNC_FRAMES:
+            return []
+        return np.linspace(0, frame_count-1, cls.SYNC_FRAMES, dtype=int).tolist()
+
+    def prepare(self, frames, mfccs):
+        """Model inputs for the BGR ``frames`` and the ``[13, T]`` MFCCs aligned to them
+        (see ``AudioTrack.mfcc_at``): face [1, 3, T, 224, 224], MFCC [1, 13, T]"""
+        # Resize, BGR->RGB and scale all frames in one pass: [T, 3, H, W] -> [1, 3, T, H, W]
+        face_tensor = torch.from_numpy(self.preprocess(frames, copy=True)).permute(1, 0, 2, 3).unsqueeze(0)
+        face_tensor = face_tensor.to(self.device)
         
-        # Extract MFCCs
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc, 
-                                   n_fft=n_fft, hop_length=hop_length)
-        return mfccs
+        # Ensure consistent time dimension
+        target_frames = face_tensor.size(2)  # T dimension
+        if mfccs.shape[1] > target_frames:
+            mfccs = mfccs[:, :target_frames]
+        elif mfccs.shape[1] < target_frames:
+            # Pad or repeat
+            repeat_factor = target_frames // mfccs.shape[1] + 1
+            mfccs = np.tile(mfccs, (1, repeat_factor))[:, :target_frames]
+        
+        audio_tensor = torch.FloatTensor(mfccs).unsqueeze(0).to(self.device)
+        return face_tensor, audio_tensor
+
+    def predict_offsets(self, frames, mfccs):
+        """Sync probability of ``frames`` against each of K audio offsets, ``mfccs`` being [K, 13, T].
+
+        The face clip goes through the 3D-conv encoder once; only the small audio encoder
+        and the fusion head run per offset, all K in one batch. Exported/quantized graphs
+        without the split fall back to one batched full forward pass.
+        """
+        face_tensor = self.prepare(frames, mfccs[0])[0]
+        audio_tensor = torch.from_numpy(np.ascontiguousarray(mfccs, dtype=np.float32)).to(self.device)
+        k = audio_tensor.size(0)
+        with torch.no_grad():
+            if hasattr(self.model, "encode_face"):
+                face_feat = self.model.encode_face(face_tensor).expand(k, -1)
+                output = self.model.fuse(face_feat, self.model.encode_audio(audio_tensor))
+            else:
+                output = self.model(face_tensor.expand(k, -1, -1, -1, -1), audio_tensor)
+        return torch.sigmoid(output).flatten().tolist()
 
-    def predict(self, frames, audio, sr):
+    def predict(self, frames, mfccs):
+        """``frames`` are the BGR frames picked by ``sample_indices``, ``mfccs`` one column per frame"""
         try:
-            # Sample frames uniformly (5 frames for sync detection)
-            if len(frames) < 5:
+            if len(frames) < self.SYNC_FRAMES:
                 return 0.3  # Low sync score for insufficient frames
-                
-            frame_indices = np.linspace(0, len(frames)-1, 5, dtype=int)
-            selected_frames = [frames[i] for i in frame_indices]
-            
-            # Process video frames
-            face_frames = []
-            for frame_path in selected_frames:
-                img = cv2.imread(frame_path)
-                if img is None:
-                    continue
-                # Resize to standard size
-                img = cv2.resize(img, (224, 224))
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                img = img.astype(np.float32) / 255.0
-                face_frames.append(img)
-            
-            if len(face_frames) < 5:
-                return 0.3
-                
-            # Convert to tensor [1, 3, T, H, W]
-            face_tensor = torch.FloatTensor(face_frames).permute(3, 0, 1, 2).unsqueeze(0)
-            face_tensor = face_tensor.to(self.device)
-            
-            # Extract audio features
-            mfccs = self.extract_mfcc_features(audio, sr)
-            # Ensure consistent time dimension
-            target_frames = face_tensor.size(2)  # T dimension
-            if mfccs.shape[1] > target_frames:
-                mfccs = mfccs[:, :target_frames]
-            elif mfccs.shape[1] < target_frames:
-                # Pad or repeat
-                repeat_factor = target_frames // mfccs.shape[1] + 1
-                mfccs = np.tile(mfccs, (1, repeat_factor))[:, :target_frames]
             
-            audio_tensor = torch.FloatTensor(mfccs).unsqueeze(0).to(self.device)
+            face_tensor, audio_tensor = self.prepare(frames, mfccs)
             
             # Run inference
             with torch.no_grad():
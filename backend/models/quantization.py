@@ -0,0 +1,40 @@
+import copy, logging
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+logger = logging.getLogger(__name__)
+
+QUANT_MODES = ("none", "dynamic", "static")
+
+
+def quantize_dynamic_model(name: str, model):
+    """INT8 weights for Linear layers, activations quantized on the fly; needs no calibration data.
+
+    Only the classifier/fusion layers are affected, so the gain on the conv backbones is small;
+    ``static`` mode (calibrated by data_pipeline/quantize_models.py) quantizes the convolutions too.
+    """
+    if name == "syncnet":
+        model.model = quantize_dynamic(model.model, {nn.Linear}, dtype=torch.qint8)
+        return model
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(module: nn.Module, example_inputs: tuple, calibration, backend: str = "x86") -> nn.Module:
+    """Post-training static INT8 quantization of ``module`` (FX graph mode).
+
+    ``calibration`` yields input tuples that are run through the observed model
+    to fix activation ranges before conversion.
+    """
+    module = copy.deepcopy(module).cpu().eval()
+    prepared = prepare_fx(module, get_default_qconfig_mapping(backend), example_inputs)
+    batches = 0
+    with torch.no_grad():
+        for inputs in calibration:
+            prepared(*inputs)
+            batches += 1
+    if not batches:
+        raise ValueError("Static quantization needs at least one calibration batch")
+    logger.info(f"Calibrated {type(module).__name__} on {batches} batches")
+    return convert_fx(prepared)
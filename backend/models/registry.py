@@ -0,0 +1,269 @@
+import os, time, threading, hashlib, logging
+from pathlib import Path
+import torch
+from utils.config import get_settings
+from models.image_model import ImageDeepfakeModel
+from models.video_model import VideoDeepfakeModel
+from models.lip_model import SyncNetWrapper
+from models.backends import BACKENDS, PARTS, load_exported, ort_session
+from models.quantization import QUANT_MODES, quantize_dynamic_model
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _current_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _module_bytes(module) -> int:
+    """Bytes held by the parameters and buffers of a torch module"""
+    if isinstance(module, SyncNetWrapper):
+        module = module.model
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelEntry:
+    def __init__(self, name: str, model, path: Path, load_time: float, rss_delta: int, generation: int,
+                 backend: str = "torch"):
+        self.name = name
+        self.model = model
+        self.path = path
+        self.backend = backend
+        self.load_time = load_time
+        self.rss_delta = rss_delta
+        self.generation = generation
+        self.loaded_at = time.time()
+
+    def stats(self) -> dict:
+        size = _module_bytes(self.model)
+        if not size and self.model is not None and self.path.exists():
+            size = self.path.stat().st_size  # ONNX sessions: weights are mapped from the file
+        return {
+            "name": self.name,
+            "path": str(self.path),
+            "checkpoint_found": self.path.exists(),
+            "backend": self.backend,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "load_time": self.load_time,
+            "resident_bytes": size,
+            "rss_delta_bytes": self.rss_delta,
+        }
+
+
+class ModelRegistry:
+    """Process-wide holder for the inference models.
+
+    Each model is built once per worker and shared by every request. ``reload``
+    builds the replacement next to the live model and swaps it in atomically, so
+    in-flight requests finish on the old weights.
+    """
+
+    def __init__(self):
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model_dir = Path(settings.MODEL_DIR).resolve()
+        self._paths = {
+            "image": Path(settings.VIT_MODEL_PATH),
+            "video": Path(settings.TIMESFORMER_MODEL_PATH),
+            "syncnet": Path(settings.SYNCNET_MODEL_PATH),
+            "rppg": Path(settings.RPPG_MODEL_PATH),
+        }
+        self._loaders = {
+            "image": self._load_image,
+            "video": self._load_video,
+            "syncnet": self._load_syncnet,
+            "rppg": self._load_rppg,
+        }
+        self.backends = {
+            "image": settings.IMAGE_MODEL_BACKEND,
+            "video": settings.VIDEO_MODEL_BACKEND,
+            "syncnet": settings.SYNCNET_MODEL_BACKEND,
+        }
+        for name, backend in self.backends.items():
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown backend '{backend}' for model '{name}'; expected one of {BACKENDS}")
+        self.quantization = settings.MODEL_QUANTIZATION
+        if self.quantization not in QUANT_MODES:
+            raise ValueError(f"Unknown MODEL_QUANTIZATION '{self.quantization}'; expected one of {QUANT_MODES}")
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self._loaders}
+
+    @property
+    def names(self) -> list:
+        return list(self._loaders)
+
+    def get(self, name: str):
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self.load(name)
+        return entry.model
+
+    def load(self, name: str) -> ModelEntry:
+        """Load ``name`` if it is not loaded yet (idempotent, safe to call concurrently)"""
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        with self._load_locks[name]:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._build(name, self._paths[name], generation=1)
+                with self._lock:
+                    self._entries[name] = entry
+        return entry
+
+    def load_all(self):
+        for name in self._loaders:
+            self.load(name)
+
+    def reload(self, name: str, path: str = None) -> ModelEntry:
+        """Hot-swap ``name`` with a fresh copy of its checkpoint (optionally a new file in MODEL_DIR)"""
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        new_path = self.resolve_checkpoint(path) if path else self._paths[name]
+        with self._load_locks[name]:
+            current = self._entries.get(name)
+            generation = current.generation + 1 if current else 1
+            entry = self._build(name, new_path, generation)
+            with self._lock:
+                self._entries[name] = entry
+                self._paths[name] = new_path
+        logger.info(f"Reloaded model '{name}' from {new_path} (generation {generation})")
+        return entry
+
+    def resolve_checkpoint(self, path: str) -> Path:
+        """Restrict hot-reload checkpoints to files inside MODEL_DIR"""
+        candidate = (self.model_dir / path).resolve()
+        if self.model_dir not in candidate.parents or not candidate.is_file():
+            raise ValueError(f"Checkpoint not found in {self.model_dir}: {path}")
+        return candidate
+
+    def fingerprint(self, names) -> str:
+        """Short digest of the checkpoints behind ``names``; changes whenever one of them is replaced
+        or the inference backend / quantization mode that produces their scores changes"""
+        parts = [f"quant={self.quantization}"]
+        for name in sorted(names):
+            path = self._paths[name]
+            try:
+                st = path.stat()
+                parts.append(f"{name}={path.name}:{st.st_size}:{st.st_mtime_ns}:{self.backends.get(name, 'torch')}")
+            except OSError:
+                parts.append(f"{name}=none")
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = dict(self._entries)
+        return {
+            "device": str(self.device),
+            "process_rss_bytes": _current_rss(),
+            "models": {name: (entries[name].stats() if name in entries else {"name": name, "loaded": False})
+                       for name in self._loaders},
+        }
+
+    def _build(self, name: str, path: Path, generation: int) -> ModelEntry:
+        rss_before = _current_rss()
+        start = time.time()
+        model = self._loaders[name](path)
+        model, backend = self._apply_backend(name, model, path)
+        if settings.MODEL_WARMUP:
+            self._warmup(name, model)
+        load_time = time.time() - start
+        entry = ModelEntry(name, model, path, load_time, _current_rss() - rss_before, generation, backend)
+        logger.info(f"Loaded model '{name}' ({backend}) in {load_time:.2f}s")
+        return entry
+
+    def build_eager(self, name: str):
+        """A fresh eager PyTorch copy of ``name``, as used by the export and quantization tools"""
+        return self._loaders[name](self._paths[name])
+
+    def _apply_backend(self, name: str, model, path: Path):
+        if name in PARTS and self.quantization != "none":
+            if self.device.type == "cpu":
+                return self._apply_quantization(name, model, path)
+            logger.warning(f"MODEL_QUANTIZATION={self.quantization} is CPU-only; keeping FP32 '{name}' on {self.device}")
+        backend = self.backends.get(name, "torch")
+        if backend == "torch" or name not in PARTS:
+            return model, "torch"
+        try:
+            return load_exported(name, model, path, backend, self.device), backend
+        except FileNotFoundError as e:
+            logger.warning(f"No {backend} export of '{name}' at {e}; run data_pipeline/export_models.py. Using torch.")
+            return model, "torch"
+
+    def _apply_quantization(self, name: str, model, path: Path):
+        # quantization replaces the configured backend: INT8 kernels only exist for the torch CPU path
+        if self.quantization == "static":
+            try:
+                return load_exported(name, model, path, "int8", self.device), "int8-static"
+            except FileNotFoundError as e:
+                logger.warning(f"No calibrated INT8 graph of '{name}' at {e}; run data_pipeline/quantize_models.py. "
+                               "Using dynamic quantization.")
+        return quantize_dynamic_model(name, model), "int8-dynamic"
+
+    def _load_image(self, path: Path):
+        # ImageNet weights are only worth downloading when there is no fine-tuned checkpoint
+        model = ImageDeepfakeModel(pretrained=not path.exists()).to(self.device).eval()
+        if path.exists():
+            model.load_state_dict(torch.load(path, map_location=self.device))
+            logger.info("Loaded ViT weights")
+        return model
+
+    def _load_video(self, path: Path):
+        model = VideoDeepfakeModel(pretrained=not path.exists()).to(self.device).eval()
+        if path.exists():
+            model.load_state_dict(torch.load(path, map_location=self.device))
+            logger.info("Loaded Video weights")
+        return model
+
+    def _load_syncnet(self, path: Path):
+        wrapper = SyncNetWrapper(path)
+        wrapper.model.eval()  # the wrapper leaves random-init weights in train mode
+        return wrapper
+
+    def _load_rppg(self, path: Path):
+        if not path.exists():
+            logger.warning(f"rPPG ONNX model not found at {path}. Using fallback method.")
+            return None
+        try:
+            session = ort_session(path)
+            logger.info(f"Loaded rPPG ONNX model from {path}")
+            return session
+        except Exception as e:
+            logger.warning(f"Failed to load rPPG ONNX model: {e}. Using fallback method.")
+            return None
+
+    def _warmup(self, name: str, model):
+        """Run one dummy forward pass so lazy allocations happen at startup, not on the first request"""
+        size = settings.TARGET_IMAGE_SIZE
+        try:
+            with torch.no_grad():
+                if name == "image":
+                    model(torch.zeros(1, 3, size, size, device=self.device))
+                elif name == "video":
+                    model(torch.zeros(1, 3, settings.CLIP_LENGTH, size, size, device=self.device))
+                elif name == "syncnet":
+                    model.model(torch.zeros(1, 3, 5, 224, 224, device=self.device),
+                                torch.zeros(1, 13, 5, device=self.device))
+        except Exception as e:
+            logger.warning(f"Warm-up of model '{name}' failed: {e}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -1,5 +1,21 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+
+class SegmentScore(BaseModel):
+    start_frame: int
+    end_frame: int
+    start_time: Optional[float] = None  # null when the container does not report a frame rate
+    end_time: Optional[float] = None
+    score: float
+
+class SyncOffsetScore(BaseModel):
+    offset_ms: float
+    score: float
+
+class StageTiming(BaseModel):
+    stage: str
+    start_ms: float  # offset from the start of the request
+    duration_ms: float
 
 class DetectionResult(BaseModel):
     overall_score: float
@@ -8,9 +24,14 @@ class DetectionResult(BaseModel):
     vision_score: float
     vision_prediction: str
     audio_sync_score: Optional[float]
+    audio_sync_offset_ms: Optional[float] = None  # audio offset SyncNet scored highest
+    audio_sync_confidence: Optional[float] = None
+    audio_sync_curve: Optional[List[SyncOffsetScore]] = None
     physiological_score: Optional[float]
     explanation: Optional[str]
     heatmap_url: Optional[str]
     processing_time: float
     model_version: str
     file_type: str
+    timeline: Optional[List[SegmentScore]] = None  # per-segment vision scores in windowed video analysis
+    timings: Optional[List[StageTiming]] = None  # per-stage breakdown of this request, when asked for
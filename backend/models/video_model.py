@@ -12,6 +12,22 @@ class VideoDeepfakeModel(nn.Module):
         self.classifier = nn.Linear(256, 1)
         self.dropout = nn.Dropout(0.5)
         
+    def encode_frames(self, frames):
+        """Per-frame spatial features: [N, channels, height, width] -> [N, features, h, w]"""
+        return self.backbone(frames)
+
+    def classify_features(self, features):
+        """Clip logits from stacked frame features: [batch, features, time, h, w] -> [batch]"""
+        # Apply temporal convolution
+        temporal_features = self.temporal_conv(features)
+        
+        # Global pooling
+        pooled = self.temporal_pool(temporal_features).view(features.size(0), -1)
+        
+        # Classification
+        x = self.dropout(pooled)
+        return self.classifier(x).squeeze(1)
+
     def forward(self, x):
         # x shape: [batch, channels, time, height, width]
         batch_size, channels, time_steps, height, width = x.shape
@@ -21,19 +37,11 @@ class VideoDeepfakeModel(nn.Module):
         x = x.contiguous().view(batch_size * time_steps, channels, height, width)
         
         # Extract spatial features
-        spatial_features = self.backbone(x)  # [batch*time, features, h, w]
+        spatial_features = self.encode_frames(x)  # [batch*time, features, h, w]
         
         # Reshape back to include temporal dimension
         _, feat_dim, feat_h, feat_w = spatial_features.shape
         spatial_features = spatial_features.view(batch_size, time_steps, feat_dim, feat_h, feat_w)
         spatial_features = spatial_features.permute(0, 2, 1, 3, 4)  # [batch, features, time, h, w]
         
-        # Apply temporal convolution
-        temporal_features = self.temporal_conv(spatial_features)
-        
-        # Global pooling
-        pooled = self.temporal_pool(temporal_features).view(batch_size, -1)
-        
-        # Classification
-        x = self.dropout(pooled)
-        return self.classifier(x).squeeze(1)
+        return self.classify_features(spatial_features)
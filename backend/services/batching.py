@@ -0,0 +1,112 @@
+import asyncio, contextvars, time, logging
+from collections import Counter, deque
+import numpy as np
+from utils.executors import run_in_pool
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects concurrent ``submit`` calls into one batched call of ``run_batch``.
+
+    A batch is dispatched as soon as ``max_batch_size`` items are waiting or the
+    oldest item has waited ``max_wait_ms``. ``run_batch`` receives the list of
+    submitted items and must return one result per item, in order. It runs on
+    ``executor`` when one is given, so a forward pass never blocks the event loop.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 name: str = "batcher", executor: str = None):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        # metrics
+        self.batch_sizes = Counter()
+        self.queue_waits = deque(maxlen=1000)
+        self.items_total = 0
+        self.batches_total = 0
+
+    async def submit(self, item):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # started from an empty context: the worker outlives the request that happened to
+            # start it and must not carry (or keep alive) that request's trace
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # drain whatever is already queued without waiting any longer
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            dispatched = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            self._record(len(batch), [dispatched - queued for _, _, queued in batch])
+            try:
+                results = await self._dispatch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: expected {len(items)} results, got {len(results)}")
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _dispatch(self, items: list) -> list:
+        if self.executor is None:
+            return self.run_batch(items)
+        return await run_in_pool(self.executor, self.run_batch, items)
+
+    def _record(self, size: int, waits: list):
+        self.batch_sizes[size] += 1
+        self.queue_waits.extend(waits)
+        self.items_total += size
+        self.batches_total += 1
+
+    def stats(self) -> dict:
+        waits = np.array(self.queue_waits) * 1000.0 if self.queue_waits else np.zeros(1)
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "items_total": self.items_total,
+            "batches_total": self.batches_total,
+            "mean_batch_size": self.items_total / self.batches_total if self.batches_total else 0.0,
+            "batch_size_distribution": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms": {
+                "p50": float(np.percentile(waits, 50)),
+                "p95": float(np.percentile(waits, 95)),
+                "max": float(waits.max()),
+            },
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
@@ -0,0 +1,110 @@
+import asyncio, logging, time
+from services.vision_service import VisionService
+from services.lip_sync_service import LipSyncService
+from services.rppg_service import RPPGService
+from services.fusion_service import FusionService
+from services.explain_service import ExplainService
+from utils.frame_extractor import FrameExtractor
+from utils.audio_extractor import AudioExtractor
+from models.schemas import DetectionResult
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MODELS = ["image"]
+VIDEO_MODELS = ["video", "syncnet", "rppg"]
+
+
+async def analyze_video(path: str, explain: bool, vs: VisionService, lsvc: LipSyncService,
+                        rsvc: RPPGService, fusion: FusionService, progress=None, windowed: bool = False,
+                        max_seconds: float = None) -> dict:
+    """Full multimodal analysis of the video at ``path``.
+
+    ``windowed`` scores overlapping clips across the whole video (bounded by VIDEO_FRAME_BUDGET)
+    and adds a per-segment timeline, instead of one clip sampled over the full length.
+
+    ``progress`` is an optional ``async (stage, fraction)`` callback used by the job queue.
+    Videos longer than ``max_seconds`` are rejected before any frame is decoded.
+    ``processing_time`` is the wall-clock time of the whole analysis; the per-modality times
+    overlap because the modalities run concurrently. Raises ValueError for videos that cannot be decoded.
+    """
+    start = time.perf_counter()
+
+    async def report(stage: str, fraction: float):
+        if progress is not None:
+            await progress(stage, fraction)
+
+    source = None
+    try:
+        await report("extracting", 0.05)
+        fe = FrameExtractor()
+        source = await fe.extract_frames(path)
+        if len(source) == 0:
+            raise ValueError("Video has no frames")
+        if max_seconds is not None and len(source) / source.fps > max_seconds:
+            raise ValueError(f"Video longer than {max_seconds:g} s")
+        audio = await AudioExtractor().extract(path, len(source) / source.fps)
+
+        # one shared decode pass for the frames vision and lip-sync sample;
+        # rPPG streams its own window of consecutive frames and never holds more than one
+        n = len(source)
+        vision_indices = vs.window_indices(n, source.fps) if windowed else vs.frame_indices(n)
+        indices = set(vision_indices) | set(lsvc.frame_indices(n))
+        await report("decoding", 0.15)
+        await source.load(indices)
+        await report("landmarking", 0.3)
+        await source.landmarks.load(indices)  # landmark each sampled frame once for all modalities
+        await report("scoring", 0.45)
+        tasks = [
+            vs.detect_video_windows(source, vision_indices) if windowed else vs.detect_video(source),
+            lsvc.detect_sync(source, audio),
+            rsvc.detect_physiological(source)
+        ]
+        vision, lip, rppg = await asyncio.gather(*tasks)
+        await report("fusing", 0.9)
+        fused = fusion.fuse_scores({"vision": vision, "lip_sync": lip, "physiological": rppg})
+        explain_data = {}
+        if explain:
+            with timed("explain"):
+                explain_data = await ExplainService().explain_video(path, {"vision": vision, "lip_sync": lip, "physiological": rppg})
+
+        return DetectionResult(
+            overall_score=fused["overall_score"],
+            overall_prediction=fused["overall_prediction"],
+            confidence=fused["confidence"],
+            vision_score=vision["score"], vision_prediction=vision["prediction"],
+            audio_sync_score=lip["score"], physiological_score=rppg["score"],
+            audio_sync_offset_ms=lip.get("offset_ms"), audio_sync_confidence=lip.get("confidence"),
+            audio_sync_curve=lip.get("offset_curve"),
+            explanation=explain_data.get("text_explanation", ""),
+            heatmap_url=explain_data.get("heatmap_path"),
+            processing_time=time.perf_counter() - start,
+            model_version="1.0.0", file_type="video", timeline=vision.get("timeline")
+        ).model_dump()
+    finally:
+        if source is not None:
+            source.release()
+
+
+async def analyze_image(path: str, explain: bool, vs: VisionService, fusion: FusionService) -> dict:
+    start = time.perf_counter()
+    vision = await vs.detect_image(path)
+    fused = fusion.fuse_scores({"vision": vision})
+    explain_data = {}
+    if explain:
+        with timed("explain"):
+            explain_data = await ExplainService().explain_image(path, vision)
+    return DetectionResult(
+        overall_score=fused["overall_score"],
+        overall_prediction=fused["overall_prediction"],
+        confidence=fused["confidence"],
+        vision_score=vision["score"],
+        vision_prediction=vision["prediction"],
+        audio_sync_score=None,
+        physiological_score=None,
+        explanation=explain_data.get("text_explanation", ""),
+        heatmap_url=explain_data.get("heatmap_path"),
+        processing_time=time.perf_counter() - start,
+        model_version="1.0.0",
+        file_type="image"
+    ).model_dump()
@@ -1,6 +1,7 @@
 import numpy as np
 from typing import Dict, Any
 import logging
+from utils.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +71,10 @@ class FusionService:
     
     def fuse_scores(self, scores: dict) -> dict:
         """Main fusion method combining all modality scores"""
+        with timed("fusion"):
+            return self._fuse_scores(scores)
+
+    def _fuse_scores(self, scores: dict) -> dict:
         try:
             # Calculate weighted fusion score
             fused_score = self.weighted_fusion(scores)
@@ -0,0 +1,144 @@
+import asyncio, contextvars, datetime, time, logging
+from collections import deque
+import numpy as np
+from database import with_session
+from auth import crud
+from utils.config import get_settings
+from utils.executors import run_in_pool
+from utils.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+metrics.describe("history_queue_depth", "History rows waiting for the write-behind writer")
+metrics.describe("history_flush_seconds", "Time to commit one batch of history rows")
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Write-behind persistence for scan history.
+
+    ``enqueue`` only puts the row on an in-process queue; a background task commits
+    whatever has accumulated, up to HISTORY_BATCH_SIZE rows per transaction, at most
+    HISTORY_FLUSH_INTERVAL_MS after the first of them arrived. With SQLite this turns one
+    write lock per detection into one per batch. Rows still queued are flushed by ``stop``.
+    """
+
+    def __init__(self, batch_size: int = None, flush_interval_ms: float = None, max_queue: int = None):
+        self.batch_size = max(1, batch_size or settings.HISTORY_BATCH_SIZE)
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None
+                               else settings.HISTORY_FLUSH_INTERVAL_MS) / 1000.0
+        self.max_queue = max_queue or settings.HISTORY_QUEUE_SIZE
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        # metrics
+        self.flush_times = deque(maxlen=1000)
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            # empty context, as in MicroBatcher: the writer must not keep the first request's trace
+            self._worker = contextvars.Context().run(loop.create_task, self._run())
+
+    async def start(self):
+        self._ensure_worker()
+
+    async def enqueue(self, user_id: int, results: dict, filename: str = None, content_hash: str = None):
+        """Queue one history row; waits only when the writer is HISTORY_QUEUE_SIZE rows behind"""
+        self._ensure_worker()
+        entry = {"user_id": user_id, "results": results, "filename": filename, "content_hash": content_hash,
+                 "timestamp": datetime.datetime.utcnow()}  # time of the scan, not of the flush
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            logger.warning("History writer is behind; detect requests now wait for queue space")
+            await self._queue.put(entry)
+        metrics.set_gauge("history_queue_depth", self._queue.qsize())
+
+    async def _collect(self):
+        """(batch, whether ``stop`` was requested); the batch ends at the size limit, the
+        flush deadline or the stop marker, whichever comes first"""
+        batch, item = [], await self._queue.get()
+        deadline = time.perf_counter() + self.flush_interval
+        while item is not _STOP:
+            batch.append(item)
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, False
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return batch, False
+        return batch, True
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        start = time.perf_counter()
+        try:
+            await run_in_pool("io", with_session, crud.create_history_batch, batch)
+            self.written += len(batch)
+        except Exception as e:
+            # one bad row must not take the rest of the batch with it
+            logger.error(f"History batch of {len(batch)} failed ({e}); retrying row by row")
+            for entry in batch:
+                try:
+                    await run_in_pool("io", with_session, crud.create_history_batch, [entry])
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Could not record history for user {entry['user_id']}: {e}")
+        elapsed = time.perf_counter() - start
+        self.batches += 1
+        self.flush_times.append(elapsed)
+        metrics.observe("history_flush_seconds", elapsed)
+        metrics.set_gauge("history_queue_depth", self._queue.qsize())
+
+    async def stop(self):
+        """Commit everything queued so far, then stop the background task"""
+        if self._worker is None or self._worker.done():
+            return
+        # queued behind every pending row, so the worker flushes them all before it exits
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+    def stats(self) -> dict:
+        flushes = np.array(self.flush_times) * 1000.0 if self.flush_times else np.zeros(1)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "mean_batch_size": self.written / self.batches if self.batches else 0.0,
+            "flush_ms": {
+                "p50": float(np.percentile(flushes, 50)),
+                "p95": float(np.percentile(flushes, 95)),
+                "max": float(flushes.max()),
+            },
+        }
+
+
+history_writer = HistoryWriter()
+
+
+async def record_scan(user_id: int, result: dict, filename: str = None, content_hash: str = None):
+    """Add a finished analysis to the user's history without waiting for the database"""
+    if user_id is None:
+        return
+    await history_writer.enqueue(user_id, result, filename, content_hash)
@@ -0,0 +1,174 @@
+import asyncio, itertools, json, shutil, uuid, logging
+from collections import defaultdict
+from pathlib import Path
+from database import with_session
+from jobs import crud
+from utils.config import get_settings
+from utils.executors import run_in_pool
+from services.detection_pipeline import analyze_video, VIDEO_MODELS
+from services.history_service import record_scan
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def job_snapshot(job) -> dict:
+    """Public view of a job row (never exposes the stored upload path)"""
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "priority": job.priority,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+class JobManager:
+    """Bounded, prioritised queue of video analysis jobs persisted in the ``analysis_jobs`` table.
+
+    Uploads are moved into JOB_STORAGE_DIR and deleted once their job finishes.
+    Jobs still queued or running when the worker stops are re-queued on the next start.
+    """
+
+    def __init__(self, vs, lsvc, rsvc, fusion, cache, registry):
+        self.services = (vs, lsvc, rsvc, fusion)
+        self.cache = cache
+        self.registry = registry
+        self.storage_dir = Path(settings.JOB_STORAGE_DIR)
+        self.max_pending = settings.JOB_QUEUE_SIZE
+        self.num_workers = settings.JOB_WORKERS
+        self._queue = None
+        self._workers = []
+        self._seq = itertools.count()  # FIFO order within a priority
+        self._reserved = 0  # submissions between the capacity check and their enqueue
+        self._subscribers = defaultdict(set)
+
+    async def _db(self, fn, *args, **kwargs):
+        return await run_in_pool("io", with_session, fn, *args, **kwargs)
+
+    async def start(self):
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        await self.recover()
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def recover(self):
+        for job in await self._db(crud.get_active_jobs):
+            if Path(job.file_path).exists():
+                await self._db(crud.update_job, job.id, status="queued", stage="queued", progress=0.0)
+                self._queue.put_nowait((job.priority, next(self._seq), job.id))
+            else:
+                await self._db(crud.update_job, job.id, status="failed", stage="failed", error="Upload lost during restart")
+        if self._queue.qsize():
+            logger.info(f"Re-queued {self._queue.qsize()} video jobs after restart")
+
+    @property
+    def pending(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + self._reserved
+
+    async def submit(self, user_id: int, upload, suffix: str, explain: bool, priority: int, windowed: bool = False):
+        """Take ownership of ``upload`` and queue it; raises QueueFullError when the queue is at capacity"""
+        if self._queue is None:
+            raise RuntimeError("Job manager is not running")
+        if self.pending >= self.max_pending:
+            raise QueueFullError(f"{self.pending} jobs already queued")
+        # the slot is held across the awaits below, so concurrent submissions cannot overshoot
+        self._reserved += 1
+        try:
+            job_id = uuid.uuid4().hex
+            dest = self.storage_dir / f"{job_id}{suffix}"
+            await run_in_pool("io", shutil.move, upload.path, dest)
+            try:
+                job = await self._db(crud.create_job, job_id, user_id, str(dest), upload.sha256, explain, priority,
+                                     windowed)
+            except BaseException:
+                dest.unlink(missing_ok=True)
+                raise
+            self._queue.put_nowait((priority, next(self._seq), job_id))
+        finally:
+            self._reserved -= 1
+        return job
+
+    async def get(self, job_id: str):
+        return await self._db(crud.get_job, job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers[job_id].add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        self._subscribers[job_id].discard(queue)
+        if not self._subscribers[job_id]:
+            del self._subscribers[job_id]
+
+    async def _update(self, job_id: str, **fields):
+        await self._db(crud.update_job, job_id, **fields)
+        if self._subscribers.get(job_id):
+            job = await self.get(job_id)
+            if job is None:  # deleted with its user while running
+                return
+            snapshot = job_snapshot(job)
+            for queue in list(self._subscribers.get(job_id, ())):
+                queue.put_nowait(snapshot)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await self.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return
+        vs, lsvc, rsvc, fusion = self.services
+
+        async def progress(stage: str, fraction: float):
+            await self._update(job_id, stage=stage, progress=fraction)
+
+        finished = False
+        try:
+            await self._update(job_id, status="running", stage="starting", progress=0.0)
+            key = self.cache.make_key(job.content_hash, "video", self.registry.fingerprint(VIDEO_MODELS), explain=job.explain,
+                                      windowed=bool(job.windowed))
+            result = await self.cache.get_or_compute(
+                key, lambda path: analyze_video(path, job.explain, vs, lsvc, rsvc, fusion, progress=progress,
+                                                windowed=bool(job.windowed)), job.file_path)
+            await self._update(job_id, status="done", stage="done", progress=1.0, result=json.dumps(result))
+            finished = True
+            await record_scan(job.user_id, result, content_hash=job.content_hash)
+        except asyncio.CancelledError:
+            raise  # shutting down: the job stays "running" and is re-queued on the next start
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            finished = True
+            await self._update(job_id, status="failed", stage="failed", error=str(e))
+        finally:
+            # the upload is only kept while the job can still run (i.e. be re-queued after a restart)
+            if finished:
+                Path(job.file_path).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "max_pending": self.max_pending, "workers": len(self._workers)}
@@ -1,16 +1,67 @@
-import librosa, numpy as np, time
-from pathlib import Path
-from utils.config import get_settings
+import numpy as np, time, logging
+from models.registry import ModelRegistry, get_registry
 from models.lip_model import SyncNetWrapper
+from utils.frame_source import FrameSource
+from utils.audio_extractor import AudioTrack
+from utils.executors import run_in_pool
+from utils.metrics import timed
+from utils.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 class LipSyncService:
-    def __init__(self):
-        self.model = SyncNetWrapper(Path(settings.SYNCNET_MODEL_PATH))
+    def __init__(self, registry: ModelRegistry = None):
+        self.registry = registry or get_registry()
+
+    @property
+    def model(self):
+        return self.registry.get("syncnet")
+
+    def frame_indices(self, frame_count: int) -> list:
+        return SyncNetWrapper.sample_indices(frame_count)
+
+    @staticmethod
+    def offsets_ms() -> np.ndarray:
+        """Audio offsets to evaluate: -range..+range in LIP_SYNC_OFFSET_STEP_MS steps, always including 0"""
+        span, step = settings.LIP_SYNC_OFFSET_RANGE_MS, max(settings.LIP_SYNC_OFFSET_STEP_MS, 1.0)
+        half = int(span // step)
+        return np.arange(-half, half + 1) * step
+
+    def _score_sync(self, source: FrameSource, audio: AudioTrack) -> dict:
+        frames, kept = [], []
+        for idx in self.frame_indices(len(source)):
+            frame = source.get(idx)
+            if frame is not None:
+                frames.append(source.landmarks.lip_crop(idx, frame))
+                kept.append(idx)
+        if len(kept) < SyncNetWrapper.SYNC_FRAMES:
+            return {"score": self.model.predict(frames, None)}  # too few frames: the model's fixed low score
+        offsets = self.offsets_ms()
+        # MFCCs only at the sampled frames' timestamps (shifted by each offset), not over the whole track
+        timestamps = source.timestamps(kept)[None, :] + offsets[:, None] / 1000.0  # [K, T]
+        mfccs = audio.mfcc_at(timestamps.ravel())
+        if mfccs is None:
+            logger.info(f"No audio in {source.video_path}; lip-sync score is neutral")
+            return {"score": 0.5}
+        mfccs = mfccs.reshape(mfccs.shape[0], len(offsets), len(kept)).transpose(1, 0, 2)  # [K, 13, T]
+        try:
+            curve = self.model.predict_offsets(frames, mfccs)
+        except Exception as e:
+            logger.error(f"Error in SyncNet offset sweep: {e}")
+            return {"score": 0.5}  # same neutral default as SyncNetWrapper.predict
+        best = int(np.argmax(curve))
+        return {
+            "score": curve[len(offsets) // 2],  # zero offset: are audio and video in sync as delivered
+            "offset_ms": float(offsets[best]),
+            # SyncNet-style confidence: how far the best offset stands out from the typical one
+            "confidence": float(curve[best] - np.median(curve)),
+            "offset_curve": [{"offset_ms": float(o), "score": c} for o, c in zip(offsets, curve)],
+        }
 
-    async def detect_sync(self, frame_paths: list, audio_path: str) -> dict:
+    async def detect_sync(self, source: FrameSource, audio: AudioTrack) -> dict:
         start = time.time()
-        y, sr = librosa.load(audio_path, sr=None)
-        score = self.model.predict(frame_paths, y, sr)
-        return {"prediction": "sync" if score>0.5 else "mismatch", "score": score, "processing_time": time.time()-start}
+        with timed("lip_sync"):
+            result = await run_in_pool("lip_sync", self._score_sync, source, audio)
+        score = result["score"]
+        return {"prediction": "sync" if score>0.5 else "mismatch", **result, "processing_time": time.time()-start}
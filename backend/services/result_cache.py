@@ -0,0 +1,159 @@
+import asyncio, hashlib, json, os, shutil, sqlite3, threading, time, uuid, logging
+from collections import OrderedDict
+from pathlib import Path
+from utils.executors import run_in_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Detection results keyed by upload content hash, model versions and request flags.
+
+    The in-memory tier is an LRU bounded by ``max_entries``; entries older than
+    ``ttl`` seconds are treated as missing. An optional SQLite file adds a disk
+    tier that survives restarts. ``get_or_compute`` also collapses concurrent
+    requests for the same key onto a single computation.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400, disk_path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._db = None
+        self._db_lock = threading.Lock()
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)")
+            self._db.commit()
+        self.hits = {"memory": 0, "disk": 0, "inflight": 0}
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, kind: str, model_fingerprint: str, **flags) -> str:
+        flag_str = ",".join(f"{k}={flags[k]}" for k in sorted(flags))
+        return hashlib.sha256(f"{kind}|{content_hash}|{model_fingerprint}|{flag_str}".encode()).hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def get_memory(self, key: str):
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            if self._expired(item[0]):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return item[1]
+
+    def _put_memory(self, key: str, value: dict, stored_at: float):
+        with self._lock:
+            self._memory[key] = (stored_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get_disk(self, key: str):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT stored_at, value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0]):
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        value = json.loads(row[1])
+        self._put_memory(key, value, row[0])  # promote to the memory tier
+        return value
+
+    def put(self, key: str, value: dict):
+        stored_at = time.time()
+        self._put_memory(key, value, stored_at)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("INSERT OR REPLACE INTO results (key, stored_at, value) VALUES (?, ?, ?)",
+                                 (key, stored_at, json.dumps(value, default=str)))
+                self._db.commit()
+
+    async def get_or_compute(self, key: str, compute, source: str = None) -> dict:
+        """Return the cached value for ``key`` or await ``compute()`` exactly once across concurrent callers.
+
+        The computation runs as its own task, so a caller that is cancelled only stops
+        waiting; the others still get the result. It is cancelled once nobody waits for it.
+        With ``source`` (the caller's upload) the task works on its own hard link of that
+        file, passed as ``compute(path)`` and removed when the task settles, so callers may
+        delete their copy as soon as they stop waiting.
+        """
+        value = self.get_memory(key)
+        if value is not None:
+            self.hits["memory"] += 1
+            return value
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.hits["inflight"] += 1
+        else:
+            path = self._own_copy(source) if source is not None else None
+            task = asyncio.ensure_future(self._load_or_compute(key, compute, path))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda t: self._settled(key, t, path))
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if not entry[0].done() and entry[1] == 1:
+                entry[0].cancel()  # the last waiter left; nobody wants the result any more
+            raise
+        finally:
+            entry[1] -= 1
+
+    @staticmethod
+    def _own_copy(source: str) -> str:
+        # taken before the task exists, so the caller cannot delete ``source`` in between
+        root, ext = os.path.splitext(source)
+        path = f"{root}.shared-{uuid.uuid4().hex[:8]}{ext}"
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)  # no hard links on this filesystem
+        return path
+
+    def _settled(self, key: str, task, path: str = None):
+        if self._inflight.get(key, [None])[0] is task:
+            del self._inflight[key]
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+        if not task.cancelled():
+            task.exception()  # mark retrieved so a failure nobody awaited is not logged
+
+    async def _load_or_compute(self, key: str, compute, path: str = None) -> dict:
+        value = await run_in_pool("io", self.get_disk, key) if self._db is not None else None
+        if value is not None:
+            self.hits["disk"] += 1
+            return value
+        self.misses += 1
+        value = await (compute(path) if path is not None else compute())
+        if path is not None and not os.path.exists(path):
+            # decoders degrade rather than fail on a vanished file; never cache such a result
+            raise RuntimeError("Input disappeared during analysis")
+        if self._db is not None:
+            await run_in_pool("io", self.put, key, value)
+        else:
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk_tier": self._db is not None,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+        }
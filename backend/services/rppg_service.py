@@ -1,148 +1,222 @@
-import onnxruntime as ort
 import cv2, numpy as np, time
+from collections import deque
 import mediapipe as mp
-from scipy.signal import butter, filtfilt
-from pathlib import Path
+from scipy.signal import butter, sosfilt, sosfilt_zi
+from models.registry import ModelRegistry, get_registry
 from utils.config import get_settings
+from utils.executors import run_in_pool
+from utils.frame_source import FrameSource
+from utils.landmark_cache import detect_landmarks
+from utils.metrics import timed
+from utils.preprocessing import BatchPreprocessor
 import logging
 
-logger = logging.getLogger(__name__)
-mp_face = mp.solutions.face_mesh.FaceMesh(static_image_mode=False)
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-class RPPGService:
-    def __init__(self):
-        self.onnx_model = None
-        model_path = Path(settings.RPPG_MODEL_PATH) if hasattr(settings, 'RPPG_MODEL_PATH') else Path("pretrained_models/pulse_cnn.onnx")
-        
-        if model_path.exists():
-            try:
-                self.onnx_model = ort.InferenceSession(str(model_path))
-                logger.info(f"Loaded rPPG ONNX model from {model_path}")
-            except Exception as e:
-                logger.warning(f"Failed to load rPPG ONNX model: {e}. Using fallback method.")
-        else:
-            logger.warning(f"rPPG ONNX model not found at {model_path}. Using fallback method.")
-
-    def extract_face_roi(self, frame):
-        """Extract face ROI using MediaPipe"""
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = mp_face.process(rgb)
-        
-        if not results.multi_face_landmarks:
+HR_BAND_HZ = (0.75, 2.5)  # 45-150 bpm
+
+
+def hr_band(fs: float) -> tuple:
+    """HR_BAND_HZ with the upper edge kept below Nyquist, for low sample rates"""
+    low, high = HR_BAND_HZ[0], min(HR_BAND_HZ[1], 0.45 * fs)
+    if high <= low:
+        raise ValueError(f"rPPG sample rate {fs} Hz is too low for the {low} Hz heart-rate band")
+    return low, high
+ONNX_FRAMES = 30  # ROI crops fed to the rPPG ONNX model
+
+
+def roi_mean(frame, landmarks):
+    """Mean RGB over the forehead/cheek polygon, plus the RGB ROI and its mask.
+
+    Only the polygon's bounding box is touched: the crop is a view into ``frame`` and
+    the mask is bounding-box sized, so no full-frame copy is made.
+    """
+    points = landmarks.roi_polygon()
+    x, y, w, h = cv2.boundingRect(points)
+    x, y = max(x, 0), max(y, 0)
+    w, h = min(w, frame.shape[1] - x), min(h, frame.shape[0] - y)
+    if w <= 0 or h <= 0:
+        return None, None, None
+    crop = frame[y:y+h, x:x+w]
+    mask = np.zeros((h, w), np.uint8)
+    cv2.fillConvexPoly(mask, points - np.array([x, y], dtype=points.dtype), 255)
+    b, g, r, _ = cv2.mean(crop, mask=mask)
+    return (r, g, b), crop, mask
+
+
+class RPPGStream:
+    """Incremental rPPG signal for one face, fed one frame (or one ROI mean) at a time.
+
+    Samples arrive with their timestamps and are linearly resampled onto a uniform
+    ``fs`` grid, so irregular live streams and subsampled uploads share the same
+    filter. The band-pass is a second-order-sections IIR whose state is carried
+    between samples; only the last ``window_seconds`` of filtered signal are kept
+    (plus at most ONNX_FRAMES small ROI crops), so memory is constant however long
+    the stream runs. A gap longer than RPPG_MAX_GAP_SECONDS restarts the filter.
+    """
+
+    def __init__(self, fs: float = None, window_seconds: float = None, keep_rois: bool = False,
+                 landmark_interval: int = None):
+        self.fs = fs or settings.RPPG_SAMPLE_FPS
+        self.window = np.zeros(max(1, int(round((window_seconds or settings.RPPG_WINDOW_SECONDS) * self.fs))))
+        self.band = hr_band(self.fs)
+        self.sos = butter(1, self.band, btype="band", fs=self.fs, output="sos")
+        self.landmark_interval = max(1, landmark_interval or settings.RPPG_LANDMARK_INTERVAL)
+        self.rois = deque(maxlen=ONNX_FRAMES) if keep_rois else None
+        self.samples = 0  # filtered samples written to the window
+        self.frames = 0
+        self._zi = None
+        self._last = None  # (timestamp, value) of the previous raw sample
+        self._next_t = None
+        self._face_mesh = None
+        self._landmarks = None
+
+    def reset(self):
+        self.window[:] = 0
+        self.samples = 0
+        self._zi = self._last = self._next_t = None
+
+    def _emit(self, value: float):
+        if self._zi is None:
+            self._zi = sosfilt_zi(self.sos) * value  # start in steady state instead of ringing from 0
+        out, self._zi = sosfilt(self.sos, [value], zi=self._zi)
+        self.window[self.samples % len(self.window)] = out[0]
+        self.samples += 1
+
+    def push(self, value: float, timestamp: float):
+        """Add one raw sample (mean ROI intensity) taken at ``timestamp`` seconds"""
+        if self._last is not None and timestamp - self._last[0] > settings.RPPG_MAX_GAP_SECONDS:
+            self.reset()
+        if self._last is None:
+            self._emit(value)
+            self._last, self._next_t = (timestamp, value), timestamp + 1.0 / self.fs
+            return
+        t0, v0 = self._last
+        while self._next_t <= timestamp:
+            frac = (self._next_t - t0) / (timestamp - t0) if timestamp > t0 else 1.0
+            self._emit(v0 + (value - v0) * frac)
+            self._next_t += 1.0 / self.fs
+        self._last = (timestamp, value)
+
+    def push_frame(self, frame, timestamp: float):
+        """Add a BGR frame. FaceMesh runs here, in tracking mode, every ``landmark_interval``
+        frames; the face is assumed to stay put in between."""
+        if self._landmarks is None or self.frames % self.landmark_interval == 0:
+            if self._face_mesh is None:
+                self._face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
+            self._landmarks = detect_landmarks(self._face_mesh, frame, kind="rppg")
+        self.frames += 1
+        if self._landmarks is not None:
+            self.push_roi(frame, self._landmarks, timestamp)
+
+    def push_roi(self, frame, landmarks, timestamp: float):
+        """Add a BGR frame whose landmarks are already known (e.g. tracked by the caller)"""
+        mean_rgb, crop, mask = roi_mean(frame, landmarks)
+        if mean_rgb is None:
+            return
+        self.push(float(np.mean(mean_rgb)), timestamp)
+        if self.rois is not None:
+            roi = cv2.bitwise_and(crop, crop, mask=mask)  # bounding-box sized, not full frame
+            self.rois.append(cv2.cvtColor(cv2.resize(roi, (64, 64)), cv2.COLOR_BGR2RGB))
+
+    def signal(self) -> np.ndarray:
+        """Filtered samples currently in the window, oldest first"""
+        n = min(self.samples, len(self.window))
+        start = self.samples % len(self.window) if self.samples > len(self.window) else 0
+        return np.roll(self.window, -start)[:n]
+
+    def heart_rate(self):
+        """Dominant frequency of the filtered window in bpm, once there are ~3 s of signal"""
+        sig = self.signal()
+        if len(sig) < 3 * self.fs:
+            return None
+        spectrum = np.abs(np.fft.rfft(sig - sig.mean()))
+        freqs = np.fft.rfftfreq(len(sig), d=1.0 / self.fs)
+        band = (freqs >= self.band[0]) & (freqs <= self.band[1])
+        if not band.any() or not spectrum[band].any():
+            return None
+        return float(freqs[band][np.argmax(spectrum[band])] * 60.0)
+
+    def score(self):
+        """Pulse-signal power mapped to [0, 1] (None with fewer than 10 samples)"""
+        sig = self.signal()
+        if len(sig) < 10:
             return None
-            
-        landmarks = results.multi_face_landmarks[0].landmark
-        h, w, _ = rgb.shape
-        
-        # Define face ROI points (forehead, cheeks)
-        roi_points = [10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288]
-        points = np.array([[landmarks[i].x * w, landmarks[i].y * h] for i in roi_points], np.int32)
-        
-        # Create mask
-        mask = np.zeros(rgb.shape[:2], np.uint8)
-        cv2.fillConvexPoly(mask, points, 255)
-        
-        # Extract ROI
-        roi = cv2.bitwise_and(rgb, rgb, mask=mask)
-        return roi, mask
+        # Normalize power to probability
+        return min(max(float(np.var(sig)) / 2.0, 0.0), 1.0)
+
+    def close(self):
+        if self._face_mesh is not None:
+            self._face_mesh.close()
+            self._face_mesh = None
+
+
+class RPPGService:
+    # the ROIs are already RGB; only resize and scale to [0, 1]
+    preprocess = BatchPreprocessor(64, bgr_to_rgb=False)
+
+    def __init__(self, registry: ModelRegistry = None):
+        self.registry = registry or get_registry()
+
+    @property
+    def onnx_model(self):
+        return self.registry.get("rppg")
 
     def preprocess_for_onnx(self, frames):
         """Preprocess frames for ONNX model input"""
-        processed_frames = []
-        
-        for frame in frames:
-            # Resize to model input size (assuming 64x64)
-            resized = cv2.resize(frame, (64, 64))
-            # Normalize
-            normalized = resized.astype(np.float32) / 255.0
-            processed_frames.append(normalized)
-        
-        # Convert to NCHW format [1, C, T, H, W]
-        batch = np.array(processed_frames).transpose(3, 0, 1, 2)  # [C, T, H, W]
-        batch = np.expand_dims(batch, axis=0)  # [1, C, T, H, W]
-        return batch
-
-    async def detect_physiological(self, frame_paths: list) -> dict:
+        # Resize to model input size (assuming 64x64) and normalize: [T, C, H, W]
+        batch = self.preprocess(frames)
+        # Convert to [1, C, T, H, W]
+        return np.ascontiguousarray(batch.transpose(1, 0, 2, 3))[None]
+
+    def frame_indices(self, frame_count: int, fps: float) -> list:
+        """RPPG_WINDOW_SECONDS of consecutive frames from the middle of the video, at ~RPPG_SAMPLE_FPS"""
+        stride = max(1, int(round(fps / settings.RPPG_SAMPLE_FPS)))
+        span = min(frame_count, int(settings.RPPG_WINDOW_SECONDS * fps))
+        start = (frame_count - span) // 2
+        return list(range(start, start + span, stride))
+
+    def new_stream(self, fs: float = None) -> RPPGStream:
+        return RPPGStream(fs=fs, keep_rois=self.onnx_model is not None)
+
+    def score_stream(self, stream: RPPGStream) -> dict:
+        """Current prediction of ``stream``: the ONNX model if loaded, else band-pass signal power"""
+        heart_rate = stream.heart_rate()
+        if self.onnx_model is not None and stream.rois is not None and len(stream.rois) >= 5:
+            try:
+                input_batch = self.preprocess_for_onnx(list(stream.rois))
+                input_name = self.onnx_model.get_inputs()[0].name
+                output = self.onnx_model.run(None, {input_name: input_batch})
+                physiological_score = float(output[0][0])  # Assuming single output
+                return {"prediction": "physio_present" if physiological_score > 0.5 else "absent",
+                        "score": physiological_score, "heart_rate_bpm": heart_rate}
+            except Exception as e:
+                logger.error(f"ONNX model inference failed: {e}. Falling back to signal processing.")
+        physiological_score = stream.score()
+        if physiological_score is None:
+            # too little signal (no face, or a very short clip)
+            return {"prediction": "unknown" if stream.samples < 5 else "absent",
+                    "score": 0.0 if stream.samples < 5 else 0.3, "heart_rate_bpm": heart_rate}
+        return {"prediction": "physio_present" if physiological_score > 0.5 else "absent",
+                "score": physiological_score, "heart_rate_bpm": heart_rate}
+
+    async def detect_physiological(self, source: FrameSource) -> dict:
+        with timed("rppg"):
+            return await run_in_pool("rppg", self._detect_physiological, source)
+
+    def _detect_physiological(self, source: FrameSource) -> dict:
         start = time.time()
-        
+        indices = self.frame_indices(len(source), source.fps)
+        stream = self.new_stream()
         try:
-            # Sample frames for processing (max 30 frames)
-            if len(frame_paths) > 30:
-                indices = np.linspace(0, len(frame_paths)-1, 30, dtype=int)
-                sampled_paths = [frame_paths[i] for i in indices]
-            else:
-                sampled_paths = frame_paths
-            
-            face_rois = []
-            rgb_signals = []
-            
-            for fp in sampled_paths:
-                img = cv2.imread(fp)
-                if img is None:
-                    continue
-                    
-                # Extract face ROI
-                roi_result = self.extract_face_roi(img)
-                if roi_result is None:
-                    continue
-                    
-                roi, mask = roi_result
-                face_rois.append(roi)
-                
-                # Extract average RGB signal
-                mean_rgb = cv2.mean(roi, mask=mask)[:3]
-                rgb_signals.append(mean_rgb)
-            
-            if len(face_rois) < 5:
-                return {"prediction": "unknown", "score": 0.0, "processing_time": time.time() - start}
-            
-            # Use ONNX model if available
-            if self.onnx_model is not None:
-                try:
-                    # Preprocess for ONNX model
-                    input_batch = self.preprocess_for_onnx(face_rois)
-                    input_name = self.onnx_model.get_inputs()[0].name
-                    
-                    # Run ONNX inference
-                    output = self.onnx_model.run(None, {input_name: input_batch})
-                    physiological_score = float(output[0][0])  # Assuming single output
-                    
-                    prediction = "physio_present" if physiological_score > 0.5 else "absent"
-                    return {
-                        "prediction": prediction,
-                        "score": physiological_score,
-                        "processing_time": time.time() - start
-                    }
-                    
-                except Exception as e:
-                    logger.error(f"ONNX model inference failed: {e}. Falling back to signal processing.")
-            
-            # Fallback to signal processing method
-            signals = np.array([np.mean(signal) for signal in rgb_signals])
-            
-            # Apply bandpass filter for heart rate range (0.75-2.5 Hz @ 30fps)
-            if len(signals) >= 10:
-                try:
-                    b, a = butter(1, [0.75/15, 2.5/15], btype='band')  # Adjusted for sampling rate
-                    filtered_signal = filtfilt(b, a, signals)
-                    power = float(np.var(filtered_signal))
-                    
-                    # Normalize power to probability
-                    physiological_score = min(max(power / 2.0, 0.0), 1.0)
-                except Exception as e:
-                    logger.error(f"Signal processing failed: {e}")
-                    physiological_score = 0.3
-            else:
-                physiological_score = 0.3
-            
-            prediction = "physio_present" if physiological_score > 0.5 else "absent"
-            return {
-                "prediction": prediction,
-                "score": physiological_score,
-                "processing_time": time.time() - start
-            }
-            
+            # frames are decoded one by one and dropped after their ROI mean is taken
+            for idx, frame in source.iter_frames(indices):
+                stream.push_frame(frame, idx / source.fps)
+            result = self.score_stream(stream)
         except Exception as e:
             logger.error(f"Error in rPPG detection: {e}")
-            return {"prediction": "unknown", "score": 0.0, "processing_time": time.time() - start}
+            result = {"prediction": "unknown", "score": 0.0, "heart_rate_bpm": None}
+        finally:
+            stream.close()
+        return {**result, "processing_time": time.time() - start}
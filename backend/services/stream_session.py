@@ -0,0 +1,142 @@
+import asyncio, threading, time, logging
+import cv2, numpy as np
+import mediapipe as mp
+from utils.config import get_settings
+from utils.executors import run_in_pool
+from utils.landmark_cache import detect_landmarks, crop_box
+from utils.metrics import timed
+from services.rppg_service import RPPGStream
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def decode_frame(payload: bytes):
+    """Encoded JPEG/PNG/WebP bytes -> BGR array, or None if they cannot be decoded"""
+    return cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class StreamSession:
+    """State of one ``/detect/stream`` connection.
+
+    Incoming frames go into a single-slot mailbox: a frame that arrives before the
+    previous one was picked up replaces it, so the scorer always works on the newest
+    frame and lag stays bounded by one inference. The face box is re-detected only
+    every ``detect_interval`` frames (FaceMesh runs in tracking mode) and reused in
+    between. Scores are smoothed with an exponential moving average. With ``rppg``,
+    each processed frame also feeds a rolling heart-rate estimate.
+
+    ``close`` only stops the session; ``release`` frees its FaceMesh instances once no
+    frame is being prepared with them any more.
+    """
+
+    def __init__(self, vs, detect_interval: int = None, smoothing: float = None, rppg: bool = True):
+        self.vs = vs
+        self.rppg = RPPGStream() if rppg else None
+        self.detect_interval = max(1, detect_interval or settings.STREAM_DETECT_INTERVAL)
+        self.smoothing = smoothing if smoothing is not None else settings.STREAM_SMOOTHING
+        self._pending = None  # (frame_id, payload, received_at)
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._face_mesh = None
+        self._mesh_lock = threading.Lock()  # held while a vision-pool thread uses the FaceMesh instances
+        self._box = None
+        self._landmarks = None
+        self._frames_since_detect = 0
+        self.smoothed_score = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.detections = 0
+
+    def offer(self, payload: bytes, frame_id=None):
+        """Queue ``payload`` as the newest frame, dropping any frame still waiting"""
+        if self._pending is not None:
+            self.dropped += 1
+        self.received += 1
+        self._pending = (frame_id if frame_id is not None else self.received, payload, time.perf_counter())
+        self._ready.set()
+
+    async def next_frame(self):
+        """Wait for the newest unprocessed frame; None once the session is closed and drained"""
+        while self._pending is None:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        item, self._pending = self._pending, None
+        return item
+
+    def close(self):
+        """Stop handing out frames; ``next_frame`` returns None once the mailbox is empty"""
+        self._closed = True
+        self._ready.set()
+
+    def _release(self):
+        with self._mesh_lock:  # waits for a _prepare still running after its caller went away
+            if self.rppg is not None:
+                self.rppg.close()
+            if self._face_mesh is not None:
+                self._face_mesh.close()
+                self._face_mesh = None
+
+    async def release(self):
+        """Close the session and free its FaceMesh instances"""
+        self.close()
+        await run_in_pool("vision", self._release)
+
+    def _face_crop(self, frame: np.ndarray):
+        """Crop the tracked face; returns (crop, whether FaceMesh ran on this frame)"""
+        # a lost face or a resolution change forces detection on the next frame
+        if self._box is not None and (self._box[2] > frame.shape[1] or self._box[3] > frame.shape[0]):
+            self._box = None
+        detect = self._box is None or self._frames_since_detect >= self.detect_interval - 1
+        if detect:
+            if self._face_mesh is None:
+                self._face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1)
+            self._landmarks = detect_landmarks(self._face_mesh, frame, kind="stream")
+            self._box = self._landmarks.face_box() if self._landmarks is not None else None
+            self._frames_since_detect = 0
+            self.detections += 1
+        else:
+            self._frames_since_detect += 1
+        return (crop_box(frame, self._box) if self._box is not None else frame), detect
+
+    def _prepare(self, payload: bytes, received_at: float):
+        frame = decode_frame(payload)
+        if frame is None:
+            raise ValueError("Frame could not be decoded")
+        with self._mesh_lock:
+            crop, detected = self._face_crop(frame)
+            if self.rppg is not None and self._landmarks is not None:
+                # dropped frames just leave gaps; the stream resamples by arrival time
+                self.rppg.push_roi(frame, self._landmarks, received_at)
+        return crop, detected
+
+    async def process(self, frame_id, payload: bytes, received_at: float) -> dict:
+        with timed("stream_prepare"):
+            crop, detected = await run_in_pool("vision", self._prepare, payload, received_at)
+        res = await self.vs.detect_image_array(crop)
+        self.processed += 1
+        score = res["score"]
+        if self.smoothed_score is None:
+            self.smoothed_score = score
+        else:
+            self.smoothed_score = self.smoothing * score + (1 - self.smoothing) * self.smoothed_score
+        return {
+            "frame_id": frame_id,
+            "prediction": "fake" if self.smoothed_score > 0.5 else "real",
+            "score": score,
+            "smoothed_score": self.smoothed_score,
+            "face_tracked": self._box is not None,
+            "face_detected": detected,
+            "processing_time": res["processing_time"],
+            "latency_ms": (time.perf_counter() - received_at) * 1000.0,  # arrival to result, queueing included
+            "dropped": self.dropped,
+            "heart_rate_bpm": self.rppg.heart_rate() if self.rppg is not None else None,
+            "physiological_score": self.rppg.score() if self.rppg is not None else None,
+        }
+
+    def stats(self) -> dict:
+        return {"received": self.received, "processed": self.processed,
+                "dropped": self.dropped, "detections": self.detections}
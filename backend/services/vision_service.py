@@ -1,11 +1,12 @@
-import torch, time, cv2, numpy as np, logging
-from pathlib import Path
-import torchvision.transforms as T
-from PIL import Image
+import torch, time, numpy as np, logging
 from utils.config import get_settings
+from utils.preprocessing import BatchPreprocessor, IMAGENET_MEAN, IMAGENET_STD
 from utils.face_cropper import FaceCropper
-from models.image_model import ImageDeepfakeModel
-from models.video_model import VideoDeepfakeModel
+from models.registry import ModelRegistry, get_registry
+from services.batching import MicroBatcher
+from utils.executors import run_in_pool
+from utils.frame_source import FrameSource
+from utils.metrics import timed
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -15,48 +16,157 @@ class VisionService:
     allowed_video_ext = settings.ALLOWED_VIDEO_EXTENSIONS
     max_size = settings.MAX_FILE_SIZE
 
-    def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, registry: ModelRegistry = None):
+        self.registry = registry or get_registry()
+        self.device = self.registry.device
         self.face_cropper = FaceCropper()
-        self.image_model = ImageDeepfakeModel().to(self.device).eval()
-        self.video_model = VideoDeepfakeModel().to(self.device).eval()
-        self.transform = T.Compose([
-            T.Resize((settings.TARGET_IMAGE_SIZE, settings.TARGET_IMAGE_SIZE)),
-            T.ToTensor(),
-            T.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
-        ])
-
-        if Path(settings.VIT_MODEL_PATH).exists():
-            self.image_model.load_state_dict(torch.load(settings.VIT_MODEL_PATH, map_location=self.device))
-            logger.info("Loaded ViT weights")
-        if Path(settings.TIMESFORMER_MODEL_PATH).exists():
-            self.video_model.load_state_dict(torch.load(settings.TIMESFORMER_MODEL_PATH, map_location=self.device))
-            logger.info("Loaded Video weights")
+        self.preprocess = BatchPreprocessor(settings.TARGET_IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD)
+        # concurrent single-image requests share one forward pass
+        self.image_batcher = MicroBatcher(
+            self._score_image_batch,
+            max_batch_size=settings.IMAGE_BATCH_MAX_SIZE,
+            max_wait_ms=settings.IMAGE_BATCH_MAX_WAIT_MS,
+            name="image_model",
+            executor="vision",
+        )
+
+    # models are looked up on every call so hot reloads in the registry take effect immediately
+    @property
+    def image_model(self):
+        return self.registry.get("image")
+
+    @property
+    def video_model(self):
+        return self.registry.get("video")
+
+    def _score_image_batch(self, tensors: list) -> list:
+        """One forward pass over a list of [3,H,W] tensors, returning a probability per tensor"""
+        x = torch.stack(tensors).to(self.device)
+        with torch.no_grad():
+            return torch.sigmoid(self.image_model(x)).tolist()
+
+    def _prepare_array(self, arr: np.ndarray) -> torch.Tensor:
+        # copied: the tensor waits in the micro-batcher while this thread preprocesses other frames
+        with timed("preprocess"):
+            return torch.from_numpy(self.preprocess([arr], copy=True)[0])
+
+    def _prepare_batch(self, frames: list) -> torch.Tensor:
+        """[N,3,H,W] model input for BGR ``frames``; reuses this thread's buffer, so consume it before the next call"""
+        return torch.from_numpy(self.preprocess(frames)).to(self.device)
+
+    def _prepare_image(self, path: str) -> torch.Tensor:
+        return self._prepare_array(self.face_cropper.crop(path))
+
+    def frame_indices(self, frame_count: int) -> list:
+        # sample CLIP_LENGTH frames uniformly
+        return np.linspace(0, frame_count-1, settings.CLIP_LENGTH, dtype=int).tolist()
+
+    def window_indices(self, frame_count: int, fps: float) -> list:
+        """Frames for windowed analysis: VIDEO_WINDOW_FPS over the whole video, capped at VIDEO_FRAME_BUDGET"""
+        wanted = int(np.ceil(frame_count / fps * settings.VIDEO_WINDOW_FPS)) if fps > 0 else frame_count
+        count = max(settings.CLIP_LENGTH, min(wanted, settings.VIDEO_FRAME_BUDGET, frame_count))
+        return np.linspace(0, frame_count-1, count, dtype=int).tolist()
+
+    @staticmethod
+    def window_starts(frame_count: int, stride: int = None) -> list:
+        """Start offsets of overlapping CLIP_LENGTH windows over ``frame_count`` sampled frames"""
+        clip, stride = settings.CLIP_LENGTH, max(1, stride or settings.VIDEO_WINDOW_STRIDE)
+        last = max(0, frame_count - clip)
+        starts = list(range(0, last + 1, stride))
+        if starts[-1] != last:
+            starts.append(last)  # always cover the tail
+        return starts
+
+    def encode_frames(self, source: FrameSource, indices: list) -> list:
+        """Run the backbone over the frames of ``indices`` not yet in ``source.features``, in chunks.
+
+        Returns ``indices`` minus frames that could not be decoded; those all have cached features.
+        """
+        model = self.video_model
+        source.features.bind(model)
+        missing = source.features.missing(indices)
+        chunk = max(1, settings.VIDEO_ENCODE_BATCH)
+        for i in range(0, len(missing), chunk):
+            crops, encoded = [], []
+            for idx in missing[i:i + chunk]:
+                frame = source.get(idx)
+                if frame is not None:
+                    crops.append(source.landmarks.face_crop(idx, frame))
+                    encoded.append(idx)
+            if crops:
+                with torch.no_grad():
+                    features = model.encode_frames(self._prepare_batch(crops))
+                source.features.put(encoded, features.float().cpu().numpy())
+        unusable = set(source.features.missing(indices))
+        return [i for i in indices if i not in unusable]
+
+    def _classify_windows(self, source: FrameSource, windows: list) -> list:
+        """Temporal-head probability for each window (a list of frame indices with cached features)"""
+        scores, batch_size = [], max(1, settings.VIDEO_WINDOW_BATCH)
+        for i in range(0, len(windows), batch_size):
+            batch = windows[i:i + batch_size]
+            x = torch.stack([torch.from_numpy(source.features.get(w)) for w in batch])  # [B, T, features, h, w]
+            x = x.permute(0, 2, 1, 3, 4).contiguous().to(self.device)  # [B, features, T, h, w]
+            with torch.no_grad():
+                scores.extend(torch.sigmoid(self.video_model.classify_features(x)).flatten().tolist())
+        return scores
+
+    def _score_video(self, source: FrameSource) -> float:
+        kept = self.encode_frames(source, self.frame_indices(len(source)))
+        if not kept:
+            raise ValueError("No decodable frames in video")
+        return self._classify_windows(source, [kept])[0]
+
+    def score_windows(self, source: FrameSource, indices: list, stride: int = None) -> list:
+        """(first frame, last frame, probability) for each overlapping window over ``indices``.
+
+        Frames are encoded once into ``source.features``; overlapping windows, and later
+        rescoring with another stride, only run the temporal head, VIDEO_WINDOW_BATCH windows at a time.
+        """
+        kept = self.encode_frames(source, indices)
+        if not kept:
+            return []
+        if len(kept) < settings.CLIP_LENGTH:  # too short for one window: repeat frames like frame_indices does
+            kept = [kept[i] for i in np.linspace(0, len(kept)-1, settings.CLIP_LENGTH, dtype=int)]
+        clip = settings.CLIP_LENGTH
+        windows = [kept[s:s + clip] for s in self.window_starts(len(kept), stride)]
+        return [(w[0], w[-1], score) for w, score in zip(windows, self._classify_windows(source, windows))]
 
     async def detect_image(self, path: str) -> dict:
         start = time.time()
-        face = self.face_cropper.crop(path)
-        img = Image.fromarray(cv2.cvtColor(face, cv2.COLOR_BGR2RGB))
-        x = self.transform(img).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            prob = torch.sigmoid(self.image_model(x)).item()
+        x = await run_in_pool("vision", self._prepare_image, path)
+        with timed("vision_model"):
+            prob = await self.image_batcher.submit(x)
         return {"prediction": "fake" if prob>0.5 else "real", "score": prob, "processing_time": time.time()-start}
 
     async def detect_image_array(self, arr: np.ndarray) -> dict:
         start = time.time()
-        img = Image.fromarray(cv2.cvtColor(arr, cv2.COLOR_BGR2RGB))
-        x = self.transform(img).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            prob = torch.sigmoid(self.image_model(x)).item()
+        x = await run_in_pool("vision", self._prepare_array, arr)
+        with timed("vision_model"):
+            prob = await self.image_batcher.submit(x)
         return {"prediction": "fake" if prob>0.5 else "real", "score": prob, "processing_time": time.time()-start}
 
-    async def detect_video(self, frame_paths: list) -> dict:
+    async def detect_video(self, source: FrameSource) -> dict:
         start = time.time()
-        # sample CLIP_LENGTH frames uniformly
-        idxs = np.linspace(0, len(frame_paths)-1, settings.CLIP_LENGTH, dtype=int)
-        frames = [cv2.imread(frame_paths[i]) for i in idxs]
-        clip = [self.transform(Image.fromarray(cv2.cvtColor(f, cv2.COLOR_BGR2RGB))) for f in frames]
-        x = torch.stack(clip, dim=1).unsqueeze(0).to(self.device)  # [1,3,T,H,W]
-        with torch.no_grad():
-            prob = torch.sigmoid(self.video_model(x)).item()
+        with timed("vision"):
+            prob = await run_in_pool("vision", self._score_video, source)
         return {"prediction": "fake" if prob>0.5 else "real", "score": prob, "processing_time": time.time()-start}
+
+    async def detect_video_windows(self, source: FrameSource, indices: list) -> dict:
+        """Per-segment scores over the whole video; the aggregate is the highest segment score,
+        so a short manipulated segment is not averaged away by the rest of the clip"""
+        start = time.time()
+        with timed("vision"):
+            windows = await run_in_pool("vision", self.score_windows, source, indices)
+        if not windows:
+            raise ValueError("No decodable frames for windowed analysis")
+        timeline = [
+            {"start_frame": first, "end_frame": last,
+             "start_time": first / source.fps if source.fps_known else None,
+             "end_time": (last + 1) / source.fps if source.fps_known else None, "score": score}
+            for first, last, score in windows
+        ]
+        prob = max(w["score"] for w in timeline)
+        return {"prediction": "fake" if prob>0.5 else "real", "score": prob,
+                "mean_score": float(np.mean([w["score"] for w in timeline])),
+                "timeline": timeline, "processing_time": time.time()-start}
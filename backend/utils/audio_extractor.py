@@ -1 +1,141 @@
- 
\ No newline at end of file
+import subprocess, threading, logging
+import numpy as np
+import librosa
+from utils.config import get_settings
+from utils.executors import run_in_pool
+from utils.metrics import timed
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def decode_audio(video_path: str, sr: int, start: float = None, duration: float = None) -> np.ndarray:
+    """Mono float32 samples at ``sr`` piped straight out of ffmpeg; empty if there is no audio stream"""
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start is not None:
+        cmd += ["-ss", f"{start:.6f}"]  # input seeking: only the requested span is decoded
+    cmd += ["-i", video_path]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]
+    cmd += ["-vn", "-ac", "1", "-ar", str(sr), "-f", "f32le", "pipe:1"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode != 0 and not proc.stdout:
+        logger.warning(f"No audio decoded from {video_path}: {proc.stderr.decode(errors='ignore').strip()[-200:]}")
+    return np.frombuffer(proc.stdout, dtype=np.float32)
+
+
+# requested windows closer than this are decoded as one span instead of another seek
+SPAN_MERGE_GAP_SECONDS = 1.0
+
+
+def decode_spans(video_path: str, sr: int, spans: list) -> list:
+    """Decode several ``(start sample, length)`` spans with a single ffmpeg process.
+
+    Each span is its own seeked input, so only those spans are decoded; every result has
+    exactly ``length`` samples, zero-padded past the end of the track. Empty if there is
+    no audio stream.
+    """
+    cmd, chains = ["ffmpeg", "-nostdin", "-loglevel", "error"], []
+    for i, (start, n) in enumerate(spans):
+        cmd += ["-ss", f"{start / sr:.6f}", "-t", f"{n / sr:.6f}", "-i", video_path]
+        chains.append(f"[{i}:a:0]aresample={sr},aformat=sample_fmts=flt:channel_layouts=mono,"
+                      f"apad=whole_len={n},atrim=end_sample={n}[a{i}]")
+    inputs = "".join(f"[a{i}]" for i in range(len(spans)))
+    cmd += ["-filter_complex", ";".join(chains) + f";{inputs}concat=n={len(spans)}:v=0:a=1[out]",
+            "-map", "[out]", "-f", "f32le", "pipe:1"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    samples = np.frombuffer(proc.stdout, dtype=np.float32)
+    if not len(samples):
+        logger.warning(f"No audio decoded from {video_path}: {proc.stderr.decode(errors='ignore').strip()[-200:]}")
+        return []
+    if len(samples) != sum(n for _, n in spans):
+        # an ffmpeg build whose filters pad differently; still correct, one process per span
+        logger.debug(f"Span decode of {video_path} returned {len(samples)} samples; decoding spans one by one")
+        out = []
+        for start, n in spans:
+            chunk = decode_audio(video_path, sr, start=start / sr, duration=n / sr)[:n]
+            out.append(np.pad(chunk, (0, n - len(chunk))))
+        return out
+    return np.split(samples, np.cumsum([n for _, n in spans])[:-1])
+
+
+class AudioTrack:
+    """Audio of one video with MFCCs computed only where they are needed, cached per request.
+
+    Short tracks (up to AUDIO_FULL_DECODE_SECONDS) are decoded once in full; longer ones
+    decode just the ``n_fft`` samples around each requested timestamp, all of them in one
+    seeking ffmpeg call, so the cost follows the number of sampled frames rather than the
+    length of the audio.
+    """
+
+    def __init__(self, video_path: str, sr: int = None):
+        self.video_path = video_path
+        self.sr = sr or settings.AUDIO_SAMPLE_RATE
+        self.samples = None  # full track once decoded
+        self.has_audio = None  # unknown until something was decoded
+        self._mfcc = {}  # (centre sample, n_mfcc, n_fft) -> MFCC column
+        self._lock = threading.Lock()
+
+    def load(self, duration: float):
+        """Decode the whole track up front when it is short enough"""
+        if duration <= settings.AUDIO_FULL_DECODE_SECONDS:
+            self.samples = decode_audio(self.video_path, self.sr)
+            self.has_audio = len(self.samples) > 0
+
+    def _segments(self, centres: list, n: int):
+        """``[len(centres), n]`` samples around each centre, zero-padded past either end of the
+        track; None if there is no audio stream"""
+        starts = [c - n // 2 for c in centres]
+        out = np.zeros((len(centres), n), dtype=np.float32)
+        if self.samples is not None:
+            for row, start in enumerate(starts):
+                lo, hi = max(start, 0), min(start + n, len(self.samples))
+                if hi > lo:
+                    out[row, lo - start:hi - start] = self.samples[lo:hi]
+            return out
+        # merge overlapping and nearby windows (e.g. the offsets swept around one frame) into spans
+        gap, spans = int(SPAN_MERGE_GAP_SECONDS * self.sr), []
+        for start in sorted(set(starts)):
+            lo = max(start, 0)
+            if spans and lo <= spans[-1][1] + gap:
+                spans[-1][1] = max(spans[-1][1], start + n)
+            else:
+                spans.append([lo, start + n])
+        decoded = decode_spans(self.video_path, self.sr, [(lo, hi - lo) for lo, hi in spans])
+        self.has_audio = bool(decoded)
+        if not decoded:
+            return None
+        for row, start in enumerate(starts):
+            for (lo, hi), chunk in zip(spans, decoded):
+                if lo <= max(start, 0) < hi:
+                    skip = max(-start, 0)
+                    out[row, skip:] = chunk[max(start, 0) - lo:start + n - lo]
+                    break
+        return out
+
+    def mfcc_at(self, timestamps, n_mfcc: int = 13, n_fft: int = 512):
+        """``[n_mfcc, T]`` MFCCs, one column per timestamp (seconds); None only if there is no audio
+        stream, silent windows yield the features of silence"""
+        if self.has_audio is False:
+            return None
+        centres = [int(round(t * self.sr)) for t in timestamps]
+        with self._lock:
+            missing = [c for c in dict.fromkeys(centres) if (c, n_mfcc, n_fft) not in self._mfcc]
+            if missing:
+                segments = self._segments(missing, n_fft)  # [M, n_fft]
+                if segments is None:
+                    return None
+                # one frame per segment: no hop, no centring
+                cols = librosa.feature.mfcc(y=segments, sr=self.sr, n_mfcc=n_mfcc, n_fft=n_fft,
+                                            hop_length=n_fft, center=False)[..., 0]  # [M, n_mfcc]
+                for c, col in zip(missing, cols):
+                    self._mfcc[(c, n_mfcc, n_fft)] = col
+            return np.stack([self._mfcc[(c, n_mfcc, n_fft)] for c in centres], axis=1).astype(np.float32)
+
+
+class AudioExtractor:
+    async def extract(self, video_path: str, duration: float) -> AudioTrack:
+        track = AudioTrack(video_path)
+        with timed("audio_extraction"):
+            await run_in_pool("io", track.load, duration)
+        return track
@@ -5,6 +5,20 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_CACHE_SIZE: int = 10000  # verified tokens kept per worker; 0 verifies every request against the DB
+    AUTH_CACHE_TTL_SECONDS: float = 300.0  # upper bound on how long other workers trust a revoked token
+    # usernames allowed to run operator endpoints (model reloads); empty disables them for everyone
+    ADMIN_USERNAMES: tuple = ()
+
+    # database connections; with SQLite the file is opened in WAL mode (readers never block the writer)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # how long a writer waits for another process's write lock
+
+    # write-behind scan history: detect routes queue rows, a background task commits them in batches
+    HISTORY_BATCH_SIZE: int = 64  # rows per transaction
+    HISTORY_FLUSH_INTERVAL_MS: float = 200.0  # max delay between a scan and its commit
+    HISTORY_QUEUE_SIZE: int = 10000  # beyond this, detect requests wait for the writer
 
     MAX_FILE_SIZE: int = 50 * 1024 * 1024
     ALLOWED_IMAGE_EXTENSIONS: tuple = (".jpg", ".jpeg", ".png")
@@ -14,10 +28,84 @@ class Settings(BaseSettings):
     TIMESFORMER_MODEL_PATH: str = "pretrained_models/timesformer_deepfake.pt"
     SYNCNET_MODEL_PATH: str = "pretrained_models/syncnet.pth"
     RPPG_MODEL_PATH: str = "pretrained_models/pulse_cnn.onnx"
+    MODEL_DIR: str = "pretrained_models"  # hot reloads may only load checkpoints from here
+    PRELOAD_MODELS: bool = True  # load every model at worker startup instead of on first use
+    MODEL_WARMUP: bool = True
+
+    # inference backend per model: "torch" (eager), "onnx" or "torchscript" (see data_pipeline/export_models.py)
+    IMAGE_MODEL_BACKEND: str = "torch"
+    VIDEO_MODEL_BACKEND: str = "torch"
+    SYNCNET_MODEL_BACKEND: str = "torch"
+    ORT_INTRA_OP_THREADS: int = 0  # 0 lets ONNX Runtime decide
+    ORT_INTER_OP_THREADS: int = 0
+    # CPU-only INT8 mode for the image, video and SyncNet models: "none", "dynamic" or "static"
+    # ("static" loads graphs calibrated by data_pipeline/quantize_models.py, falling back to "dynamic")
+    MODEL_QUANTIZATION: str = "none"
 
     TARGET_IMAGE_SIZE: int = 224
     CLIP_LENGTH: int = 16  # number of frames per video clip
 
+    # windowed video analysis (?windowed=true): overlapping CLIP_LENGTH windows over the whole video
+    VIDEO_WINDOW_FPS: float = 8.0  # sampling rate of the frames the windows are built from
+    VIDEO_WINDOW_STRIDE: int = 8  # sampled frames between window starts
+    VIDEO_FRAME_BUDGET: int = 256  # max frames decoded and encoded per video, whatever its length
+    VIDEO_ENCODE_BATCH: int = 32  # frames per backbone forward pass
+    VIDEO_WINDOW_BATCH: int = 8  # windows per temporal-head forward pass
+    FEATURE_CACHE_MEMMAP_FRAMES: int = 1024  # per-frame backbone features beyond this many rows go to a memmap file
+    FEATURE_CACHE_DIR: str = ""  # directory for those files; empty uses the system temp dir
+
+    # FaceMesh localization
+    LANDMARK_MAX_SIDE: int = 640  # frames are downscaled to this longer side before FaceMesh; 0 keeps full size
+    LANDMARK_KEYFRAME_INTERVAL: int = 8  # full detection at least every N frames of a tracked run
+    LANDMARK_TRACK_MAX_GAP: int = 4  # frames further apart than this are not tracked, each gets full detection
+
+    # audio for lip-sync: decoded through an ffmpeg pipe, MFCCs only at sampled frame timestamps
+    AUDIO_SAMPLE_RATE: int = 16000
+    AUDIO_FULL_DECODE_SECONDS: float = 600.0  # longer tracks decode only the windows around sampled frames
+    LIP_SYNC_OFFSET_RANGE_MS: float = 200.0  # audio offsets swept by SyncNet in one batch; 0 scores only in-sync
+    LIP_SYNC_OFFSET_STEP_MS: float = 40.0
+
+    # rPPG: streamed band-pass over consecutive frames, resampled to a uniform rate
+    RPPG_SAMPLE_FPS: float = 15.0
+    RPPG_WINDOW_SECONDS: float = 10.0  # span analysed per upload and rolling window kept per stream
+    RPPG_LANDMARK_INTERVAL: int = 5  # FaceMesh every N frames; the ROI polygon is reused in between
+    RPPG_MAX_GAP_SECONDS: float = 1.0  # longer gaps between samples restart the filter
+
+    # dynamic micro-batching in front of ImageDeepfakeModel
+    IMAGE_BATCH_MAX_SIZE: int = 16
+    IMAGE_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # executor pools for blocking work, sized per modality
+    VISION_THREADS: int = 2
+    LIP_SYNC_THREADS: int = 1
+    RPPG_THREADS: int = 1
+    IO_THREADS: int = 4
+    AUTH_THREADS: int = 2  # token-cache misses; kept apart so logins never queue behind video I/O
+    DECODE_PROCESSES: int = 0  # > 0 decodes uploads in a process pool instead of IO threads
+    TORCH_NUM_THREADS: int = 0  # intra-op threads per forward pass; 0 keeps the torch default
+
+    # result cache for repeated uploads
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_SIZE: int = 1024
+    RESULT_CACHE_TTL: int = 24 * 60 * 60  # seconds; 0 disables expiry
+    RESULT_CACHE_PATH: str = ""  # SQLite file for the on-disk tier; empty keeps the cache in memory
+
+    # /detect/stream sessions
+    STREAM_DETECT_INTERVAL: int = 5  # run FaceMesh every N processed frames, reuse the face box in between
+    STREAM_SMOOTHING: float = 0.3  # EMA weight of the newest frame score
+    STREAM_MAX_FRAME_BYTES: int = 2 * 1024 * 1024
+
+    # /detect/batch: many uploads in one request, results streamed back as NDJSON
+    BATCH_MAX_ITEMS: int = 256
+    BATCH_MAX_BYTES: int = 1024 * 1024 * 1024  # whole request body
+    BATCH_CONCURRENCY: int = 16  # items analysed at once; also bounds the results held in memory
+    BATCH_MAX_VIDEO_SECONDS: float = 60.0  # longer videos belong in /jobs/video
+
+    # asynchronous video jobs
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_SIZE: int = 32  # submissions beyond this many queued jobs get 503
+    JOB_STORAGE_DIR: str = "job_uploads"
+
     class Config:
         env_file = ".env"
 
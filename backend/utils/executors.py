@@ -0,0 +1,63 @@
+import asyncio, contextvars, functools, threading, logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Torch, OpenCV, ONNX Runtime and MediaPipe release the GIL in their native code,
+# so model modalities run on thread pools that share the process-wide model registry.
+# Frame decoding can optionally move to a process pool (DECODE_PROCESSES > 0).
+_THREAD_POOLS = {
+    "vision": lambda: settings.VISION_THREADS,
+    "lip_sync": lambda: settings.LIP_SYNC_THREADS,
+    "rppg": lambda: settings.RPPG_THREADS,
+    "io": lambda: settings.IO_THREADS,
+    "auth": lambda: settings.AUTH_THREADS,
+}
+
+_executors = {}
+_lock = threading.RLock()  # "decode" falls back to the io pool while holding it
+
+
+def _create(name: str) -> Executor:
+    if name == "decode":
+        if settings.DECODE_PROCESSES > 0:
+            return ProcessPoolExecutor(max_workers=settings.DECODE_PROCESSES)
+        return get_executor("io")
+    if name not in _THREAD_POOLS:
+        raise KeyError(f"Unknown executor: {name}")
+    return ThreadPoolExecutor(max_workers=max(1, _THREAD_POOLS[name]()), thread_name_prefix=f"{name}-worker")
+
+
+def get_executor(name: str) -> Executor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = _create(name)
+    return executor
+
+
+async def run_in_pool(name: str, fn, *args, **kwargs):
+    """Run blocking ``fn`` on the ``name`` pool without stalling the event loop.
+
+    On thread pools ``fn`` runs in a copy of the caller's context, so context variables
+    such as the request trace reach the worker; processes get the plain call.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor(name)
+    call = functools.partial(fn, *args, **kwargs)
+    if not isinstance(executor, ProcessPoolExecutor):
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(executor, call)
+
+
+def shutdown_executors():
+    with _lock:
+        pools = set(_executors.values())
+        _executors.clear()
+    for executor in pools:
+        executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("Executor pools shut down")
@@ -1,18 +1,16 @@
-import cv2, mediapipe as mp, numpy as np
+import cv2, numpy as np
+from utils.landmark_cache import detect_landmarks, crop_box, face_mesh_pool
+from utils.metrics import timed
 
 class FaceCropper:
-    def __init__(self):
-        self.face = mp.solutions.face_mesh.FaceMesh(static_image_mode=True)
-
     def crop(self, image_path: str) -> np.ndarray:
-        img = cv2.imread(image_path)
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        res = self.face.process(rgb)
-        if not res.multi_face_landmarks:
+        with timed("image_decode"):
+            img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError("Could not decode image")
+        # each vision worker thread has its own FaceMesh, so no lock is needed
+        with timed("face_crop"):
+            lm = detect_landmarks(face_mesh_pool.get(), img, kind="image")
+        if lm is None:
             return img
-        lm = res.multi_face_landmarks[0].landmark
-        h, w, _ = img.shape
-        xs = [pt.x*w for pt in lm]; ys = [pt.y*h for pt in lm]
-        x1, x2 = int(min(xs)), int(max(xs))
-        y1, y2 = int(min(ys)), int(max(ys))
-        return img[y1:y2, x1:x2]
+        return crop_box(img, lm.face_box())
@@ -0,0 +1,90 @@
+import os, tempfile, threading, logging
+import numpy as np
+from utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class FeatureCache:
+    """Per-request backbone features keyed by frame index.
+
+    Frames are encoded once and any window of them can then be re-scored by the
+    temporal head without touching the backbone again. Rows live in one growable
+    float32 buffer; once it would exceed FEATURE_CACHE_MEMMAP_FRAMES rows it moves
+    to an ``np.memmap`` file so long videos do not pin their features in RAM.
+    Features are tied to the model that produced them and dropped when it changes.
+    """
+
+    def __init__(self, memmap_frames: int = None, memmap_dir: str = None):
+        self.memmap_frames = settings.FEATURE_CACHE_MEMMAP_FRAMES if memmap_frames is None else memmap_frames
+        self.memmap_dir = memmap_dir or settings.FEATURE_CACHE_DIR or None
+        self._rows = {}  # frame index -> row in _buffer
+        self._buffer = None
+        self._path = None
+        self._owner = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def bind(self, model):
+        """Forget features computed by a different model (e.g. after a hot reload)"""
+        with self._lock:
+            if self._owner is not model:
+                self._rows.clear()
+                self._close_buffer()  # the new model may produce a different feature shape
+                self._owner = model
+
+    def missing(self, indices) -> list:
+        with self._lock:
+            return [int(i) for i in dict.fromkeys(indices) if int(i) not in self._rows]
+
+    def _allocate(self, capacity: int, shape: tuple):
+        if capacity > self.memmap_frames:
+            fd, path = tempfile.mkstemp(suffix=".features", dir=self.memmap_dir)
+            os.close(fd)
+            buffer = np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity,) + shape)
+            return buffer, path
+        return np.empty((capacity,) + shape, dtype=np.float32), None
+
+    def _reserve(self, extra: int, shape: tuple):
+        used = len(self._rows)
+        if self._buffer is not None and used + extra <= len(self._buffer):
+            return
+        capacity = max(used + extra, 2 * len(self._buffer) if self._buffer is not None else 0)
+        buffer, path = self._allocate(capacity, shape)
+        if used:
+            buffer[:used] = self._buffer[:used]
+        self._close_buffer()
+        self._buffer, self._path = buffer, path
+        if path:
+            logger.info(f"Feature cache spilled {capacity} frames to {path}")
+
+    def put(self, indices: list, features: np.ndarray):
+        """Store ``features[i]`` for ``indices[i]``"""
+        with self._lock:
+            new = [(i, f) for i, f in zip(indices, features) if int(i) not in self._rows]
+            if not new:
+                return
+            self._reserve(len(new), features.shape[1:])
+            row = len(self._rows)
+            for idx, feat in new:
+                self._buffer[row] = feat
+                self._rows[int(idx)] = row
+                row += 1
+
+    def get(self, indices) -> np.ndarray:
+        """``[N, *feature_shape]`` copy of the cached features for ``indices`` (all must be cached)"""
+        with self._lock:
+            return self._buffer[[self._rows[int(i)] for i in indices]]
+
+    def _close_buffer(self):
+        path, self._buffer, self._path = self._path, None, None
+        if path is not None:
+            os.unlink(path)  # the mapping itself goes away with the last reference to the array
+
+    def close(self):
+        with self._lock:
+            self._rows.clear()
+            self._close_buffer()
@@ -0,0 +1,201 @@
+import cv2, threading, logging
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from utils.executors import run_in_pool, get_executor
+from utils.landmark_cache import LandmarkCache
+from utils.feature_cache import FeatureCache
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# gaps larger than this are crossed with a container seek instead of grabbing every frame
+SEEK_THRESHOLD = 48
+
+
+def _decode_into(video_path: str, indices: list, out: np.ndarray) -> list:
+    """Decode ``indices`` (ascending) in one pass straight into ``out`` (``[N,H,W,3]`` uint8).
+    Returns one success flag per index."""
+    cap = cv2.VideoCapture(video_path)
+    ok, pos = [], 0
+    try:
+        for slot, target in enumerate(indices):
+            if target - pos > SEEK_THRESHOLD:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                pos = target
+            while pos < target and cap.grab():  # grab() skips colour conversion of unused frames
+                pos += 1
+            if pos != target or not cap.grab():
+                ok.append(False)
+                continue
+            pos += 1
+            ret, frame = cap.retrieve()
+            good = bool(ret) and frame.shape == out.shape[1:]
+            if good:
+                out[slot] = frame
+            ok.append(good)
+        return ok
+    finally:
+        cap.release()
+
+
+def _decode_into_shm(video_path: str, indices: list, shm_name: str, shape: tuple) -> list:
+    """``_decode_into`` for a decode worker process, writing into the shared-memory block ``shm_name``"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    if multiprocessing.parent_process() is not None:
+        # the parent owns and unlinks the block; stop this worker's tracker from unlinking it too
+        resource_tracker.unregister(shm._name, "shared_memory")
+    out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        return _decode_into(video_path, indices, out)
+    finally:
+        del out  # the buffer cannot be closed while an array still exports it
+        shm.close()
+
+
+class FrameSource:
+    """Random-access frame reader for one video, decoding only the frames consumers ask for.
+
+    Consumers announce their frame indices up front with ``load`` so all modalities
+    share one sequential decode pass. Decoded BGR frames live in NumPy blocks, in shared
+    memory only when a decode process pool (DECODE_PROCESSES > 0) writes them, since
+    /dev/shm is small in containers; nothing is written to disk. Call ``release`` when
+    the request is done.
+    """
+
+    def __init__(self, video_path: str):
+        self.video_path = video_path
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        reported_fps = cap.get(cv2.CAP_PROP_FPS)
+        # sampling strides still need a rate; anything reporting times checks ``fps_known``
+        self.fps_known = reported_fps > 0
+        self.fps = reported_fps if self.fps_known else 30.0
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.frame_count <= 0:
+            # some containers do not report a frame count; count without decoding pixels
+            self.frame_count = 0
+            while cap.grab():
+                self.frame_count += 1
+        cap.release()
+        self._frames = {}  # frame index -> view into a decoded block
+        self._blocks = []  # (shared-memory block or None, frames array)
+        self._lock = threading.Lock()
+        self.landmarks = LandmarkCache(self)
+        self.features = FeatureCache()
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    @property
+    def shape(self) -> tuple:
+        return (self.height, self.width, 3)
+
+    def timestamps(self, indices) -> np.ndarray:
+        return np.asarray(indices, dtype=np.float64) / self.fps
+
+    def _allocate(self, indices: list, shared: bool):
+        """(shared-memory block or None, ``[N,H,W,3]`` array to decode into)"""
+        shape = (len(indices),) + self.shape
+        if not shared:
+            return None, np.empty(shape, dtype=np.uint8)
+        block = shared_memory.SharedMemory(create=True, size=max(1, len(indices) * self.height * self.width * 3))
+        return block, np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+
+    def _store(self, block, frames: np.ndarray, indices: list, ok: list):
+        with self._lock:
+            self._blocks.append((block, frames))
+            for slot, (idx, good) in enumerate(zip(indices, ok)):
+                self._frames[idx] = frames[slot] if good else None
+        failed = ok.count(False)
+        if failed:
+            logger.warning(f"{failed} of {len(indices)} frames could not be decoded from {self.video_path}")
+
+    def _missing(self, indices) -> list:
+        with self._lock:
+            return sorted({int(i) for i in indices if 0 <= int(i) < self.frame_count} - set(self._frames))
+
+    async def load(self, indices):
+        """Decode every not-yet-cached index in one pass on the decode pool"""
+        missing = self._missing(indices)
+        if not missing:
+            return
+        shared = isinstance(get_executor("decode"), ProcessPoolExecutor)
+        block, frames = self._allocate(missing, shared)
+        try:
+            with timed("frame_decode"):
+                if shared:
+                    ok = await run_in_pool("decode", _decode_into_shm, self.video_path, missing, block.name,
+                                           frames.shape)
+                else:
+                    ok = await run_in_pool("decode", _decode_into, self.video_path, missing, frames)
+        except Exception:
+            if block is not None:
+                del frames
+                block.close(); block.unlink()
+            raise
+        self._store(block, frames, missing, ok)
+
+    def _decode_missing(self, indices):
+        missing = self._missing(indices)
+        if missing:
+            # synchronous reads decode in the calling thread, so never need shared memory
+            block, frames = self._allocate(missing, shared=False)
+            self._store(block, frames, missing, _decode_into(self.video_path, missing, frames))
+
+    def read(self, indices) -> np.ndarray:
+        """Stacked ``[N,H,W,3]`` uint8 BGR frames for ``indices``; frames that failed to decode are skipped"""
+        self._decode_missing(indices)
+        with self._lock:
+            frames = [self._frames.get(int(i)) for i in indices]
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            return np.empty((0,) + self.shape, dtype=np.uint8)
+        return np.stack(frames)
+
+    def iter_frames(self, indices):
+        """Yield ``(index, frame)`` for ascending ``indices`` from a separate sequential decode.
+
+        Nothing is cached: each frame is only valid until the next one is yielded, so
+        long scans run in constant memory. Frames that fail to decode are skipped.
+        """
+        cap = cv2.VideoCapture(self.video_path)
+        pos = 0
+        try:
+            for target in indices:
+                if target - pos > SEEK_THRESHOLD:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    pos = target
+                while pos < target and cap.grab():
+                    pos += 1
+                if pos != target or not cap.grab():
+                    continue
+                pos += 1
+                ret, frame = cap.retrieve()
+                if ret:
+                    yield target, frame
+        finally:
+            cap.release()
+
+    def get(self, index: int):
+        """One BGR frame (a read-only view, valid until ``release``), or None if it cannot be decoded"""
+        self._decode_missing([index])
+        with self._lock:
+            return self._frames.get(int(index))
+
+    def release(self):
+        self.landmarks.close()
+        self.features.close()
+        with self._lock:
+            blocks, self._blocks = self._blocks, []
+            self._frames.clear()
+        while blocks:
+            block, frames = blocks.pop()
+            del frames  # drop the last array exporting the buffer before closing it
+            if block is not None:
+                block.close()
+                block.unlink()
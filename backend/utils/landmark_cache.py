@@ -0,0 +1,205 @@
+import cv2, itertools, threading, time
+from collections import deque
+import numpy as np
+import mediapipe as mp
+from utils.config import get_settings
+from utils.executors import run_in_pool
+from utils.metrics import timed
+
+settings = get_settings()
+
+# FaceMesh indices: forehead/cheek polygon used for rPPG, outer lip contour used for lip-sync
+RPPG_ROI_POINTS = [10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288]
+LIP_POINTS = [61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 185, 40, 39, 37, 0, 267, 269, 270, 409]
+
+
+class FaceLandmarks:
+    """FaceMesh landmarks of one frame in pixel coordinates"""
+
+    def __init__(self, points: np.ndarray, frame_shape: tuple):
+        self.points = points  # [468, 2] float32, (x, y)
+        self.height, self.width = frame_shape[:2]
+
+    def _box(self, points: np.ndarray, margin: float) -> tuple:
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+        return (max(0, int(x1 - mx)), max(0, int(y1 - my)),
+                min(self.width, int(x2 + mx)), min(self.height, int(y2 + my)))
+
+    def face_box(self, margin: float = 0.0) -> tuple:
+        return self._box(self.points, margin)
+
+    def lip_box(self, margin: float = 0.3) -> tuple:
+        return self._box(self.points[LIP_POINTS], margin)
+
+    def roi_polygon(self) -> np.ndarray:
+        return self.points[RPPG_ROI_POINTS].astype(np.int32)
+
+
+def crop_box(frame: np.ndarray, box: tuple) -> np.ndarray:
+    """Crop ``box`` out of ``frame``, falling back to the full frame for degenerate boxes"""
+    x1, y1, x2, y2 = box
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return frame
+    return frame[y1:y2, x1:x2]
+
+
+class LocalizationStats:
+    """Rolling per-frame FaceMesh latency, split by how the frame was localized"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = {}  # kind -> deque of ms
+        self._counts = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, ms: float):
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self._window)).append(ms)
+            self._counts[kind] = self._counts.get(kind, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = {kind: np.array(v) for kind, v in self._samples.items()}
+            counts = dict(self._counts)
+        return {kind: {"frames": counts[kind],
+                       "latency_ms": {"p50": float(np.percentile(v, 50)), "p95": float(np.percentile(v, 95)),
+                                      "max": float(v.max())}}
+                for kind, v in samples.items() if len(v)}
+
+
+localization_stats = LocalizationStats()
+
+
+def detect_landmarks(face_mesh, frame: np.ndarray, kind: str = "detect"):
+    """Run FaceMesh on one BGR frame; returns ``FaceLandmarks`` or None when no face is found.
+
+    The frame is downscaled so its longer side is at most LANDMARK_MAX_SIDE; FaceMesh
+    returns normalised coordinates, so landmarks map straight back to full resolution.
+    """
+    start = time.perf_counter()
+    h, w = frame.shape[:2]
+    scale = settings.LANDMARK_MAX_SIDE / max(h, w) if settings.LANDMARK_MAX_SIDE > 0 else 1.0
+    small = cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+    res = face_mesh.process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+    localization_stats.record(kind, (time.perf_counter() - start) * 1000.0)
+    if not res.multi_face_landmarks:
+        return None
+    lm = res.multi_face_landmarks[0].landmark
+    points = np.array([[pt.x * w, pt.y * h] for pt in lm], dtype=np.float32)
+    return FaceLandmarks(points, frame.shape)
+
+
+class FaceMeshPool:
+    """One FaceMesh per worker thread.
+
+    FaceMesh graphs are not safe to share between threads; a thread-local instance
+    avoids both the lock around a shared one and building a graph per request.
+    A tracking-mode instance carries the face it followed on its previous frame, so
+    ``get(owner)`` resets the graph whenever a different owner (one video) takes over
+    the thread's instance; the graph itself is still built once per thread.
+    """
+
+    def __init__(self, static_image_mode: bool = True):
+        self.static_image_mode = static_image_mode
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def get(self, owner=None):
+        face_mesh = getattr(self._local, "face_mesh", None)
+        if face_mesh is None:
+            face_mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=self.static_image_mode, max_num_faces=1)
+            self._local.face_mesh = face_mesh
+            self._local.owner = owner
+            with self._lock:
+                self._all.append(face_mesh)
+        elif owner is not None and self._local.owner != owner:
+            if self._local.owner is not None:
+                face_mesh.reset()
+            self._local.owner = owner
+        return face_mesh
+
+    def close(self):
+        with self._lock:
+            meshes, self._all = self._all, []
+        for face_mesh in meshes:
+            face_mesh.close()
+        self._local = threading.local()
+
+
+face_mesh_pool = FaceMeshPool()
+tracking_mesh_pool = FaceMeshPool(static_image_mode=False)
+_tracker_ids = itertools.count(1)
+
+
+class FaceTracker:
+    """Landmarks for frames of one video, visited in ascending order.
+
+    Keyframes (the first frame, every LANDMARK_KEYFRAME_INTERVAL-th frame, and any
+    frame more than LANDMARK_TRACK_MAX_GAP frames after the previous one) get full
+    detection from the thread's pooled FaceMesh. Frames in between go through the
+    thread's pooled tracking-mode FaceMesh, which follows the face from the previous
+    frame and skips the face detector.
+    """
+
+    def __init__(self):
+        self._id = next(_tracker_ids)
+        self._previous = None
+        self._since_keyframe = 0
+
+    def __call__(self, index: int, frame: np.ndarray):
+        near = self._previous is not None and 0 < index - self._previous <= settings.LANDMARK_TRACK_MAX_GAP
+        keyframe = not near or self._since_keyframe + 1 >= settings.LANDMARK_KEYFRAME_INTERVAL
+        self._previous = index
+        if keyframe:
+            self._since_keyframe = 0
+            return detect_landmarks(face_mesh_pool.get(), frame, kind="keyframe")
+        self._since_keyframe += 1
+        return detect_landmarks(tracking_mesh_pool.get(self._id), frame, kind="tracked")
+
+
+class LandmarkCache:
+    """Per-request FaceMesh landmarks keyed by frame index.
+
+    Every modality reads face boxes, lip regions and rPPG polygons from here, so
+    each frame of a ``FrameSource`` is landmarked at most once per request. Dense
+    runs of frames are tracked between keyframes (see ``FaceTracker``).
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._landmarks = {}
+        self._tracker = FaceTracker()
+        self._lock = threading.Lock()
+
+    def ensure(self, indices):
+        """Landmark every not-yet-seen frame in ``indices`` in one batch"""
+        with self._lock:
+            missing = sorted({int(i) for i in indices} - set(self._landmarks))
+            if not missing:
+                return
+            for idx in missing:
+                frame = self.source.get(idx)
+                self._landmarks[idx] = self._tracker(idx, frame) if frame is not None else None
+
+    async def load(self, indices):
+        with timed("landmarks"):
+            await run_in_pool("vision", self.ensure, indices)
+
+    def get(self, index: int):
+        self.ensure([index])
+        return self._landmarks.get(int(index))
+
+    def face_crop(self, index: int, frame: np.ndarray, margin: float = 0.0) -> np.ndarray:
+        lm = self.get(index)
+        return crop_box(frame, lm.face_box(margin)) if lm is not None else frame
+
+    def lip_crop(self, index: int, frame: np.ndarray) -> np.ndarray:
+        lm = self.get(index)
+        return crop_box(frame, lm.lip_box()) if lm is not None else frame
+
+    def close(self):
+        with self._lock:
+            self._landmarks.clear()
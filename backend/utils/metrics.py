@@ -0,0 +1,176 @@
+import contextvars, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# seconds; pipeline stages range from sub-millisecond fusion to minutes-long video scans
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms rendered in the Prometheus text format.
+
+    Metrics are created on first use; each (name, labels) pair is one series. Keep label
+    values low-cardinality (stage names, route templates, status codes, never ids).
+    """
+
+    def __init__(self):
+        self._counters = {}  # name -> {labels tuple: value}
+        self._histograms = {}  # name -> {labels tuple: Histogram}
+        self._gauges = {}  # name -> {labels tuple: value}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, metrics_of_kind in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics_of_kind.items()):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_labels(dict(key))} {value}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    labels, cumulative = dict(key), 0
+                    for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("stage_duration_seconds", "Wall-clock time of one pipeline stage")
+metrics.describe("stage_errors_total", "Pipeline stages that raised")
+metrics.describe("http_requests_total", "HTTP requests by route template, method and status")
+metrics.describe("http_request_duration_seconds", "HTTP request latency by route template")
+
+
+class RequestTrace:
+    """Stage timings of one request, as offsets from its start, so overlap between
+    concurrently gathered stages stays visible in the breakdown"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, end: float):
+        with self._lock:
+            self.stages.append((stage, start, end))
+
+    def breakdown(self) -> list:
+        with self._lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+        return [{"stage": stage, "start_ms": (start - self.started) * 1000.0, "duration_ms": (end - start) * 1000.0}
+                for stage, start, end in stages]
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def request_trace():
+    """Collect the stages timed inside this block (including work handed to ``run_in_pool``)"""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the block in ``stage_duration_seconds`` and in the current request trace.
+
+    Works around ``await`` as well as in worker threads: the trace travels in a context variable.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        metrics.inc("stage_errors_total", stage=stage)
+        raise
+    finally:
+        end = time.perf_counter()
+        metrics.observe("stage_duration_seconds", end - start, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, start, end)
+
+
+class MetricsMiddleware:
+    """Counts HTTP requests and their latency per route template (``/api/jobs/{job_id}``, not the raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start, status = time.perf_counter(), 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            metrics.inc("http_requests_total", method=scope["method"], route=path, status=str(status))
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - start, route=path)
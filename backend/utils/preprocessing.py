@@ -0,0 +1,54 @@
+import threading
+import cv2
+import numpy as np
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class BatchPreprocessor:
+    """Resize, channel swap and normalisation for a batch of uint8 HxWx3 frames.
+
+    Frames are resized one by one straight into a staging block (they may differ in
+    size), then BGR->RGB, scaling to [0, 1] and ``(x - mean) / std`` happen as one
+    fused multiply-add per channel over the whole batch, written directly into an
+    ``[N, 3, size, size]`` float32 buffer. Buffers are preallocated per thread and only
+    grow, so steady-state calls allocate nothing.
+
+    Without ``copy`` the result is a view of that buffer, valid until the same thread
+    calls again; pass ``copy=True`` when the array outlives the call (e.g. is queued).
+    """
+
+    def __init__(self, size: int, mean=(0.0, 0.0, 0.0), std=(1.0, 1.0, 1.0), bgr_to_rgb: bool = True):
+        self.size = size
+        std = np.asarray(std, dtype=np.float32)
+        self.scale = 1.0 / (255.0 * std)
+        self.offset = -np.asarray(mean, dtype=np.float32) / std
+        # output channel c is read from input channel 2-c when swapping BGR to RGB
+        self.source_channels = (2, 1, 0) if bgr_to_rgb else (0, 1, 2)
+        self._local = threading.local()
+
+    def _buffers(self, n: int):
+        local = self._local
+        if getattr(local, "capacity", 0) < n:
+            local.capacity = max(n, 2 * getattr(local, "capacity", 0))
+            local.staging = np.empty((local.capacity, self.size, self.size, 3), dtype=np.uint8)
+            local.out = np.empty((local.capacity, 3, self.size, self.size), dtype=np.float32)
+        return local.staging[:n], local.out[:n]
+
+    def __call__(self, frames, copy: bool = False) -> np.ndarray:
+        """``frames``: sequence of uint8 HxWx3 arrays (or one stacked [N,H,W,3] array) -> [N,3,size,size]"""
+        n = len(frames)
+        staging, out = self._buffers(n)
+        target = (self.size, self.size)
+        for slot, frame in enumerate(frames):
+            if frame.shape[:2] == target:
+                staging[slot] = frame
+            else:
+                # area averaging when shrinking approximates the antialiased resize the models were trained with
+                shrink = frame.shape[0] > self.size or frame.shape[1] > self.size
+                cv2.resize(frame, target, dst=staging[slot], interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+        for c, src in enumerate(self.source_channels):
+            np.multiply(staging[..., src], self.scale[c], out=out[:, c])
+            out[:, c] += self.offset[c]
+        return out.copy() if copy else out
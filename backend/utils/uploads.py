@@ -0,0 +1,231 @@
+import hashlib, json, os, tempfile
+from fastapi import HTTPException, Request
+from utils.executors import run_in_pool
+from utils.metrics import timed
+
+try:
+    import python_multipart as multipart
+    import python_multipart.exceptions
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    import multipart.exceptions
+    from multipart.multipart import parse_options_header
+
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers around the file itself
+
+
+class SpooledUpload:
+    """An upload streamed to a named temp file, with its size and SHA-256 computed on the way"""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def cleanup(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class _MultipartSpooler:
+    """python-multipart callbacks that write every file part of a request body straight
+    into its own temp file, hashing it and enforcing the size cap on the way.
+
+    ``parts`` collects ``(filename, SpooledUpload | HTTPException)`` in body order; parts
+    rejected by ``suffix_for`` or over ``max_size`` keep their error and are not stored.
+    Plain form fields are ignored: every option of the upload routes is a query parameter.
+    """
+
+    def __init__(self, boundary: bytes, max_size: int, suffix_for, max_files: int = None):
+        self.max_size = max_size
+        self.suffix_for = suffix_for
+        self.max_files = max_files
+        self.parts = []
+        self._headers, self._field, self._value = [], b"", b""
+        self._current = None  # [filename, temp file, digest, size] of the part being written
+        self.parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._part_begin,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+        })
+
+    def _part_begin(self):
+        self._headers, self._current = [], None
+
+    def _header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers.append((self._field.lower(), self._value))
+        self._field, self._value = b"", b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(dict(self._headers).get(b"content-disposition", b""))
+        if b"filename" not in options:
+            return
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        if self.max_files is not None and len(self.parts) >= self.max_files:
+            raise HTTPException(400, f"At most {self.max_files} files per request")
+        try:
+            suffix = self.suffix_for(filename)
+        except HTTPException as e:
+            self.parts.append((filename, e))
+            return
+        self._current = [filename, tempfile.NamedTemporaryFile(delete=False, suffix=suffix), hashlib.sha256(), 0]
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._current is None:
+            return
+        filename, tmp, digest, size = self._current
+        self._current[3] = size = size + end - start
+        if size > self.max_size:
+            self._discard(tmp)
+            self.parts.append((filename, HTTPException(413, "File too large")))
+            self._current = None
+            return
+        chunk = data[start:end]
+        digest.update(chunk)
+        tmp.write(chunk)
+
+    def _part_end(self):
+        if self._current is not None:
+            filename, tmp, digest, size = self._current
+            tmp.close()
+            self.parts.append((filename, SpooledUpload(tmp.name, size, digest.hexdigest())))
+            self._current = None
+
+    @staticmethod
+    def _discard(tmp):
+        tmp.close()
+        os.unlink(tmp.name)
+
+    def abort(self):
+        if self._current is not None:
+            self._discard(self._current[1])
+            self._current = None
+        for _, part in self.parts:
+            if isinstance(part, SpooledUpload):
+                part.cleanup()
+
+
+async def spool_request_files(request: Request, max_size: int, suffix_for, max_files: int = None) -> list:
+    """``(filename, SpooledUpload | HTTPException)`` for each file part of a multipart ``request``.
+
+    The body is parsed as it arrives and each file is written to disk exactly once
+    (Starlette's form parser would buffer it in its own temp file first). ``suffix_for(filename)``
+    returns the temp-file suffix or raises HTTPException to reject that part unread; more
+    than ``max_files`` parts fail the whole request with 400.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(400, "Expected a multipart/form-data upload")
+    spooler = _MultipartSpooler(params[b"boundary"], max_size, suffix_for, max_files)
+    try:
+        with timed("upload"):
+            async for chunk in request.stream():
+                if chunk:
+                    await run_in_pool("io", spooler.parser.write, chunk)
+            spooler.parser.finalize()
+    except multipart.exceptions.MultipartParseError:
+        spooler.abort()
+        raise HTTPException(400, "Malformed multipart body")
+    except BaseException:
+        spooler.abort()
+        raise
+    return spooler.parts
+
+
+async def spool_request_file(request: Request, max_size: int, suffix_for) -> tuple:
+    """``(filename, SpooledUpload)`` for the single file of an upload route; raises its error otherwise"""
+    parts = await spool_request_files(request, max_size, suffix_for, max_files=1)
+    if not parts:
+        raise HTTPException(400, "No file uploaded")
+    filename, upload = parts[0]
+    if isinstance(upload, HTTPException):
+        raise upload
+    return filename, upload
+
+
+def allowed_suffix(allowed: tuple, kind: str):
+    """``suffix_for`` accepting filenames with one of the ``allowed`` extensions, kept as the suffix"""
+    def suffix_for(filename: str) -> str:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in allowed:
+            raise HTTPException(400, f"Invalid {kind} type: {ext}")
+        return ext
+    return suffix_for
+
+
+def upload_body(field: str = "file", many: bool = False) -> dict:
+    """``openapi_extra`` documenting the multipart body of a route that parses it itself"""
+    schema = {"type": "string", "format": "binary"}
+    if many:
+        schema = {"type": "array", "items": schema}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": [field], "properties": {field: schema}}}}}}
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized request bodies on upload routes before they are buffered.
+
+    A declared Content-Length above the limit is answered with 413 without reading
+    the body. Chunked bodies are counted as they arrive and cut off at the limit.
+    ``limits`` maps path prefixes to their maximum body size in bytes.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "File too large"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit_for(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await self._reject(send)
+
+        received, exceeded = 0, False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # stop feeding the body parser; whatever error it produces is replaced by a 413
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if exceeded:
+                if message["type"] == "http.response.start":
+                    await self._reject(send)
+                return
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# benchmarks/bench_api.py
+# End-to-end latency and throughput of /detect/image, /detect/video and /detect/stream at
+# several concurrency levels, against the app in-process: HTTP through httpx's ASGI transport,
+# the WebSocket through Starlette's TestClient. Auth is overridden and the result cache is
+# bypassed, so every request does the full work. Run from backend/ (PYTHONPATH=.):
+#   python ../benchmarks/bench_api.py --concurrency 1 4 16 --requests 32
+import argparse
+import asyncio
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from api.deps import get_user, get_ws_user, get_result_cache
+from synthetic import make_image, make_video, encode_frames
+from results import summarize, print_metrics
+
+class PassThroughCache:
+    """Stands in for ResultCache: no storage and no collapsing of identical concurrent uploads"""
+    make_key = staticmethod(lambda *args, **kwargs: "")
+
+    async def get_or_compute(self, key, compute, source=None):
+        return await (compute(source) if source is not None else compute())
+
+def install_overrides():
+    app.dependency_overrides[get_user] = lambda: SimpleNamespace(id=None)  # no history rows
+    app.dependency_overrides[get_ws_user] = lambda: SimpleNamespace(id=None)
+    app.dependency_overrides[get_result_cache] = PassThroughCache
+
+async def load_http(url: str, filename: str, payload: bytes, content_type: str, concurrency: int,
+                    requests: int, prefix: str) -> dict:
+    """``requests`` uploads from ``concurrency`` workers in a closed loop"""
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            resp = await client.post(url, files={"file": (filename, payload, content_type)})
+            if resp.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+            else:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post(url, files={"file": (filename, payload, content_type)})  # warm-up: model loading
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {**summarize(latencies, prefix), f"{prefix}.throughput_rps": len(latencies) / elapsed,
+            f"{prefix}.errors": errors}
+
+def load_stream(frames: list, concurrency: int, prefix: str) -> dict:
+    """``concurrency`` WebSocket clients, each sending ``frames`` one at a time and waiting for
+    its result, so frame latency is not inflated by the mailbox dropping frames"""
+    def session(client):
+        latencies = []
+        with client.websocket_connect("/api/detect/stream") as ws:
+            for payload in frames:
+                start = time.perf_counter()
+                ws.send_bytes(payload)
+                if "error" not in ws.receive_json():
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+        return latencies
+
+    # entered once so every session shares one event loop, like connections to one worker do
+    with TestClient(app) as client:
+        session(client)  # warm-up
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = [ms for result in pool.map(lambda _: session(client), range(concurrency)) for ms in result]
+        elapsed = time.perf_counter() - start
+    return {**summarize(latencies, prefix), f"{prefix}.throughput_fps": len(latencies) / elapsed}
+
+def run(image_path: str, video_path: str, concurrency=(1, 4, 16), requests: int = 32,
+        stream_frames: list = None, endpoints=("image", "video", "stream")) -> dict:
+    install_overrides()
+    image, video = Path(image_path).read_bytes(), Path(video_path).read_bytes()
+    metrics = {}
+    for c in concurrency:
+        if "image" in endpoints:
+            metrics.update(asyncio.run(load_http("/api/detect/image", "face.jpg", image, "image/jpeg",
+                                                 c, max(requests, c), f"api.image.c{c}")))
+        if "video" in endpoints:
+            # videos are heavier; fewer of them keeps a run in minutes
+            metrics.update(asyncio.run(load_http("/api/detect/video", "face.mp4", video, "video/mp4",
+                                                 c, max(requests // 4, c), f"api.video.c{c}")))
+        if "stream" in endpoints and stream_frames:
+            metrics.update(load_stream(stream_frames, c, f"api.stream.c{c}"))
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="image requests per level (videos: a quarter)")
+    parser.add_argument("--endpoints", nargs="+", default=["image", "video", "stream"])
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the synthetic video")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        image = make_image(str(Path(tmp) / "face.jpg"))
+        video = make_video(str(Path(tmp) / "face.mp4"), seconds=args.seconds)
+        print_metrics(run(image, video, args.concurrency, args.requests, encode_frames(3.0, 10.0), args.endpoints))
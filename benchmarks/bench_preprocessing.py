@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# benchmarks/bench_preprocessing.py
+# Frames/s of the per-frame PIL/torchvision preprocessing the services used before,
+# against the batched BatchPreprocessor. Run from backend/ (PYTHONPATH=.):
+#   python ../benchmarks/bench_preprocessing.py --batch_sizes 1 16 64
+import time
+import argparse
+import cv2
+import numpy as np
+import torch
+import torchvision.transforms as T
+from PIL import Image
+from utils.preprocessing import BatchPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+
+def legacy_vision(frames, size):
+    transform = T.Compose([T.Resize((size, size)), T.ToTensor(), T.Normalize(IMAGENET_MEAN, IMAGENET_STD)])
+    return torch.stack([transform(Image.fromarray(cv2.cvtColor(f, cv2.COLOR_BGR2RGB))) for f in frames])
+
+def legacy_syncnet(frames):
+    out = [cv2.cvtColor(cv2.resize(f, (224, 224)), cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0 for f in frames]
+    return torch.FloatTensor(np.stack(out)).permute(0, 3, 1, 2)
+
+def legacy_rppg(frames):
+    return np.array([cv2.resize(f, (64, 64)).astype(np.float32) / 255.0 for f in frames]).transpose(0, 3, 1, 2)
+
+def frames_per_second(fn, frames, min_time):
+    fn(frames)  # warm-up (and buffer allocation for the batched path)
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        fn(frames)
+        runs += 1
+    return runs * len(frames) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch_sizes", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--width", type=int, default=300)
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--min_time", type=float, default=2.0, help="seconds per measurement")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pipelines = {
+        "vision": (lambda f: legacy_vision(f, args.size), BatchPreprocessor(args.size, IMAGENET_MEAN, IMAGENET_STD)),
+        "syncnet": (legacy_syncnet, BatchPreprocessor(224)),
+        "rppg": (legacy_rppg, BatchPreprocessor(64, bgr_to_rgb=False)),
+    }
+    print(f"{'pipeline':<8} {'batch':>5} {'before f/s':>11} {'after f/s':>10} {'speedup':>8} {'max|diff|':>10}")
+    for name, (before, after) in pipelines.items():
+        for n in args.batch_sizes:
+            frames = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(n)]
+            old = frames_per_second(before, frames, args.min_time)
+            new = frames_per_second(after, frames, args.min_time)
+            # differences come from interpolation (PIL antialias / INTER_LINEAR vs INTER_AREA), not from layout
+            diff = float(np.abs(np.asarray(before(frames)) - after(frames)).max())
+            print(f"{name:<8} {n:>5} {old:>11.0f} {new:>10.0f} {new / old:>7.1f}x {diff:>10.3f}")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# benchmarks/bench_stages.py
+# Per-stage latency of the detection pipeline, measured synchronously on the services
+# (no thread pools, no batching) so each number is the cost of that stage alone.
+# Run from backend/ (PYTHONPATH=.):
+#   python ../benchmarks/bench_stages.py --repeats 5
+import argparse
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import cv2
+from services.vision_service import VisionService
+from services.lip_sync_service import LipSyncService
+from services.rppg_service import RPPGService
+from services.fusion_service import FusionService
+from utils.audio_extractor import AudioTrack
+from utils.frame_source import FrameSource
+from utils.landmark_cache import detect_landmarks, crop_box, face_mesh_pool
+from synthetic import make_image, make_video
+from results import summarize, print_metrics
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        yield
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000.0)
+
+    def metrics(self, skip: int = 0) -> dict:
+        out = {}
+        for stage, samples in self.samples.items():
+            out.update(summarize(samples[skip:], f"stages.{stage}"))
+        return out
+
+def image_stages(timer: StageTimer, vs: VisionService, fusion: FusionService, image_path: str):
+    with timer("image.decode"):
+        img = cv2.imread(image_path)
+    with timer("image.face_crop"):
+        lm = detect_landmarks(face_mesh_pool.get(), img, kind="image")
+        crop = crop_box(img, lm.face_box()) if lm is not None else img
+    with timer("image.preprocess"):
+        x = vs._prepare_array(crop)
+    with timer("image.model"):
+        prob = vs._score_image_batch([x])[0]
+    with timer("image.fusion"):
+        fusion.fuse_scores({"vision": {"score": prob}})
+
+def video_stages(timer: StageTimer, vs: VisionService, lsvc: LipSyncService, rsvc: RPPGService,
+                 fusion: FusionService, video_path: str):
+    with timer("video.open"):
+        source = FrameSource(video_path)
+    try:
+        n = len(source)
+        indices = sorted(set(vs.frame_indices(n)) | set(lsvc.frame_indices(n)))
+        with timer("video.decode"):
+            source.read(indices)
+        with timer("video.audio_decode"):
+            audio = AudioTrack(video_path)
+            audio.load(n / source.fps)
+        with timer("video.landmarks"):
+            source.landmarks.ensure(indices)
+        with timer("video.face_crop"):
+            crops = [source.landmarks.face_crop(i, source.get(i)) for i in vs.frame_indices(n)]
+        with timer("video.preprocess"):
+            vs.preprocess(crops)
+        with timer("video.vision_model"):  # backbone + temporal head, preprocessing included
+            vision = vs._score_video(source)
+        with timer("video.lip_sync"):  # MFCCs at the sampled frames + SyncNet offset sweep
+            lip = lsvc._score_sync(source, audio)
+        with timer("video.rppg"):  # its own sequential decode, ROI means, band-pass, scoring
+            rppg = rsvc._detect_physiological(source)
+        with timer("video.fusion"):
+            fusion.fuse_scores({"vision": {"score": vision}, "lip_sync": lip, "physiological": rppg})
+    finally:
+        source.release()
+
+def run(image_path: str, video_path: str, repeats: int = 5) -> dict:
+    """``stages.*`` latency metrics; the first repetition warms up (model loading) and is not counted"""
+    vs, lsvc, rsvc, fusion = VisionService(), LipSyncService(), RPPGService(), FusionService()
+    timer = StageTimer()
+    for _ in range(repeats + 1):
+        image_stages(timer, vs, fusion, image_path)
+        video_stages(timer, vs, lsvc, rsvc, fusion, video_path)
+    return timer.metrics(skip=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the synthetic video")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        image = make_image(str(Path(tmp) / "face.jpg"))
+        video = make_video(str(Path(tmp) / "face.mp4"), seconds=args.seconds)
+        print_metrics(run(image, video, args.repeats))
@@ -0,0 +1,69 @@
+# benchmarks/results.py
+# Summaries, JSON result files and baseline comparison shared by the benchmark scripts.
+# Metrics are a flat {name: value} map; the suffix says which direction is better:
+# "_ms" (latency) lower, "_rps"/"_fps" (throughput) higher. Anything else is informational.
+import json
+import platform
+import time
+from pathlib import Path
+import numpy as np
+
+def summarize(samples_ms: list, prefix: str) -> dict:
+    """p50/p95/mean/max latency of ``samples_ms`` under ``prefix``"""
+    if not samples_ms:
+        return {f"{prefix}.count": 0}
+    a = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        f"{prefix}.count": int(a.size),
+        f"{prefix}.p50_ms": float(np.percentile(a, 50)),
+        f"{prefix}.p95_ms": float(np.percentile(a, 95)),
+        f"{prefix}.mean_ms": float(a.mean()),
+        f"{prefix}.max_ms": float(a.max()),
+    }
+
+def write_results(path: str, metrics: dict, **meta) -> dict:
+    doc = {
+        "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "machine": platform.machine(), "processor": platform.processor() or platform.machine(), **meta},
+        "metrics": dict(sorted(metrics.items())),
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(doc, indent=2))
+    return doc
+
+def load_metrics(path: str) -> dict:
+    return json.loads(Path(path).read_text())["metrics"]
+
+def _direction(name: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not compared"""
+    if name.endswith("_rps") or name.endswith("_fps"):
+        return 1
+    if name.endswith("_ms") and not name.endswith(".max_ms"):  # maxima are too noisy to gate on
+        return -1
+    return 0
+
+def compare(metrics: dict, baseline: dict, tolerance: float = 0.15, min_delta_ms: float = 2.0) -> list:
+    """Metrics that got worse than ``baseline`` by more than ``tolerance`` (a fraction).
+
+    Latencies must also have moved by at least ``min_delta_ms`` so sub-millisecond
+    stages do not flag on scheduler noise. Returns (name, baseline, current, change) tuples.
+    """
+    regressions = []
+    for name, old in sorted(baseline.items()):
+        new, direction = metrics.get(name), _direction(name)
+        if new is None or not direction or not old:
+            continue
+        change = (new - old) / old
+        if direction < 0 and change > tolerance and new - old >= min_delta_ms:
+            regressions.append((name, old, new, change))
+        elif direction > 0 and change < -tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+def print_metrics(metrics: dict, baseline: dict = None):
+    baseline = baseline or {}
+    print(f"{'metric':<48} {'value':>10} {'baseline':>10} {'change':>8}")
+    for name, value in sorted(metrics.items()):
+        old = baseline.get(name)
+        change = f"{(value - old) / old:+.1%}" if old else ""
+        print(f"{name:<48} {value:>10.2f} {old if old is not None else '':>10} {change:>8}")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# benchmarks/run_benchmarks.py
+# Runs the stage and API benchmarks on synthetic inputs, writes the metrics as JSON and
+# compares them with a stored baseline; exits 1 when a latency or throughput regressed by
+# more than --tolerance. Run from backend/ (PYTHONPATH=.):
+#   python ../benchmarks/run_benchmarks.py --output ../benchmarks/results/latest.json
+#   python ../benchmarks/run_benchmarks.py --update-baseline   # after an intended change
+# Baselines are machine specific: record one per benchmark host and compare on the same host.
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from synthetic import make_image, make_video, encode_frames
+from results import write_results, load_metrics, compare, print_metrics
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", default=["stages", "api"], choices=["stages", "api"])
+    parser.add_argument("--repeats", type=int, default=5, help="stage benchmark repetitions")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="image requests per concurrency level")
+    parser.add_argument("--endpoints", nargs="+", default=["image", "video", "stream"])
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the synthetic video")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "latest.json"))
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        image = make_image(str(Path(tmp) / "face.jpg"))
+        video = make_video(str(Path(tmp) / "face.mp4"), seconds=args.seconds)
+        if "stages" in args.suites:
+            import bench_stages
+            metrics.update(bench_stages.run(image, video, args.repeats))
+        if "api" in args.suites:
+            import bench_api  # imports the app (and creates its tables) only when needed
+            metrics.update(bench_api.run(image, video, args.concurrency, args.requests,
+                                         encode_frames(3.0, 10.0), args.endpoints))
+
+    meta = {"suites": args.suites, "repeats": args.repeats, "concurrency": args.concurrency,
+            "requests": args.requests, "video_seconds": args.seconds}
+    write_results(args.output, metrics, **meta)
+    baseline = load_metrics(args.baseline) if Path(args.baseline).exists() else None
+    print_metrics(metrics, baseline)
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        write_results(args.baseline, metrics, **meta)
+        print(f"baseline updated: {args.baseline}")
+    elif baseline is None:
+        print(f"no baseline at {args.baseline}; rerun with --update-baseline to record one")
+    else:
+        regressions = compare(metrics, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.2f} -> {new:.2f} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
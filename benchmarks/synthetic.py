@@ -0,0 +1,63 @@
+# benchmarks/synthetic.py
+# Synthetic benchmark inputs drawn with cv2, so the suite needs no dataset or network.
+# The "face" is a cartoon (skin ellipse, eyes, a mouth that opens and closes, skin tone
+# pulsing at ~72 bpm); FaceMesh may or may not lock onto it, which only changes whether
+# the crop stage falls back to the full frame. Timings are about the work, not the scores.
+import os
+import shutil
+import subprocess
+import cv2
+import numpy as np
+
+SKIN_BGR = (150, 180, 220)
+
+def draw_face(t: float, width: int, height: int, rng=None) -> np.ndarray:
+    """One BGR frame at ``t`` seconds"""
+    frame = np.full((height, width, 3), 40, dtype=np.uint8)
+    if rng is not None:
+        frame = cv2.add(frame, rng.integers(0, 20, frame.shape, dtype=np.uint8))  # sensor-like noise
+    cx = int(width / 2 + width * 0.05 * np.sin(2 * np.pi * 0.2 * t))  # slow head sway
+    cy = int(height / 2 + height * 0.03 * np.cos(2 * np.pi * 0.15 * t))
+    fw, fh = int(min(width, height) * 0.28), int(min(width, height) * 0.38)
+    pulse = 6 * np.sin(2 * np.pi * 1.2 * t)  # 72 bpm
+    skin = tuple(int(np.clip(c + pulse, 0, 255)) for c in SKIN_BGR)
+    cv2.ellipse(frame, (cx, cy), (fw, fh), 0, 0, 360, skin, -1)
+    for dx in (-0.4, 0.4):
+        cv2.circle(frame, (int(cx + dx * fw), int(cy - 0.25 * fh)), max(2, fw // 8), (60, 40, 30), -1)
+    cv2.line(frame, (cx, int(cy - 0.1 * fh)), (cx, int(cy + 0.15 * fh)), (110, 140, 180), 2)
+    opening = max(1, int(0.12 * fh * (0.5 + 0.5 * np.sin(2 * np.pi * 3.0 * t))))  # ~3 syllables/s
+    cv2.ellipse(frame, (cx, int(cy + 0.45 * fh)), (int(0.35 * fw), opening), 0, 0, 360, (50, 50, 140), -1)
+    return frame
+
+def make_image(path: str, width: int = 640, height: int = 480, seed: int = 0) -> str:
+    cv2.imwrite(path, draw_face(0.0, width, height, np.random.default_rng(seed)))
+    return path
+
+def make_video(path: str, seconds: float = 10.0, fps: float = 30.0, width: int = 640, height: int = 480,
+               seed: int = 0, audio: bool = True) -> str:
+    """MP4 of the talking cartoon face; with ``audio`` and ffmpeg on PATH, a tone track
+    amplitude-modulated with the mouth is muxed in so the lip-sync stage has audio to decode"""
+    rng = np.random.default_rng(seed)
+    silent = path if not audio else path + ".silent.mp4"
+    writer = cv2.VideoWriter(silent, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for i in range(int(seconds * fps)):
+            writer.write(draw_face(i / fps, width, height, rng))
+    finally:
+        writer.release()
+    if not audio:
+        return path
+    if shutil.which("ffmpeg") is None:
+        shutil.move(silent, path)
+        return path
+    tone = f"aevalsrc=0.4*sin(2*PI*220*t)*(0.5+0.5*sin(2*PI*3*t)):s=16000:d={seconds}"
+    subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", silent, "-f", "lavfi", "-i", tone,
+                    "-c:v", "copy", "-c:a", "aac", "-shortest", path], check=True)
+    os.remove(silent)
+    return path
+
+def encode_frames(seconds: float, fps: float, width: int = 640, height: int = 480, seed: int = 0) -> list:
+    """JPEG-encoded frames, as a browser would send them to /detect/stream"""
+    rng = np.random.default_rng(seed)
+    return [cv2.imencode(".jpg", draw_face(i / fps, width, height, rng))[1].tobytes()
+            for i in range(int(seconds * fps))]
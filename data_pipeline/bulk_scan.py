@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# data_pipeline/bulk_scan.py
+# Offline deepfake scan of a directory tree, without the HTTP API: the same services and
+# fusion as /detect/image and /detect/video, spread over a process pool (one copy of the
+# models per worker). Progress is checkpointed in a SQLite manifest next to the output, so an
+# interrupted run picks up where it stopped. Run from backend/ (PYTHONPATH=.):
+#   python ../data_pipeline/bulk_scan.py --input_dir /archive --output scan.jsonl --workers 4
+# Results are appended as JSON lines ({"path", "kind", "result" | "error", "seconds"}). A crash
+# between writing a line and checkpointing it can repeat that path on resume; keep the last.
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from utils.config import get_settings
+
+settings = get_settings()
+
+# --- worker process -------------------------------------------------------------------------
+
+_worker = {}
+
+def init_worker(torch_threads: int):
+    import torch
+    from services.vision_service import VisionService
+    from services.lip_sync_service import LipSyncService
+    from services.rppg_service import RPPGService
+    from services.fusion_service import FusionService
+    torch.set_num_threads(torch_threads)  # workers split the cores instead of each taking all of them
+    _worker["services"] = (VisionService(), LipSyncService(), RPPGService(), FusionService())
+    _worker["loop"] = asyncio.new_event_loop()  # one loop per worker, so the micro-batcher keeps its queue
+
+def scan_file(path: str, kind: str, windowed: bool) -> dict:
+    from services.detection_pipeline import analyze_image, analyze_video
+    vs, lsvc, rsvc, fusion = _worker["services"]
+    start = time.perf_counter()
+    try:
+        if kind == "image":
+            coro = analyze_image(path, False, vs, fusion)
+        else:
+            coro = analyze_video(path, False, vs, lsvc, rsvc, fusion, windowed=windowed)
+        out = {"result": _worker["loop"].run_until_complete(coro)}
+    except Exception as e:  # one unreadable file must not stop the scan
+        out = {"error": f"{type(e).__name__}: {e}"}
+    return {"path": path, "kind": kind, **out, "seconds": time.perf_counter() - start}
+
+# --- manifest -------------------------------------------------------------------------------
+
+class Manifest:
+    """Which files are finished, keyed by path and invalidated when size or mtime change"""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, size INTEGER, mtime REAL, status TEXT, error TEXT, finished_at REAL)""")
+        self.db.commit()
+
+    def finished(self, retry_failed: bool) -> dict:
+        statuses = ("done",) if retry_failed else ("done", "failed")
+        rows = self.db.execute(f"SELECT path, size, mtime FROM files WHERE status IN ({','.join('?' * len(statuses))})",
+                               statuses)
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def mark(self, path: str, size: int, mtime: float, error: str = None):
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, size, mtime, "failed" if error else "done", error, time.time()))
+
+    def checkpoint(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+# --- driver ---------------------------------------------------------------------------------
+
+def discover(root: Path, image_ext: tuple, video_ext: tuple):
+    """(path, kind, size, mtime) for every supported file under ``root``, in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            ext = os.path.splitext(name)[1].lower()
+            kind = "image" if ext in image_ext else "video" if ext in video_ext else None
+            if kind:
+                path = os.path.join(dirpath, name)
+                st = os.stat(path)
+                yield path, kind, st.st_size, st.st_mtime
+
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_dir", required=True)
+    parser.add_argument("--output", required=True, help="JSONL file; appended to when resuming")
+    parser.add_argument("--manifest", default=None, help="defaults to <output>.manifest.sqlite")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--windowed", action="store_true", help="windowed video analysis with a per-segment timeline")
+    parser.add_argument("--retry_failed", action="store_true", help="rescan files that failed in an earlier run")
+    parser.add_argument("--checkpoint_every", type=int, default=100, help="results between manifest commits")
+    parser.add_argument("--report_every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest or args.output + ".manifest.sqlite")
+    finished = manifest.finished(args.retry_failed)
+    todo = [f for f in discover(Path(args.input_dir), settings.ALLOWED_IMAGE_EXTENSIONS, settings.ALLOWED_VIDEO_EXTENSIONS)
+            if finished.get(f[0]) != (f[2], f[3])]
+    print(f"{len(todo)} files to scan ({len(finished)} already in the manifest)", flush=True)
+
+    torch_threads = settings.TORCH_NUM_THREADS or max(1, (os.cpu_count() or 1) // args.workers)
+    # spawn: torch and MediaPipe do not survive fork with their threads already started
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_worker, initargs=(torch_threads,))
+    meta = {}  # future -> (path, size, mtime)
+    done = failed = 0
+    start = last_report = time.perf_counter()
+    queue = iter(todo)
+    try:
+        with open(args.output, "a") as out:
+            while True:
+                # a bounded window of submissions keeps memory flat on very large corpora
+                for path, kind, size, mtime in queue:
+                    meta[pool.submit(scan_file, path, kind, args.windowed)] = (path, size, mtime)
+                    if len(meta) >= args.workers * 4:
+                        break
+                if not meta:
+                    break
+                finished_futures, _ = wait(list(meta), return_when=FIRST_COMPLETED)
+                for future in finished_futures:
+                    path, size, mtime = meta.pop(future)
+                    record = future.result()
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()  # the line is on disk before the manifest says the file is done
+                    manifest.mark(path, size, mtime, record.get("error"))
+                    done += 1
+                    failed += "error" in record
+                    if done % args.checkpoint_every == 0:
+                        manifest.checkpoint()
+                now = time.perf_counter()
+                if now - last_report >= args.report_every or not meta:
+                    rate = done / (now - start)
+                    eta = format_eta((len(todo) - done) / rate) if rate > 0 else "?"
+                    print(f"{done}/{len(todo)} files, {failed} failed, {rate:.2f} files/s, ETA {eta}", flush=True)
+                    last_report = now
+    except KeyboardInterrupt:
+        print("interrupted; rerun the same command to resume", file=sys.stderr)
+        for future in meta:
+            future.cancel()
+        sys.exit(130)
+    finally:
+        manifest.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+    print(f"done: {done} files in {format_eta(time.perf_counter() - start)}, {failed} failed; results in {args.output}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# data_pipeline/export_models.py
+# Run from backend/ (PYTHONPATH=.) so the model and settings modules resolve:
+#   python ../data_pipeline/export_models.py --formats onnx torchscript
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import torch
+from models.registry import ModelRegistry
+from models.backends import PARTS, export_specs, exported_path, _load_part
+
+def export_part(module, inputs, input_names, dynamic_axes, path, fmt, opset):
+    module.eval()
+    if fmt == "onnx":
+        torch.onnx.export(module, inputs, str(path), input_names=input_names, output_names=["output"],
+                          dynamic_axes={**dynamic_axes, "output": {0: "batch"}}, opset_version=opset)
+    else:
+        with torch.no_grad():
+            torch.jit.trace(module, inputs).save(str(path))
+
+def resized_inputs(inputs, dynamic_axes, input_names):
+    """Fresh random inputs with every dynamic batch axis changed, to check the export is not shape-locked"""
+    out = []
+    for t, name in zip(inputs, input_names):
+        shape = list(t.shape)
+        if 0 in dynamic_axes.get(name, {}):
+            shape[0] += 1
+        out.append(torch.randn(*shape, device=t.device))
+    return tuple(out)
+
+def median_latency(fn, inputs, iters):
+    with torch.no_grad():
+        fn(*inputs)  # warm-up
+        times = []
+        for _ in range(iters):
+            start = time.perf_counter()
+            fn(*inputs)
+            times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000.0)
+
+def export_model(registry, name, fmt, opset, atol, iters):
+    eager = registry.build_eager(name)
+    checkpoint = registry._paths[name]
+    report = {"model": name, "format": fmt, "parts": {}}
+    for part, (module, inputs, input_names, dynamic_axes) in export_specs(name, eager, registry.device).items():
+        path = exported_path(checkpoint, fmt, part)
+        export_part(module, inputs, input_names, dynamic_axes, path, fmt, opset)
+        exported = _load_part(path, fmt, registry.device)
+
+        check = resized_inputs(inputs, dynamic_axes, input_names)
+        with torch.no_grad():
+            expected = module(*check).float().cpu()
+            actual = exported(*check).float().cpu()
+        max_diff = float((expected - actual).abs().max())
+        parity = max_diff <= atol
+        if not parity:
+            path.unlink()  # never leave an export the registry could serve with wrong scores
+        report["parts"][part or "model"] = {
+            "path": str(path),
+            "max_abs_diff": max_diff,
+            "parity": parity,
+            "eager_ms": median_latency(module, inputs, iters),
+            f"{fmt}_ms": median_latency(exported, inputs, iters) if parity else None,
+        }
+        print(f"{name}{'.' + part if part else ''} [{fmt}] max|diff|={max_diff:.2e} "
+              f"{'OK' if parity else 'FAILED parity, removed'} -> {path}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=list(PARTS), choices=list(PARTS))
+    parser.add_argument("--formats", nargs="+", default=["onnx"], choices=["onnx", "torchscript"])
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--report", default="pretrained_models/export_report.json")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    reports = [export_model(registry, name, fmt, args.opset, args.atol, args.iters)
+               for name in args.models for fmt in args.formats]
+
+    # fastest backend per model = lowest summed latency over its parts
+    summary = {}
+    for r in reports:
+        if not all(p["parity"] for p in r["parts"].values()):
+            continue
+        totals = summary.setdefault(r["model"], {"torch": sum(p["eager_ms"] for p in r["parts"].values())})
+        totals[r["format"]] = sum(p[f"{r['format']}_ms"] for p in r["parts"].values())
+    for name, totals in summary.items():
+        best = min(totals, key=totals.get)
+        print(f"{name}: " + ", ".join(f"{b}={ms:.1f}ms" for b, ms in totals.items()) + f" -> fastest: {best}")
+
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump({"exports": reports, "latency_ms": summary}, f, indent=2)
+    print("Export report written to", args.report)
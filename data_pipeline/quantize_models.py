@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# data_pipeline/quantize_models.py
+# Calibrates static INT8 graphs for MODEL_QUANTIZATION=static and reports accuracy vs latency
+# against FP32 on a held-out set. Run from backend/ (PYTHONPATH=.):
+#   python ../data_pipeline/quantize_models.py --calibration_dir frames/train --eval_dir frames/val --audio_dir audio
+# Both dirs use the preprocess_frames.py layout (one folder of jpgs per video, "fake" somewhere in the path
+# for fake samples); SyncNet is only calibrated/evaluated for folders with a matching <audio_dir>/<name>.wav.
+import json
+import time
+import argparse
+from pathlib import Path
+import cv2
+import librosa
+import numpy as np
+import torch
+from models.registry import ModelRegistry
+from models.backends import PARTS, export_specs, exported_path, load_exported
+from models.quantization import quantize_dynamic_model, quantize_static
+from utils.config import get_settings
+from utils.audio_extractor import AudioTrack
+from utils.preprocessing import BatchPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+
+settings = get_settings()
+CPU = torch.device("cpu")
+# same preprocessing as VisionService, so calibration sees the activations served in production
+preprocess = BatchPreprocessor(settings.TARGET_IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD)
+
+def label_of(path):
+    return 1 if "fake" in Path(path).parts else 0
+
+def frame_dirs(root):
+    return sorted({p.parent for p in Path(root).rglob("*.jpg")})
+
+def sample_frames(frame_dir, count):
+    frames = sorted(frame_dir.glob("*.jpg"))
+    if len(frames) < count:
+        return None
+    return [frames[i] for i in np.linspace(0, len(frames)-1, count, dtype=int)]
+
+def image_samples(root, limit):
+    for path in sorted(Path(root).rglob("*.jpg"))[:limit]:
+        yield (torch.from_numpy(preprocess([cv2.imread(str(path))], copy=True)),), label_of(path)
+
+def video_samples(root, limit):
+    for frame_dir in frame_dirs(root)[:limit]:
+        paths = sample_frames(frame_dir, settings.CLIP_LENGTH)
+        if paths:
+            clip = torch.from_numpy(preprocess([cv2.imread(str(p)) for p in paths], copy=True))  # [T,3,H,W]
+            yield (clip.permute(1, 0, 2, 3).unsqueeze(0),), label_of(frame_dir)  # [1,3,T,H,W]
+
+def syncnet_samples(root, args, wrapper):
+    audio_dir, limit = args.audio_dir, args.limit
+    if audio_dir is None:
+        return
+    for frame_dir in frame_dirs(root)[:limit]:
+        wav = Path(audio_dir) / f"{frame_dir.name}.wav"
+        paths = sample_frames(frame_dir, wrapper.SYNC_FRAMES)
+        if paths and wav.exists():
+            track = AudioTrack(str(wav))
+            track.samples = librosa.load(str(wav), sr=track.sr)[0]
+            # preprocess_frames.py names frames <video>_<frame number>.jpg
+            timestamps = [int(p.stem.rsplit("_", 1)[-1]) / args.video_fps for p in paths]
+            mfccs = track.mfcc_at(timestamps)
+            if mfccs is not None:
+                yield wrapper.prepare([cv2.imread(str(p)) for p in paths], mfccs), label_of(frame_dir)
+
+def samples(name, root, args, eager):
+    if name == "image":
+        return image_samples(root, args.limit)
+    if name == "video":
+        return video_samples(root, args.limit)
+    return syncnet_samples(root, args, eager)
+
+def eager_cpu(registry, name):
+    model = registry.build_eager(name)
+    if name == "syncnet":
+        model.device = CPU
+        model.model = model.model.cpu().eval()
+        return model
+    return model.cpu().eval()
+
+def score(name, model, inputs):
+    with torch.no_grad():
+        net = model.model if name == "syncnet" else model
+        return torch.sigmoid(net(*inputs)).flatten().tolist()
+
+def calibration_inputs(name, part, eager, args):
+    """Inputs for one exported part, derived from the same preprocessing the services use"""
+    for inputs, _ in samples(name, args.calibration_dir, args, eager):
+        if name == "video":
+            frames = inputs[0][0].permute(1, 0, 2, 3)  # [T,3,H,W]
+            if part == "backbone":
+                yield (frames,)
+            else:
+                with torch.no_grad():
+                    feats = eager.encode_frames(frames)
+                yield (feats.unsqueeze(0).permute(0, 2, 1, 3, 4).contiguous(),)
+        else:
+            yield inputs
+
+def calibrate(registry, name, args):
+    eager = eager_cpu(registry, name)
+    checkpoint = registry._paths[name]
+    for part, (module, example_inputs, _, _) in export_specs(name, eager, CPU).items():
+        calibration = calibration_inputs(name, part, eager, args)
+        batches = (x for _, x in zip(range(args.num_calibration), calibration))
+        quantized = quantize_static(module, example_inputs, batches, backend=torch.backends.quantized.engine)
+        path = exported_path(checkpoint, "int8", part)
+        with torch.no_grad():
+            torch.jit.trace(quantized, example_inputs).save(str(path))
+        print(f"{name}{'.' + part if part else ''}: static INT8 graph written to {path}")
+
+def evaluate(name, variants, args, eager):
+    """Scores every held-out sample with each variant; returns per-variant scores, latencies and labels"""
+    scores = {v: [] for v in variants}
+    latency = {v: [] for v in variants}
+    labels = []
+    for inputs, label in samples(name, args.eval_dir, args, eager):
+        labels.append(label)
+        for variant, model in variants.items():
+            start = time.perf_counter()
+            scores[variant].extend(score(name, model, inputs))
+            latency[variant].append(time.perf_counter() - start)
+    return scores, latency, labels
+
+def compare(reference, scores, labels):
+    ref, q, y = np.array(reference), np.array(scores), np.array(labels)
+    return {
+        "mean_abs_score_diff": float(np.abs(ref - q).mean()),
+        "max_abs_score_diff": float(np.abs(ref - q).max()),
+        "decision_agreement": float(((ref > 0.5) == (q > 0.5)).mean()),
+        "accuracy": float(((q > 0.5) == y).mean()),
+    }
+
+def report_model(registry, name, args):
+    eager = eager_cpu(registry, name)
+    variants = {"fp32": eager, "dynamic": quantize_dynamic_model(name, eager_cpu(registry, name))}
+    try:
+        variants["static"] = load_exported(name, eager_cpu(registry, name), registry._paths[name], "int8", CPU)
+    except FileNotFoundError:
+        print(f"{name}: no static INT8 graph, run without --skip_calibration first")
+    scores, latency, labels = evaluate(name, variants, args, eager)
+    if not labels:
+        print(f"{name}: no evaluation samples found in {args.eval_dir}")
+        return None
+    fp32_ms = float(np.median(latency["fp32"]) * 1000.0)
+    report = {"samples": len(labels), "fp32": {"accuracy": compare(scores["fp32"], scores["fp32"], labels)["accuracy"],
+                                               "median_ms": fp32_ms}}
+    for variant in variants:
+        if variant == "fp32":
+            continue
+        metrics = compare(scores["fp32"], scores[variant], labels)
+        metrics["median_ms"] = float(np.median(latency[variant]) * 1000.0)
+        metrics["speedup"] = fp32_ms / metrics["median_ms"] if metrics["median_ms"] else None
+        metrics["safe"] = (metrics["decision_agreement"] >= args.min_agreement
+                           and report["fp32"]["accuracy"] - metrics["accuracy"] <= args.max_accuracy_drop)
+        report[variant] = metrics
+        print(f"{name} [{variant}] speedup x{metrics['speedup']:.2f}, agreement {metrics['decision_agreement']:.3f}, "
+              f"accuracy {metrics['accuracy']:.3f} (fp32 {report['fp32']['accuracy']:.3f}) -> "
+              f"{'safe' if metrics['safe'] else 'NOT safe'}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calibration_dir", required=True)
+    parser.add_argument("--eval_dir", required=True)
+    parser.add_argument("--audio_dir", default=None)
+    parser.add_argument("--video_fps", type=float, default=30.0, help="frame rate of the source videos")
+    parser.add_argument("--models", nargs="+", default=list(PARTS), choices=list(PARTS))
+    parser.add_argument("--num_calibration", type=int, default=64)
+    parser.add_argument("--limit", type=int, default=500, help="max samples read from each folder")
+    parser.add_argument("--skip_calibration", action="store_true")
+    parser.add_argument("--min_agreement", type=float, default=0.99)
+    parser.add_argument("--max_accuracy_drop", type=float, default=0.01)
+    parser.add_argument("--report", default="pretrained_models/quantization_report.json")
+    args = parser.parse_args()
+
+    torch.backends.quantized.engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+    registry = ModelRegistry()
+    report = {}
+    for name in args.models:
+        if not args.skip_calibration:
+            try:
+                calibrate(registry, name, args)
+            except ValueError as e:
+                print(f"{name}: calibration skipped ({e})")
+        report[name] = report_model(registry, name, args)
+
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Quantization report written to", args.report)
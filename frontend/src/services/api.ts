@@ -104,7 +104,10 @@ class HaloGuardAPI {
   
   // Real-time stream detection using WebSocket
   async detectDeepfakeStream(stream: MediaStream, callback: (result: DetectionResult) => void): Promise<void> {
-    const wsUrl = this.baseURL.replace(/^http/, 'ws') + '/api/detect/stream';
+    // Browsers cannot set headers on a WebSocket handshake, so the token goes in the query string
+    const token = localStorage.getItem('haloguard_token');
+    const wsUrl = this.baseURL.replace(/^http/, 'ws') + '/api/detect/stream'
+      + (token ? `?token=${encodeURIComponent(token)}` : '');
     const ws = new WebSocket(wsUrl);
     
     ws.onopen = () => {
@@ -25,3 +25,81 @@ def test_history(token):
     resp = client.get("/history/", headers={"Authorization":f"Bearer {token}"})
     assert resp.status_code == 200
     assert isinstance(resp.json(), list)
+
+def test_operator_endpoints_require_admin():
+    from types import SimpleNamespace
+    from api.deps import get_user
+    app.dependency_overrides[get_user] = lambda: SimpleNamespace(id=1, username="bob")
+    try:
+        resp = client.post("/api/models/image/reload")
+        writer = client.get("/api/history/writer")
+    finally:
+        app.dependency_overrides.clear()
+    assert resp.status_code == 403 and writer.status_code == 403
+
+@pytest.fixture
+def batch_client(monkeypatch):
+    """/detect/batch with the models replaced by ``analyze_image`` stubs keyed on file content"""
+    import json
+    from types import SimpleNamespace
+    from api import deps
+    from api.routes import detect_batch
+    async def analyze_image(path, explain, vs, fusion):
+        content = open(path, "rb").read()
+        if content == b"undecodable":
+            raise ValueError("Could not decode image")
+        if content == b"crash":
+            raise RuntimeError("model exploded")
+        return {"overall_score": 0.9, "overall_prediction": "fake", "confidence": 0.8, "vision_score": 0.9,
+                "vision_prediction": "fake", "audio_sync_score": None, "physiological_score": None,
+                "explanation": None, "heatmap_url": None, "processing_time": 0.01, "model_version": "test",
+                "file_type": "image"}
+    class PassThroughCache:
+        make_key = staticmethod(lambda *args, **kwargs: "")
+        async def get_or_compute(self, key, compute, source=None):
+            return await (compute(source) if source is not None else compute())
+    monkeypatch.setattr(detect_batch, "analyze_image", analyze_image)
+    vs = SimpleNamespace(allowed_image_ext=(".jpg",), allowed_video_ext=(".mp4",), max_size=100)
+    app.dependency_overrides.update({
+        deps.get_user: lambda: SimpleNamespace(id=None),
+        deps.get_vision_service: lambda: vs,
+        deps.get_lip_sync_service: lambda: None,
+        deps.get_rppg_service: lambda: None,
+        deps.get_fusion_service: lambda: None,
+        deps.get_result_cache: PassThroughCache,
+        deps.get_model_registry: lambda: SimpleNamespace(fingerprint=lambda names: "test"),
+    })
+    def post(files):
+        resp = client.post("/api/detect/batch", files=[("files", f) for f in files])
+        lines = [json.loads(line) for line in resp.text.splitlines()] if resp.status_code == 200 else None
+        return resp, lines
+    yield post
+    app.dependency_overrides.clear()
+
+def test_detect_batch_streams_one_line_per_item(batch_client):
+    resp, lines = batch_client([("a.jpg", b"face", "image/jpeg"), ("b.jpg", b"face", "image/jpeg")])
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert lines[-1] == {"done": True, "items": 2, "failed": 0}
+    items = sorted(lines[:-1], key=lambda line: line["index"])
+    assert [(i["index"], i["filename"], i["result"]["overall_prediction"]) for i in items] == \
+        [(0, "a.jpg", "fake"), (1, "b.jpg", "fake")]
+
+def test_detect_batch_reports_errors_per_item(batch_client):
+    resp, lines = batch_client([
+        ("ok.jpg", b"face", "image/jpeg"),
+        ("notes.txt", b"text", "text/plain"),
+        ("bad.jpg", b"undecodable", "image/jpeg"),
+        ("boom.jpg", b"crash", "image/jpeg"),
+        ("huge.jpg", b"x" * 101, "image/jpeg"),  # over the per-file size cap
+    ])
+    by_name = {line["filename"]: line for line in lines[:-1]}
+    assert "result" in by_name["ok.jpg"]
+    assert [by_name[n]["status"] for n in ("notes.txt", "bad.jpg", "boom.jpg", "huge.jpg")] == [400, 400, 500, 413]
+    assert by_name["boom.jpg"]["error"] == "Analysis failed"  # internal errors are not echoed
+    assert lines[-1] == {"done": True, "items": 5, "failed": 4}
+
+def test_detect_batch_limits_item_count(batch_client, monkeypatch):
+    from api.routes import detect_batch
+    monkeypatch.setattr(detect_batch.settings, "BATCH_MAX_ITEMS", 2)
+    resp, _ = batch_client([(f"{i}.jpg", b"face", "image/jpeg") for i in range(3)])
+    assert resp.status_code == 400
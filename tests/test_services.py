@@ -10,3 +10,341 @@ def test_detect_image_array():
     res = pytest.run(asyncio.ensure_future(vs.detect_image_array(arr)))
     assert res["prediction"] in ("real","fake")
     assert 0.0 <= res["score"] <= 1.0
+
+def test_micro_batcher_groups_concurrent_requests():
+    import asyncio
+    from services.batching import MicroBatcher
+    seen = []
+    def run_batch(items):
+        seen.append(len(items))
+        return [i * 2 for i in items]
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=20)
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    assert seen == [4, 2]
+    assert batcher.stats()["batch_size_distribution"] == {2: 1, 4: 1}
+
+def test_micro_batcher_worker_does_not_keep_the_first_request_trace():
+    import asyncio
+    from services.batching import MicroBatcher
+    from utils.metrics import _current_trace, request_trace
+    seen = []
+    def run_batch(items):
+        seen.append(_current_trace.get())
+        return items
+    batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait_ms=1)
+    async def main():
+        with request_trace():
+            await batcher.submit(1)
+        await batcher.submit(2)
+    asyncio.run(main())
+    assert seen == [None, None]
+
+def test_result_cache_dedupes_concurrent_misses(tmp_path):
+    import asyncio
+    from services.result_cache import ResultCache
+    cache = ResultCache(max_entries=2, disk_path=str(tmp_path/"results.sqlite"))
+    calls = []
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"overall_score": 0.9}
+    key = cache.make_key("abc", "image", "v1", explain=False)
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute(key, compute) for _ in range(5)))
+    assert asyncio.run(main()) == [{"overall_score": 0.9}] * 5
+    assert len(calls) == 1
+    # a fresh process only has the disk tier
+    assert ResultCache(disk_path=str(tmp_path/"results.sqlite")).get_disk(key) == {"overall_score": 0.9}
+
+def test_result_cache_cancelled_caller_does_not_cancel_followers():
+    import asyncio
+    from services.result_cache import ResultCache
+    cache = ResultCache()
+    async def compute():
+        await asyncio.sleep(0.05)
+        return {"overall_score": 0.4}
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. a /detect/batch client disconnecting
+        result = await follower
+        return leader.cancelled(), result
+    assert asyncio.run(main()) == (True, {"overall_score": 0.4})
+    assert cache.get_memory("k") == {"overall_score": 0.4}
+
+def test_result_cache_shared_task_keeps_its_input_when_first_caller_leaves(tmp_path):
+    import asyncio, os
+    from services.result_cache import ResultCache
+    cache = ResultCache()
+    async def compute(path):
+        await asyncio.sleep(0.05)
+        with open(path, "rb") as f:  # what FrameSource / ffmpeg do once the analysis gets going
+            return {"bytes": len(f.read())}
+    async def request(name):
+        upload = tmp_path/name
+        upload.write_bytes(b"same video")
+        try:
+            return await cache.get_or_compute("k", compute, str(upload))
+        finally:
+            upload.unlink()  # the routes' upload.cleanup()
+    async def main():
+        leader = asyncio.ensure_future(request("first.mp4"))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(request("second.mp4"))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # deletes first.mp4 while the shared task still has to read it
+        return await follower
+    assert asyncio.run(main()) == {"bytes": 10}
+    assert cache.get_memory("k") == {"bytes": 10}
+    assert os.listdir(tmp_path) == []  # the task's own link is gone as well
+
+def test_stream_session_keeps_only_newest_frame():
+    import asyncio
+    from services.stream_session import StreamSession
+    async def main():
+        session = StreamSession(vs=None, detect_interval=5, smoothing=0.5)
+        for payload in (b"a", b"b", b"c"):
+            session.offer(payload)
+        frame_id, payload, _ = await session.next_frame()
+        session.close()
+        return frame_id, payload, session.dropped, await session.next_frame()
+    assert asyncio.run(main()) == (3, b"c", 2, None)
+
+def test_stream_session_release_waits_for_frame_in_progress():
+    import asyncio, threading, time
+    from services.stream_session import StreamSession
+    events = []
+    class Mesh:
+        def close(self):
+            events.append("closed")
+    async def main():
+        session = StreamSession(vs=None, rppg=False)
+        session._face_mesh = Mesh()
+        def prepare():  # stands in for _prepare still running on the vision pool
+            with session._mesh_lock:
+                time.sleep(0.05)
+                events.append("prepared")
+        worker = threading.Thread(target=prepare)
+        worker.start()
+        time.sleep(0.01)
+        session.close()  # what the receiver does when the client leaves: no FaceMesh is touched
+        assert events == []
+        await session.release()
+        worker.join()
+    asyncio.run(main())
+    assert events == ["prepared", "closed"]
+
+def test_window_starts_overlap_and_cover_tail():
+    from utils.config import get_settings
+    clip, stride = get_settings().CLIP_LENGTH, get_settings().VIDEO_WINDOW_STRIDE
+    starts = VisionService.window_starts(clip + stride + 3)
+    assert starts[:2] == [0, stride]
+    assert starts[-1] == stride + 3  # last window ends on the last sampled frame
+    assert VisionService.window_starts(clip) == [0]
+
+def test_syncnet_offset_batch_matches_single_forward():
+    import torch
+    from models.lip_model import SyncNet
+    net = SyncNet().eval()
+    face, audio = torch.rand(1, 3, 5, 224, 224), torch.rand(4, 13, 5)
+    with torch.no_grad():
+        batched = net.fuse(net.encode_face(face).expand(4, -1), net.encode_audio(audio))
+        single = torch.cat([net(face, audio[i:i+1]) for i in range(4)])
+    assert torch.allclose(batched, single, atol=1e-5)
+
+def test_rppg_stream_tracks_heart_rate_from_irregular_samples():
+    import numpy as np
+    from services.rppg_service import RPPGStream
+    stream = RPPGStream(fs=15, window_seconds=10)
+    rng = np.random.default_rng(0)
+    t = np.cumsum(rng.uniform(0.02, 0.05, 500))  # ~28 fps with jitter, ~17 s
+    for ts in t:
+        stream.push(100 + np.sin(2 * np.pi * 1.2 * ts), ts)
+    assert len(stream.signal()) == 150  # window size is fixed however long the stream runs
+    assert abs(stream.heart_rate() - 72) <= 6
+
+def test_rppg_band_stays_below_nyquist_at_low_sample_rates():
+    import pytest
+    from services.rppg_service import RPPGStream
+    assert RPPGStream(fs=5).band == (0.75, 2.25)
+    with pytest.raises(ValueError):
+        RPPGStream(fs=1)
+
+def test_history_keyset_pagination_and_filters():
+    import datetime
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from auth import crud, models
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    ts = datetime.datetime(2024, 1, 1)
+    for i in range(5):  # identical timestamps: the id breaks ties
+        db.add(models.ScanHistory(user_id=1, timestamp=ts, overall_prediction="fake" if i % 2 else "real", results="{}"))
+    db.commit()
+    first = crud.get_history_for_user(db, 1, limit=2)
+    second = crud.get_history_for_user(db, 1, limit=2, before=(first[-1].timestamp, first[-1].id))
+    assert [r.id for r in first + second] == [5, 4, 3, 2]
+    assert [r.id for r in crud.get_history_for_user(db, 1, prediction="fake")] == [4, 2]
+    record = crud.create_history(db, 1, {"overall_prediction": "real", "overall_score": 0.2, "file_type": "image"}, "a.jpg")
+    assert record.overall_score == 0.2 and record.results.startswith("{")
+
+def test_history_writer_batches_and_flushes_on_stop(monkeypatch):
+    import asyncio
+    from services import history_service
+    seen = []
+    monkeypatch.setattr(history_service, "with_session", lambda fn, batch: seen.append([e["user_id"] for e in batch]))
+    writer = history_service.HistoryWriter(batch_size=3, flush_interval_ms=1000, max_queue=100)
+    async def main():
+        for i in range(5):
+            await writer.enqueue(i, {"overall_prediction": "real"})
+        await writer.stop()  # the last two rows are still inside the flush interval
+    asyncio.run(main())
+    assert seen == [[0, 1, 2], [3, 4]]
+    assert writer.stats()["written"] == 5
+
+def test_delete_user_removes_jobs_uploads_and_late_history(tmp_path):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from auth import crud, models
+    from jobs import crud as job_crud, models as job_models
+    engine = create_engine("sqlite://")
+    event.listen(engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))  # enforce like Postgres
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username="alice", hashed_password="x")
+    db.add(user); db.commit()
+    upload = tmp_path/"job.mp4"
+    upload.write_bytes(b"video")
+    job_crud.create_job(db, "j1", user.id, str(upload), "abc", False, 5)
+    crud.create_history(db, user.id, {"overall_prediction": "real"})
+    user_id = user.id
+    crud.delete_user(db, user)
+    assert db.query(job_models.AnalysisJob).count() == 0 and db.query(models.ScanHistory).count() == 0
+    assert not upload.exists()
+    # rows still queued in the write-behind writer for the deleted user are dropped
+    crud.create_history_batch(db, [{"user_id": user_id, "results": {"overall_prediction": "fake"}}])
+    assert db.query(models.ScanHistory).count() == 0
+
+@pytest.fixture
+def job_manager(tmp_path, monkeypatch):
+    """A JobManager on an in-memory database whose _run only records the order jobs start in"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database import Base
+    from services import job_service
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    def with_session(fn, *args, **kwargs):
+        db = Session()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    monkeypatch.setattr(job_service, "with_session", with_session)
+    manager = job_service.JobManager(None, None, None, None, None, None)
+    manager.storage_dir, manager.num_workers = tmp_path/"jobs", 1
+    manager.started, manager.gate = [], None
+    async def run(job_id):
+        manager.started.append(job_id)
+        if manager.gate is not None:
+            await manager.gate.wait()
+    manager._run = run
+    return manager
+
+def _job_upload(tmp_path, name):
+    from types import SimpleNamespace
+    path = tmp_path/f"{name}.mp4"
+    path.write_bytes(b"video")
+    return SimpleNamespace(path=str(path), sha256=name)
+
+def test_job_manager_runs_by_priority_then_fifo(job_manager, tmp_path):
+    import asyncio
+    async def main():
+        job_manager.gate = asyncio.Event()
+        await job_manager.start()
+        ids = {}
+        ids["first"] = (await job_manager.submit(1, _job_upload(tmp_path, "first"), ".mp4", False, 5)).id
+        await asyncio.sleep(0.05)  # the worker takes it and blocks on the gate
+        for name, priority in [("low", 9), ("urgent", 0), ("normal_a", 5), ("normal_b", 5)]:
+            ids[name] = (await job_manager.submit(1, _job_upload(tmp_path, name), ".mp4", False, priority)).id
+        job_manager.gate.set()
+        await asyncio.wait_for(job_manager._queue.join(), 5)
+        await job_manager.stop()
+        return [next(n for n, i in ids.items() if i == job_id) for job_id in job_manager.started]
+    assert asyncio.run(main()) == ["first", "urgent", "normal_a", "normal_b", "low"]
+
+def test_job_manager_rejects_submissions_beyond_queue_size(job_manager, tmp_path):
+    import asyncio
+    from services.job_service import QueueFullError
+    job_manager.max_pending = 1
+    async def main():
+        job_manager.gate = asyncio.Event()
+        await job_manager.start()
+        await job_manager.submit(1, _job_upload(tmp_path, "running"), ".mp4", False, 5)
+        await asyncio.sleep(0.05)
+        await job_manager.submit(1, _job_upload(tmp_path, "queued"), ".mp4", False, 5)
+        try:
+            with pytest.raises(QueueFullError):  # the route answers this with 503 and Retry-After
+                await job_manager.submit(1, _job_upload(tmp_path, "rejected"), ".mp4", False, 5)
+        finally:
+            job_manager.gate.set()
+            await job_manager.stop()
+    asyncio.run(main())
+    assert (tmp_path/"rejected.mp4").exists()  # a rejected upload is left to the caller to clean up
+
+def test_job_manager_concurrent_submissions_respect_queue_size(job_manager, tmp_path):
+    import asyncio
+    from services.job_service import QueueFullError
+    job_manager.max_pending = 2
+    job_manager.storage_dir.mkdir()
+    async def main():
+        job_manager._queue = asyncio.PriorityQueue()  # no workers: everything submitted stays queued
+        uploads = [_job_upload(tmp_path, f"concurrent{i}") for i in range(4)]
+        return await asyncio.gather(*(job_manager.submit(1, u, ".mp4", False, 5) for u in uploads),
+                                    return_exceptions=True)
+    results = asyncio.run(main())
+    assert sum(isinstance(r, QueueFullError) for r in results) == 2
+    assert job_manager.pending == 2
+
+def test_job_manager_recovers_unfinished_jobs_on_start(job_manager, tmp_path):
+    import asyncio
+    from jobs import crud
+    from services import job_service
+    kept = _job_upload(tmp_path, "kept").path
+    crud_calls = [
+        ("was_running", str(kept), 5, "running"),
+        ("was_queued", str(kept), 1, "queued"),
+        ("upload_lost", str(tmp_path/"missing.mp4"), 0, "queued"),
+        ("finished", str(kept), 0, "done"),
+    ]
+    for job_id, path, priority, status in crud_calls:
+        job_service.with_session(crud.create_job, job_id, 1, path, "h", False, priority)
+        job_service.with_session(crud.update_job, job_id, status=status)
+    async def main():
+        await job_manager.start()
+        await asyncio.wait_for(job_manager._queue.join(), 5)
+        await job_manager.stop()
+    asyncio.run(main())
+    assert job_manager.started == ["was_queued", "was_running"]
+    get = lambda job_id: job_service.with_session(crud.get_job, job_id)
+    assert get("was_running").status == "queued" and get("was_running").progress == 0.0
+    assert get("upload_lost").status == "failed" and get("upload_lost").error == "Upload lost during restart"
+    assert get("finished").status == "done"
+
+def test_video_timeline_leaves_times_null_when_fps_is_unknown(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    monkeypatch.setattr(vs, "score_windows", lambda source, indices: [(0, 15, 0.2), (16, 31, 0.9)])
+    source = SimpleNamespace(fps=30.0, fps_known=False)
+    res = asyncio.run(vs.detect_video_windows(source, list(range(32))))
+    assert [(w["start_frame"], w["start_time"], w["end_time"]) for w in res["timeline"]] == [(0, None, None), (16, None, None)]
+    assert res["score"] == 0.9
@@ -2,15 +2,287 @@
 import pytest
 from utils.frame_extractor import FrameExtractor
 
+def _write_video(path, n_frames):
+    import cv2, numpy as np
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 1, (100,100))
+    for i in range(n_frames):
+        out.write(np.full((100,100,3), i * 20, np.uint8))
+    out.release()
+
 @pytest.mark.asyncio
 async def test_frame_extraction(tmp_path):
     # create a tiny video
-    import cv2, numpy as np
     path = tmp_path/"vid.mp4"
-    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 1, (100,100))
-    for _ in range(3):
-        out.write(np.zeros((100,100,3), np.uint8))
-    out.release()
+    _write_video(path, 3)
     fe = FrameExtractor()
-    data = await fe.extract_frames(str(path))
-    assert len(data["frames"]) == 3
+    source = await fe.extract_frames(str(path))
+    assert len(source) == 3
+    source.release()
+
+@pytest.mark.asyncio
+async def test_frame_source_decodes_only_requested_frames(tmp_path):
+    path = tmp_path/"vid.mp4"
+    _write_video(path, 6)
+    source = await FrameExtractor().extract_frames(str(path))
+    try:
+        await source.load([1, 4])
+        frames = source.read([4, 1])
+        assert frames.shape == (2, 100, 100, 3)
+        assert frames[0].mean() > frames[1].mean()
+        assert sorted(source._frames) == [1, 4]
+    finally:
+        source.release()
+
+@pytest.mark.asyncio
+async def test_frame_source_thread_decode_uses_no_shared_memory(tmp_path, monkeypatch):
+    from utils import frame_source
+    def no_shm(*args, **kwargs):
+        raise AssertionError("shared memory allocated without a decode process pool")
+    monkeypatch.setattr(frame_source.shared_memory, "SharedMemory", no_shm)
+    path = tmp_path/"vid.mp4"
+    _write_video(path, 4)
+    source = await FrameExtractor().extract_frames(str(path))
+    try:
+        await source.load([0, 2])
+        assert source.get(3) is not None  # unloaded index, decoded on demand
+        assert source.read([0, 2, 3]).shape == (3, 100, 100, 3)
+    finally:
+        source.release()
+
+def test_face_landmarks_boxes_are_clipped_to_frame():
+    import numpy as np
+    from utils.landmark_cache import FaceLandmarks, crop_box
+    points = np.tile(np.array([[10, 20], [90, 80]], np.float32), (234, 1))
+    lm = FaceLandmarks(points, (100, 100, 3))
+    assert lm.face_box() == (10, 20, 90, 80)
+    assert lm.face_box(margin=0.5) == (0, 0, 100, 100)
+    frame = np.zeros((100, 100, 3), np.uint8)
+    assert crop_box(frame, lm.face_box()).shape == (60, 80, 3)
+
+def test_feature_cache_spills_to_memmap_and_drops_stale_features(tmp_path):
+    import numpy as np
+    from utils.feature_cache import FeatureCache
+    cache = FeatureCache(memmap_frames=2, memmap_dir=str(tmp_path))
+    model = object()
+    cache.bind(model)
+    cache.put([0, 5, 9], np.arange(3 * 4, dtype=np.float32).reshape(3, 2, 2))
+    assert cache.missing([9, 10, 5]) == [10]
+    assert cache.get([9, 0]).tolist() == [[[8, 9], [10, 11]], [[0, 1], [2, 3]]]
+    assert len(list(tmp_path.iterdir())) == 1  # 3 rows > memmap_frames
+    cache.bind(object())  # e.g. the video model was hot-reloaded
+    assert cache.missing([0, 5]) == [0, 5]
+    cache.close()
+    assert not list(tmp_path.iterdir())
+
+def test_batch_preprocessor_swaps_channels_and_normalizes():
+    import numpy as np
+    from utils.preprocessing import BatchPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+    red = np.zeros((50, 80, 3), np.uint8)
+    red[..., 2] = 255  # BGR
+    out = BatchPreprocessor(32, IMAGENET_MEAN, IMAGENET_STD)([red, red[:20]])
+    assert out.shape == (2, 3, 32, 32) and out.dtype == np.float32
+    expected = (np.array([1.0, 0.0, 0.0]) - IMAGENET_MEAN) / IMAGENET_STD
+    assert np.allclose(out[:, :, 5, 5], expected, atol=1e-5)
+
+def test_face_tracker_detects_on_keyframes_and_tracks_between(monkeypatch):
+    import numpy as np
+    from utils import landmark_cache
+    kinds = []
+    monkeypatch.setattr(landmark_cache, "detect_landmarks", lambda mesh, frame, kind: kinds.append(kind))
+    monkeypatch.setattr(landmark_cache.face_mesh_pool, "get", lambda: None)
+    monkeypatch.setattr(landmark_cache.tracking_mesh_pool, "get", lambda owner=None: None)
+    monkeypatch.setattr(landmark_cache.settings, "LANDMARK_KEYFRAME_INTERVAL", 3)
+    monkeypatch.setattr(landmark_cache.settings, "LANDMARK_TRACK_MAX_GAP", 2)
+    tracker = landmark_cache.FaceTracker()
+    frame = np.zeros((4, 4, 3), np.uint8)
+    for idx in [0, 1, 2, 3, 4, 10, 11]:
+        tracker(idx, frame)
+    assert kinds == ["keyframe", "tracked", "tracked", "keyframe", "tracked", "keyframe", "tracked"]
+
+def test_tracking_mesh_pool_builds_once_per_thread_and_resets_between_owners(monkeypatch):
+    from utils import landmark_cache
+    built, resets = [], []
+    class FakeMesh:
+        def __init__(self, **kw):
+            built.append(kw["static_image_mode"])
+        def reset(self):
+            resets.append(1)
+        def close(self):
+            pass
+    monkeypatch.setattr(landmark_cache.mp.solutions.face_mesh, "FaceMesh", FakeMesh)
+    pool = landmark_cache.FaceMeshPool(static_image_mode=False)
+    first = pool.get(1)
+    assert pool.get(1) is first and resets == []
+    assert pool.get(2) is first and resets == [1]
+    assert built == [False]
+    pool.close()
+
+def test_face_cropper_rejects_undecodable_image(tmp_path):
+    import pytest
+    from utils.face_cropper import FaceCropper
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not an image")
+    with pytest.raises(ValueError, match="Could not decode image"):
+        FaceCropper().crop(str(path))
+
+def test_benchmark_compare_flags_only_regressions_beyond_tolerance():
+    import sys, pathlib
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "benchmarks"))
+    from results import compare
+    baseline = {"stages.video.decode.p50_ms": 100.0, "api.image.c4.throughput_rps": 50.0,
+                "stages.image.fusion.p50_ms": 0.1, "stages.video.decode.max_ms": 100.0}
+    current = {"stages.video.decode.p50_ms": 130.0, "api.image.c4.throughput_rps": 48.0,
+               "stages.image.fusion.p50_ms": 0.5, "stages.video.decode.max_ms": 400.0}
+    assert [r[0] for r in compare(current, baseline, tolerance=0.15)] == ["stages.video.decode.p50_ms"]
+
+def test_request_trace_follows_work_into_pools():
+    import asyncio
+    from utils.executors import run_in_pool
+    from utils.metrics import request_trace, timed, metrics
+    def stage():
+        with timed("test_stage"):
+            return 1
+    async def main():
+        with request_trace() as trace:
+            await asyncio.gather(run_in_pool("io", stage), run_in_pool("io", stage))
+        return trace.breakdown()
+    assert [s["stage"] for s in asyncio.run(main())] == ["test_stage", "test_stage"]
+    assert 'stage_duration_seconds_count{stage="test_stage"} 2' in metrics.render()
+
+def test_token_cache_bounds_and_invalidation():
+    import time
+    from auth.token_cache import TokenCache, Principal
+    cache = TokenCache(max_entries=2, ttl=60)
+    alice, bob = Principal(1, "alice"), Principal(2, "bob")
+    far = time.time() + 3600
+    cache.put("a1", alice, far)
+    cache.put("a2", alice, far)
+    assert cache.get("a1") == alice  # a2 is now least recently used
+    cache.put("b1", bob, far)
+    assert cache.get("a2") is None and cache.get("b1") == bob
+    cache.invalidate_user("alice")
+    assert cache.get("a1") is None and cache.get("b1") == bob
+    cache.put("b2", bob, time.time() - 1)  # already expired token
+    assert cache.get("b2") is None
+    assert cache.stats()["entries"] == 1
+    # a lookup that started before a password change cannot cache the old principal afterwards
+    started = time.time() - 1
+    cache.invalidate_user("bob")
+    cache.put("b3", bob, far, verified_at=started)
+    assert cache.get("b3") is None
+    cache.put("b4", bob, far, verified_at=time.time() + 1)
+    assert cache.get("b4") == bob
+
+def test_tokens_issued_before_password_change_are_rejected():
+    import datetime
+    from types import SimpleNamespace
+    from auth.security import issued_before_password_change
+    changed = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    epoch = changed.replace(tzinfo=datetime.timezone.utc).timestamp()
+    user = SimpleNamespace(password_changed_at=changed)
+    assert issued_before_password_change({"iat": epoch - 0.5}, user)
+    assert not issued_before_password_change({"iat": epoch + 0.5}, user)
+    assert issued_before_password_change({}, user)
+    assert not issued_before_password_change({}, SimpleNamespace(password_changed_at=None))
+
+def test_audio_track_silence_is_not_missing_audio():
+    import numpy as np
+    from utils.audio_extractor import AudioTrack
+    track = AudioTrack("unused.mp4", sr=16000)
+    track.samples, track.has_audio = np.zeros(16000, np.float32), True  # a quiet but present track
+    mfccs = track.mfcc_at([0.1, 0.5, 0.9])
+    assert mfccs.shape == (13, 3) and np.isfinite(mfccs).all()
+    missing = AudioTrack("unused.mp4", sr=16000)
+    missing.samples, missing.has_audio = np.zeros(0, np.float32), False
+    assert missing.mfcc_at([0.1]) is None
+
+def test_audio_track_decodes_all_windows_in_one_call(monkeypatch):
+    import numpy as np
+    from utils import audio_extractor
+    calls = []
+    def fake_decode_spans(path, sr, spans):
+        calls.append(spans)
+        return [np.full(n, 0.1 * (i + 1), np.float32) for i, (_, n) in enumerate(spans)]
+    monkeypatch.setattr(audio_extractor, "decode_spans", fake_decode_spans)
+    track = audio_extractor.AudioTrack("long.mp4", sr=16000)  # never loaded: the windowed path
+    frames = np.array([0.0, 300.0, 600.0, 900.0, 1200.0])
+    offsets = np.arange(-5, 6) * 0.04
+    mfccs = track.mfcc_at((frames[None, :] + offsets[:, None]).ravel())
+    assert mfccs.shape == (13, 55)
+    assert len(calls) == 1 and len(calls[0]) == 5  # the offsets around each frame share one span
+    assert calls[0][0][0] == 0  # nothing before the start of the track is requested
+
+def _run_limited(limits: dict, path: str, headers: list, chunks: list):
+    """Drive UploadLimitMiddleware around an app that reads the whole body; returns (status, app saw request)"""
+    import asyncio
+    from utils.uploads import UploadLimitMiddleware
+    seen, sent = [], []
+    async def app(scope, receive, send):
+        seen.append(scope["path"])
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break  # what a body parser does with a truncated body: fail, here with a 400
+            if not message.get("more_body"):
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b"ok"})
+                return
+        await send({"type": "http.response.start", "status": 400, "headers": []})
+        await send({"type": "http.response.body", "body": b"bad"})
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    asyncio.run(UploadLimitMiddleware(app, limits)(scope, receive, send))
+    return sent[0]["status"], bool(seen)
+
+def test_upload_limit_rejects_declared_content_length_unread():
+    status, called = _run_limited({"/api/jobs/video": 10}, "/api/jobs/video", [(b"content-length", b"11")], [b"x" * 11])
+    assert (status, called) == (413, False)
+    assert _run_limited({"/api/jobs/video": 10}, "/api/history", [(b"content-length", b"11")], [b"x" * 11])[0] == 200
+
+def test_upload_limit_cuts_off_streamed_body():
+    # no Content-Length (chunked): counted as it arrives
+    assert _run_limited({"/api/detect": 10}, "/api/detect/image", [], [b"x" * 6, b"x" * 6]) == (413, True)
+    assert _run_limited({"/api/detect": 10}, "/api/detect/image", [], [b"x" * 5, b"x" * 5]) == (200, True)
+
+def _multipart_request(files: list, chunk: int = 7):
+    """A stand-in Request streaming a multipart body of ``(filename, bytes)`` parts in small chunks"""
+    from types import SimpleNamespace
+    boundary = b"testboundary"
+    body = b"".join(b"--" + boundary + b"\r\nContent-Disposition: form-data; name=\"file\"; filename=\"" +
+                    name.encode() + b"\"\r\nContent-Type: application/octet-stream\r\n\r\n" + data + b"\r\n"
+                    for name, data in files) + b"--" + boundary + b"--\r\n"
+    async def stream():
+        for i in range(0, len(body), chunk):
+            yield body[i:i + chunk]
+    return SimpleNamespace(headers={"content-type": "multipart/form-data; boundary=testboundary"}, stream=stream)
+
+def test_spool_request_files_writes_each_part_once_and_caps_size():
+    import asyncio, hashlib, os, tempfile
+    from fastapi import HTTPException
+    from utils.uploads import spool_request_files, spool_request_file, allowed_suffix
+    data = b"frame" * 1000
+    suffix_for = allowed_suffix((".mp4",), "video")
+    before = set(os.listdir(tempfile.gettempdir()))
+    parts = asyncio.run(spool_request_files(
+        _multipart_request([("a.mp4", data), ("notes.txt", b"x"), ("big.mp4", data + b"!")]), len(data), suffix_for))
+    try:
+        (name, upload), (_, bad_type), (_, too_big) = parts
+        assert name == "a.mp4" and upload.path.endswith(".mp4")
+        assert upload.size == len(data) and upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert open(upload.path, "rb").read() == data
+        assert (bad_type.status_code, too_big.status_code) == (400, 413)
+        assert set(os.listdir(tempfile.gettempdir())) - before == {os.path.basename(upload.path)}  # nothing else kept
+    finally:
+        upload.cleanup()
+    with pytest.raises(HTTPException) as e:  # a single-file route raises the part's error
+        asyncio.run(spool_request_file(_multipart_request([("big.mp4", data + b"!")]), len(data), suffix_for))
+    assert e.value.status_code == 413
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(spool_request_files(_multipart_request([("a.mp4", b"1"), ("b.mp4", b"2")]), 10, suffix_for,
+                                        max_files=1))
+    assert e.value.status_code == 400
+    assert set(os.listdir(tempfile.gettempdir())) <= before  # the rejected request left no temp files